@@ -0,0 +1,116 @@
+"""
+Async database path, enabled router by router.
+
+Sync handlers hold a threadpool slot for their whole database round-trip,
+so a worker serves at most as many concurrent requests as the threadpool has
+threads. A handler decorated with ``@db_route`` can instead be served by an
+async twin that runs the same body on an ``AsyncSession`` (aiosqlite or
+asyncpg) through ``run_sync``: SQLAlchemy suspends the handler on each
+statement and the event loop keeps serving other requests meanwhile.
+
+Which routers take the async path is set by ``ASYNC_DB_ROUTERS``, a comma
+separated list of router module names (``requests,offers,chats``) or ``*``
+for all, so the switch can be rolled out gradually. The async URL is derived
+from ``DATABASE_URL`` unless ``ASYNC_DATABASE_URL`` is set.
+"""
+import asyncio
+import functools
+import inspect
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.database import (
+    DATABASE_URL, SQLITE_PROFILE, busy_delays, can_retry, configure_sqlite, retry_on_busy
+)
+
+ASYNC_DB_ROUTERS = {name.strip() for name in os.getenv("ASYNC_DB_ROUTERS", "").split(",") if name.strip()}
+
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """``sqlite:///x.db`` -> ``sqlite+aiosqlite:///x.db``, and likewise for Postgres"""
+    scheme, rest = url.split(":", 1)
+    return _ASYNC_DRIVERS.get(scheme.split("+")[0], scheme) + ":" + rest
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Created on first use, so the async drivers are only needed when enabled"""
+    global _engine, _sessionmaker
+    if _engine is None:
+        _engine = create_async_engine(ASYNC_DATABASE_URL)
+        if ASYNC_DATABASE_URL.startswith("sqlite") and SQLITE_PROFILE == "production":
+            configure_sqlite(_engine.sync_engine)
+        _sessionmaker = async_sessionmaker(bind=_engine, autoflush=False)
+    return _engine
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    get_async_engine()
+    async with _sessionmaker() as db:
+        yield db
+
+
+def async_twin(handler):
+    """An async endpoint with ``handler``'s signature that runs it on an AsyncSession.
+
+    ``handler`` must take its session as ``db``; any other ``Session``
+    parameter (such as a ``primary`` next to a replica ``db``) gets the same
+    AsyncSession, so nothing blocks the loop. It runs unchanged, with the
+    AsyncSession's sync facade, so lazy loads and commits inside it work; it
+    should return loaded objects or response models, not rows that still
+    need loading once the session is gone. Like the sync path, it is re-run
+    on SQLITE_BUSY before it has committed, waiting without blocking the loop.
+    """
+    signature = inspect.signature(handler)
+    sessions = {"db"} | {
+        name for name, parameter in signature.parameters.items() if parameter.annotation is Session
+    }
+    parameters = [
+        parameter.replace(default=Depends(get_async_db), annotation=AsyncSession)
+        if parameter.name in sessions else parameter
+        for parameter in signature.parameters.values()
+    ]
+
+    @functools.wraps(handler)
+    async def endpoint(**kwargs):
+        # FastAPI resolves get_async_db once per request: these are all ``db``
+        db = kwargs.pop("db")
+        for name in sessions:
+            kwargs.pop(name, None)
+        run = lambda session: handler(**{name: session for name in sessions}, **kwargs)
+        db.sync_session.info.pop("committed", None)
+        for delay in busy_delays():
+            try:
+                return await db.run_sync(run)
+            except OperationalError as exc:
+                if not can_retry(db.sync_session, exc):
+                    raise
+                await db.rollback()
+                await asyncio.sleep(delay)
+        return await db.run_sync(run)
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
+
+
+def db_route(handler):
+    """Serve ``handler`` through ``async_twin`` if its router is in ASYNC_DB_ROUTERS.
+
+    Either way the handler is retried when SQLite reports the database busy.
+    """
+    router_name = handler.__module__.rsplit(".", 1)[-1]
+    if "*" in ASYNC_DB_ROUTERS or router_name in ASYNC_DB_ROUTERS:
+        return async_twin(handler)
+    return retry_on_busy(handler)
@@ -1,13 +1,19 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from app.cache import LRUCache
 from app.database import get_db
+from app.httpcache import invalidate_users
 from app.models import User, UserRole
+from app.passwords import check_password, hash_password, password_pool
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,29 +22,26 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-min-3
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Decoded tokens are cached until they expire (capped by the TTL below);
+# principals for at most PRINCIPAL_CACHE_TTL_SECONDS, which bounds how long
+# another worker can serve a stale role or name after a profile change.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "3600"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    # Use bcrypt directly to avoid passlib compatibility issues
-    import bcrypt
-    password_bytes = plain_password.encode('utf-8')
-    hashed_bytes = hashed_password.encode('utf-8')
-    try:
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
-    except Exception:
-        # Fallback to passlib for backwards compatibility
-        return pwd_context.verify(plain_password, hashed_password)
+    """Blocking check; request handlers use ``password_pool`` instead"""
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    # Use bcrypt directly to avoid passlib compatibility issues
-    import bcrypt
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    """Blocking hash at ``BCRYPT_ROUNDS``; request handlers use ``password_pool``"""
+    return hash_password(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -52,6 +55,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+class Principal:
+    """The authenticated caller: just what role checks and handlers need"""
+
+    __slots__ = ("id", "role", "display_name", "avatar_id")
+
+    def __init__(self, id: str, role: UserRole, display_name: str, avatar_id: Optional[int]):
+        self.id = id
+        self.role = role
+        self.display_name = display_name
+        self.avatar_id = avatar_id
+
+
+token_cache = LRUCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def decode_access_token(token: str) -> Optional[str]:
+    """Return the user id a token was issued for, or None if it is invalid"""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    user_id = token_cache.get(key)
+    if user_id is not None:
+        return user_id
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    user_id = payload.get("sub")
+    if user_id is not None:
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        token_cache.set(key, user_id, expires_in)
+    return user_id
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
@@ -60,34 +96,100 @@ def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db, email)
+def load_principal(db: Session, user_id: str) -> Optional[Principal]:
+    """Cached principal for a user id, or None if there is no such user"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    row = db.query(User.id, User.role, User.display_name, User.avatar_id).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    principal = Principal(*row)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_users(session: Session, flush_context, instances) -> None:
+    changed = session.info.setdefault("changed_users", set())
+    changed.update(obj.id for obj in session.dirty if isinstance(obj, User))
+    changed.update(obj.id for obj in session.deleted if isinstance(obj, User))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    changed = session.info.pop("changed_users", ())
+    for user_id in changed:
+        principal_cache.invalidate(user_id)
+    if changed:
+        invalidate_users(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session) -> None:
+    session.info.pop("changed_users", None)
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    """Check credentials in the password pool, upgrading the hash's cost if it changed"""
+    user = await run_in_threadpool(get_user_by_email, db, email)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = await password_pool.check(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        user.password_hash = new_hash
+        await run_in_threadpool(db.commit)
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = get_user_by_id(db, user_id)
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """The caller's principal; on a warm cache this touches no database.
+
+    Misses are loaded in the threadpool so the event loop never waits on a
+    query.
+    """
+    user_id = decode_access_token(token)
+    if user_id is None:
+        raise credentials_exception()
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = await run_in_threadpool(load_principal, db, user_id)
+    if principal is None:
+        raise credentials_exception()
+    return principal
+
+
+async def get_optional_principal(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    """The caller's principal, or None when no token was sent"""
+    if token is None:
+        return None
+    return await get_current_principal(token, db)
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    """The caller's full User row, for handlers that read or edit the profile"""
+    user = await run_in_threadpool(get_user_by_id, db, principal.id)
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
     return user
 
 
@@ -98,14 +200,18 @@ async def get_current_active_user(
 
 
 def require_role(allowed_roles: list[UserRole]):
-    """Dependency factory for role-based access control"""
-    async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
-        if current_user.role not in allowed_roles:
+    """Dependency factory for role-based access control.
+
+    Resolves to the caller's ``Principal``; load the ``User`` row separately
+    when a handler needs more than its id, role or display name.
+    """
+    async def role_checker(principal: Principal = Depends(get_current_principal)) -> Principal:
+        if principal.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions"
             )
-        return current_user
+        return principal
     return role_checker
 
 
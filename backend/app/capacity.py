@@ -0,0 +1,118 @@
+"""
+Rolling weekly offer counter behind ``User.weekly_meal_limit``.
+
+Each donor's offers are counted per UTC day in ``donor_daily_offers``, and
+``User.current_weekly_meals`` holds the sum of the last ``WEEK_DAYS`` of
+those buckets. Posting an offer first retires buckets that have left the
+window (subtracting them from the total), then increments the total with a
+single conditional ``UPDATE`` on the donor's row. The row lock that update
+takes serializes concurrent posts by the same donor on both SQLite and
+Postgres, so parallel requests can't overshoot the limit, and no query ever
+rescans ``meal_offers``. Stale buckets are retired when the donor next
+posts, so until then the stored total can include days past the window.
+
+Deleting an offer gives its slot back while its day is still in the window.
+Claimed offers keep their slot: the meal was handed over.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, or_, update
+from sqlalchemy.orm import Session
+
+from app.models import DonorDailyOffers, MealOffer, OfferStatus, User
+
+WEEK_DAYS = 7
+
+
+def utc_day(moment: datetime) -> date:
+    """Bucket for a timestamp; naive values (SQLite) are already UTC"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def _adjust_total(db: Session, donor_id: str, delta) -> int:
+    return db.execute(
+        update(User)
+        .where(User.id == donor_id)
+        .values(current_weekly_meals=func.coalesce(User.current_weekly_meals, 0) + delta)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def expire_buckets(db: Session, donor_id: str, today: date) -> int:
+    """Drop buckets older than the window and subtract them from the total.
+
+    ``DELETE ... RETURNING`` hands each expired bucket to exactly one
+    transaction, so concurrent callers never subtract it twice.
+    """
+    cutoff = today - timedelta(days=WEEK_DAYS - 1)
+    expired = db.execute(
+        delete(DonorDailyOffers)
+        .where(DonorDailyOffers.donor_id == donor_id, DonorDailyOffers.day < cutoff)
+        .returning(DonorDailyOffers.offers)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    total = sum(expired)
+    if total:
+        _adjust_total(db, donor_id, -total)
+    return total
+
+
+def reserve_offer_slot(db: Session, donor_id: str, now: Optional[datetime] = None) -> bool:
+    """Count one more offer for the donor unless that would pass their limit.
+
+    Returns False, changing nothing, when the limit is already reached. A
+    limit of None or 0 means unlimited. The caller commits (or rolls back)
+    together with the offer itself, and should stamp the offer with the same
+    ``now`` so a later delete finds its bucket.
+    """
+    today = utc_day(now or datetime.now(timezone.utc))
+    expire_buckets(db, donor_id, today)
+    current = func.coalesce(User.current_weekly_meals, 0)
+    reserved = db.execute(
+        update(User)
+        .where(
+            User.id == donor_id,
+            or_(
+                func.coalesce(User.weekly_meal_limit, 0) == 0,
+                current < User.weekly_meal_limit,
+            ),
+        )
+        .values(current_weekly_meals=current + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    if not reserved:
+        return False
+
+    # The donor row is locked until commit, so the bucket can't be
+    # inserted concurrently
+    bucket = (DonorDailyOffers.donor_id == donor_id, DonorDailyOffers.day == today)
+    updated = db.execute(
+        update(DonorDailyOffers)
+        .where(*bucket)
+        .values(offers=DonorDailyOffers.offers + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.execute(insert(DonorDailyOffers).values(donor_id=donor_id, day=today, offers=1))
+    return True
+
+
+def release_offer_slot(db: Session, offer: MealOffer) -> None:
+    """Give back the slot of an offer about to be deleted"""
+    if offer.status == OfferStatus.CLAIMED or offer.created_at is None:
+        return
+    released = db.execute(
+        update(DonorDailyOffers)
+        .where(
+            DonorDailyOffers.donor_id == offer.donor_id,
+            DonorDailyOffers.day == utc_day(offer.created_at),
+            DonorDailyOffers.offers > 0,
+        )
+        .values(offers=DonorDailyOffers.offers - 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if released:
+        _adjust_total(db, offer.donor_id, -1)
@@ -0,0 +1,217 @@
+"""
+Dietary, medical and logistics tags compiled to integer bitmasks.
+
+Each tag set on a request or offer is mirrored into an integer column with
+one bit per enum member, kept in step by mapper events. An offer's masks
+hold everything it *satisfies*, i.e. the closure of its tags under
+``IMPLIES`` (a Vegan meal is also Vegetarian and Dairy Free), while a
+request's masks hold exactly what it needs. "Offer satisfies request" is
+then a subset test, ``need & ~provides == 0``, which works the same in SQL
+and in Python.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, event, false, or_
+
+from app.models import (
+    DietaryPreference, MedicalPreference, FulfillmentOption, MealRequest, MealOffer
+)
+
+# Bit positions are stored in the database: append new members, never
+# renumber. "No Restrictions"/"None" carry no bit since they require nothing.
+DIETARY_BITS: Dict[DietaryPreference, int] = {
+    DietaryPreference.VEGETARIAN: 1 << 0,
+    DietaryPreference.VEGAN: 1 << 1,
+    DietaryPreference.HINDU_VEG: 1 << 2,
+    DietaryPreference.JAIN_VEG: 1 << 3,
+    DietaryPreference.HALAL: 1 << 4,
+    DietaryPreference.KOSHER: 1 << 5,
+    DietaryPreference.GLUTEN_FREE: 1 << 6,
+    DietaryPreference.NUT_FREE: 1 << 7,
+    DietaryPreference.NO_OIL: 1 << 8,
+}
+MEDICAL_BITS: Dict[MedicalPreference, int] = {
+    MedicalPreference.NO_OIL: 1 << 0,
+    MedicalPreference.NO_SUGAR: 1 << 1,
+    MedicalPreference.DAIRY_FREE: 1 << 2,
+    MedicalPreference.LOW_SODIUM: 1 << 3,
+    MedicalPreference.SOFT_FOOD: 1 << 4,
+}
+LOGISTICS_BITS: Dict[FulfillmentOption, int] = {
+    FulfillmentOption.PICKUP: 1 << 0,
+    FulfillmentOption.DELIVERY: 1 << 1,
+    FulfillmentOption.DINE_IN: 1 << 2,
+    FulfillmentOption.MEET_UP: 1 << 3,
+}
+
+ALL_DIETARY = sum(DIETARY_BITS.values())
+ALL_MEDICAL = sum(MEDICAL_BITS.values())
+
+# Tags are keyed by (kind, member): DietaryPreference.NO_OIL and
+# MedicalPreference.NO_OIL share a value and would otherwise collide.
+DIETARY = "dietary"
+MEDICAL = "medical"
+
+# Direct implications between tags. Kosher and Halal deliberately imply
+# nothing: neither certification covers the other.
+IMPLIES = {
+    (DIETARY, DietaryPreference.VEGAN): {
+        (DIETARY, DietaryPreference.VEGETARIAN),
+        (DIETARY, DietaryPreference.HINDU_VEG),
+        (MEDICAL, MedicalPreference.DAIRY_FREE),
+    },
+    (DIETARY, DietaryPreference.JAIN_VEG): {
+        (DIETARY, DietaryPreference.VEGETARIAN),
+        (DIETARY, DietaryPreference.HINDU_VEG),
+    },
+    (DIETARY, DietaryPreference.HINDU_VEG): {(DIETARY, DietaryPreference.VEGETARIAN)},
+    (DIETARY, DietaryPreference.NO_OIL): {(MEDICAL, MedicalPreference.NO_OIL)},
+    (MEDICAL, MedicalPreference.NO_OIL): {(DIETARY, DietaryPreference.NO_OIL)},
+}
+
+
+def _closure(tag) -> set:
+    seen = {tag}
+    pending = [tag]
+    while pending:
+        for implied in IMPLIES.get(pending.pop(), ()):
+            if implied not in seen:
+                seen.add(implied)
+                pending.append(implied)
+    return seen
+
+
+def _tag_bits(tags) -> Tuple[int, int]:
+    dietary = 0
+    medical = 0
+    for kind, member in tags:
+        if kind == DIETARY:
+            dietary |= DIETARY_BITS.get(member, 0)
+        else:
+            medical |= MEDICAL_BITS.get(member, 0)
+    return dietary, medical
+
+
+# Precomputed lattice: for each tag, the (dietary, medical) masks it provides
+PROVIDES: Dict[Tuple[str, object], Tuple[int, int]] = {
+    tag: _tag_bits(_closure(tag))
+    for tag in [(DIETARY, p) for p in DietaryPreference] + [(MEDICAL, p) for p in MedicalPreference]
+}
+
+
+def _parse(enum_type, values: Optional[Iterable]) -> list:
+    parsed = []
+    for value in values or ():
+        try:
+            parsed.append(enum_type(value))
+        except ValueError:
+            continue
+    return parsed
+
+
+def dietary_mask(values: Optional[Iterable]) -> int:
+    return _tag_bits((DIETARY, p) for p in _parse(DietaryPreference, values))[0]
+
+
+def medical_mask(values: Optional[Iterable]) -> int:
+    return _tag_bits((MEDICAL, p) for p in _parse(MedicalPreference, values))[1]
+
+
+def logistics_mask(values: Optional[Iterable]) -> int:
+    mask = 0
+    for option in _parse(FulfillmentOption, values):
+        mask |= LOGISTICS_BITS[option]
+    return mask
+
+
+def provided_masks(dietary_tags: Optional[Iterable], medical_tags: Optional[Iterable]) -> Tuple[int, int]:
+    """(dietary, medical) masks an offer with these tags satisfies"""
+    tags = [(DIETARY, p) for p in _parse(DietaryPreference, dietary_tags)]
+    tags += [(MEDICAL, p) for p in _parse(MedicalPreference, medical_tags)]
+    dietary = 0
+    medical = 0
+    for tag in tags:
+        tag_dietary, tag_medical = PROVIDES[tag]
+        dietary |= tag_dietary
+        medical |= tag_medical
+    return dietary, medical
+
+
+def dietary_names(mask: int) -> List[str]:
+    """Dietary preference values set in a mask"""
+    return [pref.value for pref, bit in DIETARY_BITS.items() if mask & bit]
+
+
+def satisfies(provided: Tuple[int, int, int], needed: Tuple[int, int, int]) -> bool:
+    """Whether (dietary, medical, logistics) masks of an offer meet a request's.
+
+    Every dietary and medical need must be provided; logistics only need to
+    share one option, and a request listing none accepts any.
+    """
+    return (
+        needed[0] & ~provided[0] == 0
+        and needed[1] & ~provided[1] == 0
+        and (needed[2] == 0 or needed[2] & provided[2] != 0)
+    )
+
+
+def offer_satisfies(offer: MealOffer, request: MealRequest) -> bool:
+    return satisfies(
+        (offer.dietary_mask or 0, offer.medical_mask or 0, offer.logistics_mask or 0),
+        (request.dietary_mask or 0, request.medical_mask or 0, request.logistics_mask or 0),
+    )
+
+
+def offers_satisfying(request: MealRequest):
+    """SQL filter for offers that satisfy the given request"""
+    clauses = [
+        MealOffer.dietary_mask.op("&")(request.dietary_mask) == request.dietary_mask,
+        MealOffer.medical_mask.op("&")(request.medical_mask) == request.medical_mask,
+    ]
+    if request.logistics_mask:
+        clauses.append(MealOffer.logistics_mask.op("&")(request.logistics_mask) != 0)
+    return and_(*clauses)
+
+
+def requests_satisfied_by(offer: MealOffer):
+    """SQL filter for requests the given offer satisfies"""
+    clauses = [
+        MealRequest.dietary_mask.op("&")(ALL_DIETARY & ~offer.dietary_mask) == 0,
+        MealRequest.medical_mask.op("&")(ALL_MEDICAL & ~offer.medical_mask) == 0,
+    ]
+    clauses.append(or_(
+        MealRequest.logistics_mask == 0,
+        MealRequest.logistics_mask.op("&")(offer.logistics_mask) != 0
+    ))
+    return and_(*clauses)
+
+
+def diet_filter(mask_column, diet: str):
+    """SQL filter for rows whose mask includes a dietary tag.
+
+    "No Restrictions" matches rows with no dietary tags; unknown values
+    match nothing.
+    """
+    try:
+        preference = DietaryPreference(diet)
+    except ValueError:
+        return false()
+    if preference is DietaryPreference.NONE:
+        return mask_column == 0
+    bit = DIETARY_BITS[preference]
+    return mask_column.op("&")(bit) != 0
+
+
+@event.listens_for(MealRequest, "before_insert")
+@event.listens_for(MealRequest, "before_update")
+def _compile_request_masks(mapper, connection, target: MealRequest) -> None:
+    target.dietary_mask = dietary_mask(target.dietary_needs)
+    target.medical_mask = medical_mask(target.medical_needs)
+    target.logistics_mask = logistics_mask(target.logistics)
+
+
+@event.listens_for(MealOffer, "before_insert")
+@event.listens_for(MealOffer, "before_update")
+def _compile_offer_masks(mapper, connection, target: MealOffer) -> None:
+    target.dietary_mask, target.medical_mask = provided_masks(target.dietary_tags, target.medical_tags)
+    target.logistics_mask = logistics_mask(target.logistics)
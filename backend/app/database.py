@@ -1,18 +1,92 @@
 import os
+import random
+import time
+from functools import wraps
+from typing import Iterator, List
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./studentsupport.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# "production" applies the pragmas below to every SQLite connection;
+# "default" leaves SQLite's own settings (rollback journal, small cache).
+# Opt-in: with concurrent readers it trades write throughput for reads
+# (see benchmarks/bench_sqlite_writes.py).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Transactions that still hit SQLITE_BUSY are retried this many times
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "5"))
+# Sized to the web threadpool (40 threads) so sync handlers never queue on
+# the pool while holding a thread
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "40"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Test connections before use, and replace them after this many seconds
+# (-1: never), so server restarts and idle timeouts don't surface as errors
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+
+
+def sqlite_pragmas() -> List[str]:
+    """Per-connection settings of the production SQLite profile.
+
+    WAL lets readers run alongside the single writer, and with it
+    ``synchronous=NORMAL`` is still crash-safe (only the last commits before
+    a power loss can be lost). ``auto_vacuum`` only takes effect on a new,
+    empty database; see ``app.maintenance`` for converting an existing one.
+    """
+    return [
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def configure_sqlite(engine: Engine) -> None:
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def make_engine(url: str, profile: str = SQLITE_PROFILE) -> Engine:
+    """Engine for ``url`` with the pool settings above (and, for SQLite, the profile's pragmas)"""
+    if not url.startswith("sqlite"):
+        return create_engine(url, **pool_options())
+    # The pool is sized whatever the profile; only the pragmas are opt-in.
+    # In-memory databases get a per-thread pool, which takes no sizing
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    new_engine = create_engine(url, connect_args={"check_same_thread": False}, **({} if in_memory else pool_options()))
+    if profile == "production":
+        configure_sqlite(new_engine)
+    return new_engine
+
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -27,8 +101,68 @@ def get_db():
         db.close()
 
 
+def is_busy_error(exc: Exception) -> bool:
+    """SQLITE_BUSY / SQLITE_LOCKED, which a retry of the transaction can clear.
+
+    Matched on the message so it works for both sqlite3 and aiosqlite.
+    """
+    message = str(getattr(exc, "orig", exc))
+    return "database is locked" in message or "database table is locked" in message
+
+
+def busy_delays() -> Iterator[float]:
+    """Seconds to wait before each retry: jittered exponential backoff"""
+    for attempt in range(SQLITE_BUSY_RETRIES):
+        yield min(1.0, 0.01 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+@event.listens_for(Session, "after_commit")
+def _note_commit(session: Session) -> None:
+    session.info["committed"] = True
+
+
+def mark_committed(db: Session) -> None:
+    """Record that ``db``'s request committed, through another session (group commit)"""
+    db.info["committed"] = True
+
+
+def can_retry(db: Session, exc: Exception) -> bool:
+    """Whether a handler that raised ``exc`` may be run again on ``db``.
+
+    Only busy errors before anything was committed: re-running a handler
+    whose writes are already in would apply (and publish) them twice.
+    """
+    return is_busy_error(exc) and not db.info.get("committed")
+
+
+def retry_on_busy(handler):
+    """Re-run ``handler`` (which takes its session as ``db``) on SQLITE_BUSY.
+
+    The busy timeout covers most lock waits; what gets through is a
+    transaction that read, then found another writer had committed before it
+    could write. Rolling back and running it again on a fresh snapshot fixes
+    that. A busy error after the handler committed is raised as is.
+    """
+    if not IS_SQLITE:
+        return handler
+
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        db = kwargs["db"]
+        db.info.pop("committed", None)
+        for delay in busy_delays():
+            try:
+                return handler(*args, **kwargs)
+            except OperationalError as exc:
+                if not can_retry(db, exc):
+                    raise
+                db.rollback()
+                time.sleep(delay)
+        return handler(*args, **kwargs)
+
+    return wrapper
+
+
 def get_database_url():
     """Helper function for Alembic to get DATABASE_URL"""
     return DATABASE_URL
-
-
@@ -0,0 +1,36 @@
+"""
+Batched user lookups shared by the list endpoints.
+
+Request, offer and rating responses embed a few fields of the author's
+profile. Looking the author up per row costs one query each; ``load_users``
+fetches every referenced user for a whole page in a single ``IN`` query.
+"""
+from typing import Dict, Iterable
+from sqlalchemy.orm import Session, load_only
+from app.models import User
+
+# Keep well below SQLite's bound-parameter limit
+_CHUNK_SIZE = 500
+
+# Columns the enrich_*_response helpers read from an author
+_AUTHOR_COLUMNS = (
+    User.id,
+    User.role,
+    User.display_name,
+    User.avatar_id,
+    User.verification_status,
+    User.languages,
+    User.city,
+    User.state,
+)
+
+
+def load_users(db: Session, user_ids: Iterable[str]) -> Dict[str, User]:
+    """Load the given users in as few queries as possible, keyed by id"""
+    ids = sorted({user_id for user_id in user_ids if user_id})
+    users: Dict[str, User] = {}
+    for start in range(0, len(ids), _CHUNK_SIZE):
+        chunk = ids[start:start + _CHUNK_SIZE]
+        rows = db.query(User).options(load_only(*_AUTHOR_COLUMNS)).filter(User.id.in_(chunk)).all()
+        users.update((user.id, user) for user in rows)
+    return users
@@ -0,0 +1,51 @@
+"""
+Entity tags for conditional requests.
+
+Snapshots get strong tags hashed from their exact bytes. Item detail
+endpoints get weak tags hashed from version columns (``updated_at``, the
+author's ``updated_at``), so the tag is known before the response is built
+and a matching ``If-None-Match`` is answered with ``304`` without doing any
+of that work.
+
+``If-Match`` on updates compares the same tags, ignoring ``W/``: they change
+on every write to the row, which is all a lost-update check needs.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import HTTPException, Response, status
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def weak_etag(*versions: Any) -> str:
+    digest = hashlib.sha256("|".join(str(version) for version in versions).encode("utf-8")).hexdigest()
+    return 'W/"' + digest[:24] + '"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match``/``If-Match`` header lists ``etag`` (or is ``*``)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def require_match(if_match: Optional[str], etag: str) -> None:
+    """Raise 412 when ``If-Match`` was sent and names another version"""
+    if if_match is not None and not etag_matches(if_match, etag):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="This item was changed by someone else; reload it and try again"
+        )
@@ -0,0 +1,204 @@
+"""
+Marketplace change feed streamed to browse pages as Server-Sent Events.
+
+Handlers that create, change or delete requests and offers publish a compact
+event here. Events are kept in a bounded in-memory log, so a reconnecting
+client sending ``Last-Event-ID`` receives only what it missed. If its id has
+already fallen out of the log (or comes from before this worker started) it
+gets a ``reset`` event and should reload the list once.
+
+Like ``app.realtime``, events travel through a fan-out backend so that every
+worker's log sees every change when ``REALTIME_BACKEND_URL`` is set. Ids come
+from the backend's single sequence (a Redis counter bumped atomically with the
+publish), so every worker receives events in id order and a client can
+resume on any worker.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.compatibility import dietary_names
+from app.realtime import FanoutBackend, LocalBackend, RedisBackend, REALTIME_BACKEND_URL
+
+FEED_BUFFER_SIZE = int(os.getenv("FEED_BUFFER_SIZE", "1000"))
+HEARTBEAT_SECONDS = 15.0
+
+
+class FeedFilter:
+    """Subscriber-side filter on city, status and diet"""
+
+    __slots__ = ("city", "status", "diet")
+
+    def __init__(self, city: Optional[str] = None, status: Optional[str] = None, diet: Optional[str] = None):
+        self.city = city.strip().casefold() if city else None
+        self.status = status
+        self.diet = diet
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        # Deletions carry no attributes worth filtering on, and an update may
+        # take an item out of the filter, which the client must hear about to
+        # drop it; always pass both
+        if event["action"] in ("deleted", "updated"):
+            return True
+        if self.city and self.city not in (event.get("city") or "").casefold():
+            return False
+        if self.status and event.get("status") != self.status:
+            return False
+        if self.diet and self.diet not in (event.get("diet") or []):
+            return False
+        return True
+
+
+class MarketplaceFeed:
+    def __init__(self, backend: Optional[FanoutBackend] = None, size: int = FEED_BUFFER_SIZE):
+        self.backend = backend or LocalBackend()
+        self._events: deque = deque(maxlen=size)
+        self._waiters: Set[asyncio.Event] = set()
+        self._lock = threading.Lock()
+        self._last_id = 0
+        # Clients resuming from an id below this may have missed events
+        self._floor = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self.backend.start(self._append, loop)
+        # Events numbered up to here were published before this log existed
+        floor = await self.backend.current_sequence()
+        with self._lock:
+            self._floor = floor
+            self._last_id = max(self._last_id, floor)
+        self._loop = loop
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+        self._loop = None
+
+    def publish(self, action: str, kind: str, item_id: str, **fields: Any) -> None:
+        """Record a change; safe to call from any thread"""
+        if self._loop is None:
+            return
+        event = {"action": action, "kind": kind, "item_id": item_id}
+        event.update(fields)
+        self.backend.publish_sequenced(event, key="id")
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._floor = self._events[0]["id"]
+            self._events.append(event)
+            self._last_id = max(self._last_id, event["id"])
+            waiters = list(self._waiters)
+        loop = self._loop
+        if loop is not None:
+            for waiter in waiters:
+                loop.call_soon_threadsafe(waiter.set)
+
+    def events_since(self, last_id: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """Events newer than ``last_id``, or None if the log no longer covers it"""
+        if last_id is None:
+            return []
+        with self._lock:
+            if last_id < self._floor or last_id > self._last_id:
+                return None
+            events = list(self._events)
+        return [event for event in events if event["id"] > last_id]
+
+    def latest_id(self) -> int:
+        """The highest id received"""
+        with self._lock:
+            return self._last_id
+
+    async def stream(self, request, feed_filter: FeedFilter, last_event_id: Optional[int]) -> AsyncIterator[str]:
+        """Yield SSE frames until the client disconnects"""
+        waiter = asyncio.Event()
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            cursor = self.latest_id() if last_event_id is None else last_event_id
+            while True:
+                waiter.clear()
+                backlog = self.events_since(cursor)
+                if backlog is None:
+                    # Resumed from, or fell behind to, an id the log no longer
+                    # covers; events after the reset are sent as usual
+                    cursor = self.latest_id()
+                    yield format_sse({"reason": "history expired"}, event="reset")
+                    continue
+                if backlog:
+                    for event in backlog:
+                        cursor = event["id"]
+                        if feed_filter.matches(event):
+                            yield format_sse(event, event_id=event["id"], event=event["kind"])
+                    continue
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                if await request.is_disconnected():
+                    return
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+def format_sse(data: Dict[str, Any], event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _create_backend() -> FanoutBackend:
+    if REALTIME_BACKEND_URL.startswith(("redis://", "rediss://")):
+        return RedisBackend(REALTIME_BACKEND_URL, channel="studentsupport:feed")
+    return LocalBackend()
+
+
+feed = MarketplaceFeed(_create_backend())
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def publish_request(action: str, request) -> None:
+    """Publish a change to a MealRequest"""
+    if not feed.started:
+        return
+    if action == "deleted":
+        feed.publish(action, "request", request.id)
+        return
+    feed.publish(
+        action, "request", request.id,
+        status=_enum_value(request.status),
+        city=request.city,
+        diet=[_enum_value(tag) for tag in request.dietary_needs or []],
+        urgency=request.urgency,
+    )
+
+
+def publish_offer(action: str, offer) -> None:
+    """Publish a change to a MealOffer"""
+    if not feed.started:
+        return
+    if action == "deleted":
+        feed.publish(action, "offer", offer.id)
+        return
+    feed.publish(
+        action, "offer", offer.id,
+        status=_enum_value(offer.status),
+        city=offer.city,
+        # Everything the offer satisfies, matching the browse ``diet`` filter
+        diet=dietary_names(offer.dietary_mask or 0),
+    )
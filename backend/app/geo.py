@@ -0,0 +1,204 @@
+"""
+Geohash encoding and radius search helpers.
+
+Requests and offers store a geohash of their coordinates. A radius query
+first prunes candidates in SQL to the geohash cells covering the search
+circle (an indexed range scan per cell), then applies an exact haversine
+check in Python, fetching the candidates in batches.
+"""
+import heapq
+import math
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+from app.pagination import encode_cursor, keyset_filter
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 500.0
+# Candidate rows fetched per query by ``page_nearby``
+NEARBY_BATCH_SIZE = 500
+# Sorts after every geohash character, so ``prefix + _UPPER`` bounds a prefix
+# range; relies on the column's code point collation (see ``PrefixString``)
+_UPPER = "~"
+
+Origin = Tuple[float, float]
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_or_none(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode_geohash(latitude, longitude)
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """(latitude, longitude) extent in degrees of a geohash cell"""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """Geohash prefixes whose union covers the circle around a point.
+
+    Uses the finest precision at which a cell is at least ``radius_km`` on
+    each side, then takes the 3x3 block of cells around the centre. Radii too
+    large for any cell yield the empty prefix, i.e. no pruning.
+    """
+    # Longitude degrees shrink towards the poles; size cells for the worst edge
+    worst_lat = min(89.9, abs(latitude) + radius_km / KM_PER_DEGREE)
+    lng_km_per_degree = KM_PER_DEGREE * math.cos(math.radians(worst_lat))
+
+    precision = 0
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lng_deg = cell_size_degrees(candidate)
+        if lat_deg * KM_PER_DEGREE >= radius_km and lng_deg * lng_km_per_degree >= radius_km:
+            precision = candidate
+            break
+
+    lat_deg, lng_deg = cell_size_degrees(precision)
+    cells: Set[str] = set()
+    for d_lat in (-lat_deg, 0.0, lat_deg):
+        for d_lng in (-lng_deg, 0.0, lng_deg):
+            lat = max(-90.0, min(90.0, latitude + d_lat))
+            lng = (longitude + d_lng + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lng, precision))
+    return sorted(cells)
+
+
+def parse_near(near: str) -> Origin:
+    """Parse a ``lat,lng`` query parameter"""
+    try:
+        lat_text, lng_text = near.split(",")
+        latitude, longitude = float(lat_text), float(lng_text)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="near must be 'lat,lng'")
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="near is out of range")
+    return latitude, longitude
+
+
+def search_area(near: Optional[str], radius_km: Optional[float], user=None) -> Tuple[Origin, float]:
+    """Centre and radius of a nearby search.
+
+    ``near`` if given, otherwise the user's saved location and service
+    ``radius``; ``radius_km`` overrides the radius either way.
+    """
+    if near:
+        return parse_near(near), radius_km or DEFAULT_RADIUS_KM
+    if user is None or user.latitude is None or user.longitude is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="near is required without a saved location")
+    return (user.latitude, user.longitude), radius_km or min(user.radius or DEFAULT_RADIUS_KM, MAX_RADIUS_KM)
+
+
+def near_clause(geohash_column, origin: Origin, radius_km: float):
+    """SQL filter restricting rows to the geohash cells around ``origin``"""
+    return or_(*(
+        and_(geohash_column >= prefix, geohash_column < prefix + _UPPER)
+        for prefix in covering_cells(origin[0], origin[1], radius_km)
+    ))
+
+
+def within_radius(rows: Iterable, origin: Origin, radius_km: float) -> List[Tuple[object, float]]:
+    """Rows (with ``latitude``/``longitude``) inside the radius, with distances"""
+    matches = []
+    for row in rows:
+        if row.latitude is None or row.longitude is None:
+            continue
+        distance = haversine_km(origin[0], origin[1], row.latitude, row.longitude)
+        if distance <= radius_km:
+            matches.append((row, distance))
+    return matches
+
+
+def _candidate_batches(db, query, timestamp_column, id_column, cursor: Optional[str]) -> Iterator[List[object]]:
+    """The query's rows newest first, ``NEARBY_BATCH_SIZE`` per keyset query"""
+    while True:
+        batch = query.filter(keyset_filter(db, timestamp_column, id_column, cursor)) if cursor else query
+        rows = batch.order_by(timestamp_column.desc(), id_column.desc()).limit(NEARBY_BATCH_SIZE).all()
+        yield rows
+        if len(rows) < NEARBY_BATCH_SIZE:
+            return
+        cursor = encode_cursor(getattr(rows[-1], timestamp_column.key), getattr(rows[-1], id_column.key))
+
+
+def page_nearby(
+    db,
+    query,
+    timestamp_column,
+    id_column,
+    origin: Origin,
+    radius_km: float,
+    cursor: Optional[str],
+    limit: Optional[int],
+    by_distance: bool,
+) -> Tuple[List[object], List[float], Optional[str]]:
+    """Run a radius search, returning rows, their distances and a next cursor.
+
+    Results are newest first and keyset-paged like the other list endpoints,
+    or nearest first (``by_distance``), in which case ``limit`` caps the
+    result and there is no next page. Newest-first searches stop fetching
+    once a row past the page is found; nearest-first ones read every
+    candidate but keep only the ``limit`` nearest.
+    """
+    if by_distance and cursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor can't be combined with sort=distance")
+
+    matches: List[Tuple[object, float]] = []
+    for rows in _candidate_batches(db, query, timestamp_column, id_column, cursor):
+        matches.extend(within_radius(rows, origin, radius_km))
+        if by_distance:
+            if limit is not None:
+                matches = heapq.nsmallest(limit, matches, key=lambda match: match[1])
+        elif limit is not None and len(matches) > limit:
+            break
+    if by_distance:
+        matches.sort(key=lambda match: match[1])
+
+    next_cursor = None
+    if limit is not None and len(matches) > limit:
+        matches = matches[:limit]
+        if not by_distance:
+            last = matches[-1][0]
+            next_cursor = encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+    return [row for row, _ in matches], [distance for _, distance in matches], next_cursor
@@ -0,0 +1,246 @@
+"""
+Offline geocoding from postal-code and city centroids.
+
+Most users, requests and offers only carry ``city/state/zip``. This fills in
+``latitude``/``longitude`` from a centroid table instead: the ZIP code's
+centroid if it is known, otherwise the mean of the city's ZIP centroids.
+Only US addresses are placed; nothing goes over the network.
+
+The table is compiled from ``app/data/postal_centroids.csv`` (``zip, city,
+state, latitude, longitude``) by ``python -m app.geocoder build`` into
+``.npy`` files in ``GEOCODER_DATA_DIR`` (those for the bundled CSV are
+committed next to it; rebuild them after editing it):
+sorted keys (ZIP codes as integers, cities as 64-bit hashes of the
+normalized ``city|state``) and, beside them, their ``float32`` coordinates.
+Each process opens them memory-mapped, so workers share the pages, and a
+lookup is one binary search (``searchsorted``), a few microseconds.
+
+The bundled CSV only covers a sample of campus ZIP codes. Compile the full
+table from the Census ZCTA gazetteer (or any CSV in the same format):
+
+    python -m app.geocoder build 2020_Gaz_zcta_national.txt --gazetteer
+
+Running workers keep the mapping of the old table until they are restarted.
+
+To fill in rows created before geocoding was enabled, or before a larger
+table was built, run:
+
+    python -m app.geocoder backfill
+"""
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import Engine
+
+from app.geo import geohash_or_none
+from app.locations import normalize
+from app.models import MealOffer, MealRequest, User
+
+DATA_DIR = Path(__file__).parent / "data"
+GEOCODER_DATA_DIR = Path(os.getenv("GEOCODER_DATA_DIR", str(DATA_DIR)))
+SEED_CSV = DATA_DIR / "postal_centroids.csv"
+# Keys and coordinates of each table, by file name
+TABLES = {"zip": np.uint32, "city": np.uint64}
+
+US_COUNTRIES = {"", "united states", "united states of america", "usa", "us"}
+_ZIP = re.compile(r"\s*(\d{5})")
+
+Coordinates = Tuple[float, float]
+Row = Tuple[str, str, str, float, float]
+
+logger = logging.getLogger(__name__)
+
+
+def city_key(city: Optional[str], state: Optional[str]) -> int:
+    digest = hashlib.blake2b(f"{normalize(city)}|{normalize(state)}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def parse_zip(zip: Optional[str]) -> Optional[int]:
+    match = _ZIP.match(zip or "")
+    return int(match[1]) if match else None
+
+
+# Compiling
+
+def read_centroids(path: Path) -> List[Row]:
+    """(zip, city, state, latitude, longitude) rows of a centroid CSV"""
+    with open(path, newline="", encoding="utf-8") as source:
+        return [
+            (row["zip"], row.get("city") or "", row.get("state") or "",
+             float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(source)
+        ]
+
+
+def read_gazetteer(path: Path) -> List[Row]:
+    """Rows of a Census ZCTA gazetteer file (tab separated; no city names)"""
+    with open(path, newline="", encoding="utf-8") as source:
+        reader = csv.DictReader(source, delimiter="\t")
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        return [(row["GEOID"], "", "", float(row["INTPTLAT"]), float(row["INTPTLONG"])) for row in reader]
+
+
+def compile_centroids(rows: Iterable[Row], directory: Path) -> Tuple[int, int]:
+    """Write the sorted ZIP and city tables; returns how many of each"""
+    zips: Dict[int, Coordinates] = {}
+    cities: Dict[int, List[Coordinates]] = defaultdict(list)
+    for zip, city, state, latitude, longitude in rows:
+        code = parse_zip(zip)
+        if code is not None:
+            zips[code] = (latitude, longitude)
+        if city and state:
+            cities[city_key(city, state)].append((latitude, longitude))
+
+    centroids = {
+        "zip": zips,
+        "city": {key: tuple(np.mean(points, axis=0)) for key, points in cities.items()},
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    for table, key_type in TABLES.items():
+        keys = sorted(centroids[table])
+        arrays = {
+            "keys": np.array(keys, dtype=key_type),
+            "points": np.array([centroids[table][key] for key in keys], dtype=np.float32).reshape(-1, 2),
+        }
+        for part, array in arrays.items():
+            # Replace atomically: other workers may have the old file mapped
+            target = directory / f"{table}_{part}.npy"
+            partial = directory / f".{target.name}.{os.getpid()}"
+            with open(partial, "wb") as output:
+                np.save(output, array)
+            os.replace(partial, target)
+    return len(zips), len(cities)
+
+
+# Lookups
+
+class Geocoder:
+    """Centroid lookups over the memory-mapped arrays in ``directory``"""
+
+    def __init__(self, directory: Path = GEOCODER_DATA_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+
+    def _open(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Map the compiled tables; never writes, so a read-only install works"""
+        with self._lock:
+            if self._tables is None:
+                try:
+                    self._tables = {
+                        table: (np.load(self.directory / f"{table}_keys.npy", mmap_mode="r"),
+                                np.load(self.directory / f"{table}_points.npy", mmap_mode="r"))
+                        for table in TABLES
+                    }
+                except (OSError, ValueError):
+                    logger.warning("No centroid table in %s; coordinates won't be filled in", self.directory)
+                    self._tables = {
+                        table: (np.empty(0, dtype=key_type), np.empty((0, 2), dtype=np.float32))
+                        for table, key_type in TABLES.items()
+                    }
+            return self._tables
+
+    @staticmethod
+    def _find(table: Tuple[np.ndarray, np.ndarray], key: int) -> Optional[Coordinates]:
+        keys, points = table
+        position = int(np.searchsorted(keys, keys.dtype.type(key)))
+        if position < len(keys) and int(keys[position]) == key:
+            latitude, longitude = points[position]
+            return round(float(latitude), 5), round(float(longitude), 5)
+        return None
+
+    def locate(self, zip: Optional[str], city: Optional[str], state: Optional[str],
+               country: Optional[str] = None) -> Optional[Coordinates]:
+        """Centroid of the ZIP code, else of the city; None if neither is known"""
+        if normalize(country) not in US_COUNTRIES:
+            return None
+        tables = self._open()
+        code = parse_zip(zip)
+        found = self._find(tables["zip"], code) if code is not None else None
+        if found is None and city and state:
+            found = self._find(tables["city"], city_key(city, state))
+        return found
+
+
+geocoder = Geocoder()
+
+
+def fill_coordinates(latitude: Optional[float], longitude: Optional[float], zip: Optional[str],
+                     city: Optional[str], state: Optional[str],
+                     country: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """The given coordinates, or the centroid of the address when they are missing"""
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    found = geocoder.locate(zip, city, state, country)
+    return found if found is not None else (latitude, longitude)
+
+
+# Backfill
+
+def backfill(engine: Engine, batch_size: int = 1000) -> Dict[str, int]:
+    """Fill in coordinates (and geohashes) of rows that have none; returns rows updated per table"""
+    report = {}
+    for model in (User, MealRequest, MealOffer):
+        table = model.__table__
+        has_geohash = "geohash" in table.c
+        statement = update(table).where(table.c.id == bindparam("row_id")).values(
+            latitude=bindparam("lat"), longitude=bindparam("lng"),
+            **({"geohash": bindparam("hash")} if has_geohash else {})
+        )
+        updated = 0
+        after = ""
+        while True:
+            with engine.begin() as connection:
+                rows = connection.execute(
+                    select(table.c.id, table.c.zip, table.c.city, table.c.state, table.c.country)
+                    .where(table.c.latitude.is_(None), table.c.id > after)
+                    .order_by(table.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                after = rows[-1].id
+                params = []
+                for row in rows:
+                    found = geocoder.locate(row.zip, row.city, row.state, row.country)
+                    if found is not None:
+                        param = {"row_id": row.id, "lat": found[0], "lng": found[1]}
+                        if has_geohash:
+                            param["hash"] = geohash_or_none(*found)
+                        params.append(param)
+                if params:
+                    connection.execute(statement, params)
+                    updated += len(params)
+        report[table.name] = updated
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline postal-code geocoder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a centroid CSV into the lookup arrays")
+    build.add_argument("source", type=Path, nargs="?", default=SEED_CSV)
+    build.add_argument("--gazetteer", action="store_true", help="source is a Census ZCTA gazetteer file")
+    fill = commands.add_parser("backfill", help="fill in coordinates of existing rows")
+    fill.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        rows = read_gazetteer(args.source) if args.gazetteer else read_centroids(args.source)
+        zip_count, city_count = compile_centroids(rows, geocoder.directory)
+        print(f"Compiled {zip_count} ZIP codes and {city_count} cities into {geocoder.directory}")
+    else:
+        from app.database import engine
+
+        print(backfill(engine, args.batch_size))
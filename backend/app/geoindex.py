@@ -0,0 +1,198 @@
+"""
+NumPy point index for radius and nearest-neighbour searches.
+
+A ``PointIndex`` keeps ids and coordinates (radians) in arrays sorted by
+grid cell, ``GEO_GRID_DEGREES`` on a side (default 0.25, about 28 km of
+latitude). A search finds the cells overlapping the circle's bounding box
+with ``searchsorted`` (one key range per row of cells), computes haversine
+distances to those candidates in one vectorized pass and keeps the ones
+inside the radius, nearest first; with ``k`` only the k nearest are sorted
+(``argpartition``).
+
+Writes don't touch the sorted arrays: an upsert goes to a small unsorted
+tail, which searches scan by brute force, and a removal clears the entry's
+bit in a live mask. The arrays are rebuilt by the next search once the tail
+passes ``_TAIL_LIMIT`` or a quarter of the entries are dead.
+"""
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.geo import EARTH_RADIUS_KM
+
+GEO_GRID_DEGREES = float(os.getenv("GEO_GRID_DEGREES", "0.25"))
+
+# Upserts held outside the sorted arrays before they are rebuilt
+_TAIL_LIMIT = 1024
+
+
+def haversine_km_many(latitude: float, longitude: float, lats: np.ndarray, lngs: np.ndarray,
+                      cos_lats: np.ndarray) -> np.ndarray:
+    """Distances from one point (degrees) to arrays of points (radians, with their cosines)"""
+    phi = math.radians(latitude)
+    a = (np.sin((lats - phi) / 2) ** 2
+         + math.cos(phi) * cos_lats * np.sin((lngs - math.radians(longitude)) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _Arrays:
+    """Sorted arrays of one build; searches read them without the lock"""
+
+    __slots__ = ("ids", "lats", "lngs", "cos_lats", "cells", "live")
+
+    def __init__(self, ids: np.ndarray, lats: np.ndarray, lngs: np.ndarray, cells: np.ndarray):
+        order = np.argsort(cells, kind="stable")
+        self.ids = ids[order]
+        self.lats = lats[order]
+        self.lngs = lngs[order]
+        self.cos_lats = np.cos(self.lats)
+        self.cells = cells[order]
+        # Cleared in place by removals
+        self.live = np.ones(len(order), dtype=bool)
+
+
+class PointIndex:
+    """Ids with coordinates, searchable by radius and nearest first"""
+
+    def __init__(self, grid_degrees: float = GEO_GRID_DEGREES):
+        self.grid_degrees = grid_degrees
+        self._rows = int(math.ceil(180.0 / grid_degrees))
+        self._cols = int(math.ceil(360.0 / grid_degrees))
+        self._lock = threading.Lock()
+        self._arrays = self._build([], [], [])
+        self._positions: Dict[str, int] = {}
+        self._tail: Dict[str, Tuple[float, float]] = {}
+        self._dead = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._positions) + len(self._tail)
+
+    def _cells(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Grid cell numbers of points given in degrees"""
+        rows = np.clip(((lats + 90.0) // self.grid_degrees).astype(np.int64), 0, self._rows - 1)
+        cols = np.clip(((lngs + 180.0) // self.grid_degrees).astype(np.int64), 0, self._cols - 1)
+        return rows * self._cols + cols
+
+    def _build(self, ids: List[str], lats: List[float], lngs: List[float]) -> _Arrays:
+        lats_deg = np.asarray(lats, dtype=np.float64)
+        lngs_deg = np.asarray(lngs, dtype=np.float64)
+        return _Arrays(np.asarray(ids, dtype=object), np.radians(lats_deg), np.radians(lngs_deg),
+                       self._cells(lats_deg, lngs_deg))
+
+    # Writes
+
+    def load(self, points: Iterable[Tuple[str, float, float]]) -> None:
+        """Replace the contents with ``points`` (id, latitude, longitude), sorted at once"""
+        ids, lats, lngs = [], [], []
+        for item_id, latitude, longitude in points:
+            ids.append(item_id)
+            lats.append(latitude)
+            lngs.append(longitude)
+        arrays = self._build(ids, lats, lngs)
+        with self._lock:
+            self._arrays = arrays
+            self._positions = {item_id: position for position, item_id in enumerate(arrays.ids.tolist())}
+            self._tail = {}
+            self._dead = 0
+
+    def upsert(self, item_id: str, latitude: float, longitude: float) -> None:
+        with self._lock:
+            self._remove(item_id)
+            self._tail[item_id] = (latitude, longitude)
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id: str) -> None:
+        position = self._positions.pop(item_id, None)
+        if position is not None:
+            self._arrays.live[position] = False
+            self._dead += 1
+        self._tail.pop(item_id, None)
+
+    def _compact(self) -> None:
+        """Merge the tail into freshly sorted arrays, dropping dead entries"""
+        arrays = self._arrays
+        live = np.flatnonzero(arrays.live)
+        ids = arrays.ids[live].tolist() + list(self._tail)
+        lats = np.degrees(arrays.lats[live]).tolist() + [point[0] for point in self._tail.values()]
+        lngs = np.degrees(arrays.lngs[live]).tolist() + [point[1] for point in self._tail.values()]
+        self._arrays = self._build(ids, lats, lngs)
+        self._positions = {item_id: position for position, item_id in enumerate(self._arrays.ids.tolist())}
+        self._tail = {}
+        self._dead = 0
+
+    # Searches
+
+    def _candidates(self, cells: np.ndarray, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Positions in ``cells`` of the grid cells overlapping the circle's bounding box"""
+        angle = radius_km / EARTH_RADIUS_KM
+        lat_delta = math.degrees(angle)
+        lat_lo, lat_hi = latitude - lat_delta, latitude + lat_delta
+        spread = math.sin(angle) / max(math.cos(math.radians(latitude)), 1e-12)
+        if lat_lo <= -90.0 or lat_hi >= 90.0 or spread >= 1.0:
+            # The circle reaches a pole or wraps all the way round
+            col_ranges = [(0, self._cols - 1)]
+        else:
+            lng_delta = math.degrees(math.asin(spread))
+            col_lo = int((longitude - lng_delta + 180.0) // self.grid_degrees)
+            col_hi = int((longitude + lng_delta + 180.0) // self.grid_degrees)
+            if col_hi - col_lo + 1 >= self._cols:
+                col_ranges = [(0, self._cols - 1)]
+            elif col_lo < 0:
+                col_ranges = [(col_lo + self._cols, self._cols - 1), (0, col_hi)]
+            elif col_hi >= self._cols:
+                col_ranges = [(col_lo, self._cols - 1), (0, col_hi - self._cols)]
+            else:
+                col_ranges = [(col_lo, col_hi)]
+        row_lo = max(0, int((max(lat_lo, -90.0) + 90.0) // self.grid_degrees))
+        row_hi = min(self._rows - 1, int((min(lat_hi, 90.0) + 90.0) // self.grid_degrees))
+
+        if col_ranges == [(0, self._cols - 1)]:
+            # Whole rows are adjacent in cell order: one range
+            lows = np.array([row_lo * self._cols])
+            highs = np.array([row_hi * self._cols + self._cols - 1])
+        else:
+            rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self._cols
+            lows = np.concatenate([rows + first for first, _ in col_ranges])
+            highs = np.concatenate([rows + last for _, last in col_ranges])
+        starts = np.searchsorted(cells, lows, side="left")
+        ends = np.searchsorted(cells, highs, side="right")
+        spans = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def search(self, latitude: float, longitude: float, radius_km: float,
+               k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(id, distance in km) of the points within ``radius_km``, nearest first, at most ``k``"""
+        with self._lock:
+            if len(self._tail) > _TAIL_LIMIT or self._dead > len(self._arrays.ids) // 4:
+                self._compact()
+            arrays, tail = self._arrays, list(self._tail.items())
+
+        positions = self._candidates(arrays.cells, latitude, longitude, radius_km)
+        positions = positions[arrays.live[positions]]
+        distances = haversine_km_many(latitude, longitude, arrays.lats[positions], arrays.lngs[positions],
+                                      arrays.cos_lats[positions])
+        inside = distances <= radius_km
+        ids, distances = arrays.ids[positions[inside]], distances[inside]
+
+        if tail:
+            tail_ids = np.asarray([item_id for item_id, _ in tail], dtype=object)
+            tail_lats = np.radians(np.asarray([point[0] for _, point in tail], dtype=np.float64))
+            tail_lngs = np.radians(np.asarray([point[1] for _, point in tail], dtype=np.float64))
+            tail_distances = haversine_km_many(latitude, longitude, tail_lats, tail_lngs, np.cos(tail_lats))
+            tail_inside = tail_distances <= radius_km
+            ids = np.concatenate([ids, tail_ids[tail_inside]])
+            distances = np.concatenate([distances, tail_distances[tail_inside]])
+
+        if k is not None and len(distances) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            ids, distances = ids[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(ids[order].tolist(), distances[order].tolist()))
+
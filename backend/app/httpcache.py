@@ -0,0 +1,319 @@
+"""
+Shared cache for the public browse and detail GET routes.
+
+With ``RESPONSE_CACHE=1``, ``ResponseCacheMiddleware`` keeps the complete
+response (status, headers and body bytes) of ``GET /requests``,
+``/requests/{id}``, ``/offers``, ``/offers/{id}`` and ``/ratings``, keyed by
+path and the sorted query parameters. A repeat is answered without running
+the handler; a matching ``If-None-Match`` gets a ``304``.
+
+- Entries are evicted least recently used once their bodies pass
+  ``RESPONSE_CACHE_MAX_BYTES`` (default 64 MiB); a body over a quarter of
+  that isn't stored.
+- Concurrent misses for one key run the handler once; the others wait for
+  its response.
+- There is no TTL. Each entry carries tags (``requests``, ``request:<id>``,
+  ``user:<author id>``...), and the handlers that create, change, moderate or
+  delete those things invalidate the tags after committing. A response that
+  was being built while one of its tags was invalidated is served but not
+  stored. Fills read the primary database, so a lagging replica can't be
+  frozen into the cache.
+
+Invalidations travel through a fan-out backend like the marketplace feed,
+so with ``REALTIME_BACKEND_URL`` set every worker drops its entries.
+The cache is opt-in because writes made outside the API (scripts, the seed,
+manual SQL) fire no tags.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from app.etags import etag_matches
+from app.realtime import FanoutBackend, LocalBackend, RedisBackend, REALTIME_BACKEND_URL
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Set on the scope of a request filling the cache; get_read_db reads the primary
+READ_PRIMARY = "read_primary"
+
+# How many recent invalidations are remembered to check fills against
+_RECENT_INVALIDATIONS = 1024
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+Headers = List[Tuple[bytes, bytes]]
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "tags", "size")
+
+    def __init__(self, status: int, headers: Headers, body: bytes, tags: frozenset = frozenset()):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = next((value.decode("latin-1") for name, value in headers if name == b"etag"), None)
+        self.tags = tags
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers)
+
+
+class ResponseCache:
+    """Byte-budgeted LRU of responses, invalidated by tag"""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, backend: Optional[FanoutBackend] = None):
+        self.max_bytes = max_bytes
+        self.backend = backend or LocalBackend()
+        self._entries: "OrderedDict[Key, CachedResponse]" = OrderedDict()
+        self._by_tag: Dict[str, Set[Key]] = {}
+        self._bytes = 0
+        self._seq = 0
+        self._recent: deque = deque(maxlen=_RECENT_INVALIDATIONS)
+        self._lock = threading.Lock()
+        self._started = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver, asyncio.get_running_loop())
+        self._started = True
+
+    async def stop(self) -> None:
+        self._started = False
+        await self.backend.stop()
+
+    def get(self, key: Key) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def mark(self) -> int:
+        """Position in the invalidation log, taken before building a response"""
+        with self._lock:
+            return self._seq
+
+    def put(self, key: Key, entry: CachedResponse, since: int) -> bool:
+        """Store ``entry`` unless one of its tags was invalidated after ``since``"""
+        if entry.size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if self._seq != since:
+                if not self._recent or self._recent[0][0] > since + 1:
+                    return False
+                if any(seq > since and tags & entry.tags for seq, tags in self._recent):
+                    return False
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop entries carrying any of ``tags``, here and in every other worker"""
+        self._drop(tags)
+        if self._started:
+            self.backend.publish({"tags": list(tags)})
+
+    def _deliver(self, envelope: Dict[str, Any]) -> None:
+        self._drop(envelope.get("tags") or ())
+
+    def _drop(self, tags: Iterable[str]) -> None:
+        tags = frozenset(tags)
+        with self._lock:
+            self._seq += 1
+            self._recent.append((self._seq, tags))
+            self.invalidations += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": RESPONSE_CACHE,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _create_backend() -> FanoutBackend:
+    if REALTIME_BACKEND_URL.startswith(("redis://", "rediss://")):
+        return RedisBackend(REALTIME_BACKEND_URL, channel="studentsupport:responses")
+    return LocalBackend()
+
+
+response_cache = ResponseCache(backend=_create_backend())
+
+
+def invalidate_request(request_id: str) -> None:
+    response_cache.invalidate("requests", f"request:{request_id}")
+
+
+def invalidate_offer(offer_id: str) -> None:
+    response_cache.invalidate("offers", f"offer:{offer_id}")
+
+
+def invalidate_ratings() -> None:
+    response_cache.invalidate("ratings")
+
+
+def invalidate_users(user_ids: Iterable[str]) -> None:
+    """Profile changes show up in every list and in their own items' detail"""
+    response_cache.invalidate("requests", "offers", "ratings", *(f"user:{user_id}" for user_id in user_ids))
+
+
+TagRule = Callable[[re.Match, Dict[str, str], bytes], Set[str]]
+
+
+def _author_tag(body: bytes, field: str) -> Set[str]:
+    author = json.loads(body).get(field)
+    return {f"user:{author}"} if author else set()
+
+
+# Cached routes: path pattern -> tags for a response, from the path match,
+# query parameters and body
+CACHED_ROUTES: List[Tuple[re.Pattern, TagRule]] = [
+    (re.compile(r"^/requests$"),
+     lambda match, params, body: {"requests"} | ({f"offer:{params['for_offer']}"} if "for_offer" in params else set())),
+    (re.compile(r"^/requests/(?!mine$|nearby$)([^/]+)$"),
+     lambda match, params, body: {f"request:{match[1]}"} | _author_tag(body, "seeker_id")),
+    (re.compile(r"^/offers$"),
+     lambda match, params, body: {"offers"} | ({f"request:{params['for_request']}"} if "for_request" in params else set())),
+    (re.compile(r"^/offers/(?!mine$|nearby$)([^/]+)$"),
+     lambda match, params, body: {f"offer:{match[1]}"} | _author_tag(body, "donor_id")),
+    (re.compile(r"^/ratings$"),
+     lambda match, params, body: {"ratings"}),
+]
+
+
+def cache_key(path: str, query_string: bytes) -> Key:
+    params = parse_qsl(query_string.decode("latin-1"))
+    return path, tuple(sorted((name, value) for name, value in params if value != ""))
+
+
+class ResponseCacheMiddleware:
+    """Serves cached GET responses and fills the cache on a miss"""
+
+    def __init__(self, app, cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.cache = cache
+        # Misses being built, so concurrent ones for the same key wait instead
+        self._inflight: Dict[Key, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if not RESPONSE_CACHE or scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        for pattern, rule in CACHED_ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return await self.app(scope, receive, send)
+
+        cache = self.cache or response_cache
+        key = cache_key(path, scope["query_string"])
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1") or None
+
+        entry = cache.get(key)
+        if entry is None:
+            pending = self._inflight.get(key)
+            if pending is None:
+                entry = await self._fill(cache, key, scope, receive, rule, match)
+            else:
+                cache.coalesced += 1
+                try:
+                    entry = await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                    # The request building it went away; build our own, uncached
+                    return await self.app(scope, receive, send)
+        await self._send(entry, if_none_match, send)
+
+    async def _fill(self, cache: ResponseCache, key: Key, scope, receive, rule: TagRule,
+                    match: re.Match) -> CachedResponse:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        since = cache.mark()
+        # Build the full response, whatever this caller's validators say
+        fill_scope = dict(scope)
+        fill_scope["headers"] = [(name, value) for name, value in scope["headers"] if name != b"if-none-match"]
+        fill_scope[READ_PRIMARY] = True
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(fill_scope, receive, capture)
+            body = b"".join(chunks)
+            entry = CachedResponse(start["status"], list(start.get("headers", [])), body)
+            if entry.status == 200:
+                entry.tags = frozenset(rule(match, dict(key[1]), body))
+                cache.put(key, entry, since)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Waiters re-raise it; don't let the loop log it as never retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    async def _send(entry: CachedResponse, if_none_match: Optional[str], send) -> None:
+        if entry.status == 200 and entry.etag and etag_matches(if_none_match, entry.etag):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(b"etag", entry.etag.encode("latin-1"))]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,232 @@
+"""
+Normalized locations and city/zip autocomplete.
+
+Every distinct country/state/city/zip combination is stored once in
+``locations`` under a casefolded key, and users, requests and offers point
+at it through ``location_id``. The id is derived from the key, so writers
+resolve it without a lookup; a ``before_flush`` hook fills it in (and
+inserts the location row on first use) whenever one of those records is
+added or its address changes. The insert is ``ON CONFLICT DO NOTHING``, so
+two transactions that first use the same city at once both succeed.
+
+Autocomplete is served from an in-memory prefix trie over city names,
+"city state", zip codes and city initials ("sj" for San Jose). It is loaded
+from the table on first use, extended as this process commits new
+locations and reloaded every ``LOCATION_INDEX_TTL_SECONDS`` to pick up
+locations added by other workers.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models import Location, User, MealRequest, MealOffer
+
+LOCATION_INDEX_TTL_SECONDS = float(os.getenv("LOCATION_INDEX_TTL_SECONDS", "300"))
+DEFAULT_COUNTRY = "United States"
+_LOCATION_NAMESPACE = uuid.UUID("6f1c2c1e-52b4-4b8e-9a57-1d6a0cf0c1d2")
+_SEPARATORS = re.compile(r"[^\w]+")
+
+ADDRESSED_MODELS = (User, MealRequest, MealOffer)
+ADDRESS_FIELDS = ("country", "state", "city", "zip")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Casefold and collapse punctuation/whitespace: " San  Jose," -> "san jose" """
+    return " ".join(_SEPARATORS.sub(" ", (text or "").casefold()).split())
+
+
+def location_key(country: Optional[str], state: Optional[str], city: Optional[str], zip: Optional[str]) -> str:
+    return "|".join(normalize(part) for part in (country or DEFAULT_COUNTRY, state, city, zip))
+
+
+def location_id_for(key: str) -> str:
+    return str(uuid.uuid5(_LOCATION_NAMESPACE, key))
+
+
+def build_location(country: Optional[str], state: Optional[str], city: Optional[str], zip: Optional[str]) -> Optional[Location]:
+    """A Location for the address, or None when there is no city"""
+    if not normalize(city):
+        return None
+    key = location_key(country, state, city, zip)
+    return Location(
+        id=location_id_for(key),
+        key=key,
+        city_key=normalize(city),
+        country=(country or DEFAULT_COUNTRY).strip(),
+        state=(state or "").strip(),
+        city=" ".join(city.split()),
+        zip=(zip or "").strip(),
+    )
+
+
+def city_location_ids(city: str):
+    """Subquery of location ids whose normalized city starts with ``city``.
+
+    An indexed range scan on ``city_key``, unlike ``ilike('%city%')``. The
+    bound relies on the column's code point collation (see ``PrefixString``).
+    """
+    key = normalize(city)
+    return select(Location.id).where(Location.city_key >= key, Location.city_key < key + "\U0010ffff")
+
+
+class LocationEntry:
+    """Detached copy of a Location held by the autocomplete index"""
+
+    __slots__ = ("id", "country", "state", "city", "zip")
+
+    def __init__(self, location: Location):
+        self.id = location.id
+        self.country = location.country
+        self.state = location.state
+        self.city = location.city
+        self.zip = location.zip
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.ids: List[str] = []
+
+
+class LocationIndex:
+    """Prefix trie from normalized city/zip text to location ids"""
+
+    def __init__(self, ttl_seconds: float = LOCATION_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._root = _Node()
+        self._locations: Dict[str, LocationEntry] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._root = _Node()
+            self._locations = {}
+            self._loaded_at = None
+
+    def _insert(self, text: str, location_id: str) -> None:
+        node = self._root
+        for char in text:
+            node = node.children.setdefault(char, _Node())
+        if location_id not in node.ids:
+            node.ids.append(location_id)
+
+    def _add(self, location: LocationEntry) -> None:
+        if location.id in self._locations:
+            return
+        self._locations[location.id] = location
+        city = normalize(location.city)
+        state = normalize(location.state)
+        self._insert(city, location.id)
+        if state:
+            self._insert(f"{city} {state}", location.id)
+        if location.zip:
+            self._insert(normalize(location.zip), location.id)
+        words = city.split()
+        if len(words) > 1:
+            self._insert("".join(word[0] for word in words), location.id)
+
+    def add(self, locations: Iterable[LocationEntry]) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return  # Picked up by the first load
+            for location in locations:
+                self._add(location)
+
+    def _ensure_loaded(self, db: Session) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < self.ttl_seconds:
+                return
+        rows = db.execute(select(Location)).scalars().all()
+        with self._lock:
+            self._root = _Node()
+            self._locations = {}
+            for row in rows:
+                self._add(LocationEntry(row))
+            self._loaded_at = now
+
+    def search(self, db: Session, prefix: str, limit: int = 10) -> List[LocationEntry]:
+        """Locations whose city, "city state", zip or initials start with ``prefix``"""
+        self._ensure_loaded(db)
+        text = normalize(prefix)
+        if not text:
+            return []
+        with self._lock:
+            node = self._root
+            for char in text:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            found: Dict[str, LocationEntry] = {}
+            # Shortest completions first: an exact city beats a longer one
+            level = [node]
+            while level and len(found) < limit:
+                next_level = []
+                for current in level:
+                    for location_id in current.ids:
+                        found.setdefault(location_id, self._locations[location_id])
+                    next_level.extend(current.children[char] for char in sorted(current.children))
+                level = next_level
+        return list(found.values())[:limit]
+
+
+location_index = LocationIndex()
+
+
+def insert_location(session: Session, location: Location) -> bool:
+    """Insert the row unless it exists, even if only just committed elsewhere; True if inserted"""
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    values = {column.key: getattr(location, column.key) for column in Location.__table__.columns
+              if column.key != "created_at"}
+    result = session.execute(insert(Location).values(**values).on_conflict_do_nothing())
+    return result.rowcount > 0
+
+
+def _address_changed(instance) -> bool:
+    state = inspect(instance)
+    return any(state.attrs[field].history.has_changes() for field in ADDRESS_FIELDS)
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_locations(session: Session, flush_context, instances) -> None:
+    # Snapshots, since committed instances can't be read in after_commit
+    pending: Dict[str, LocationEntry] = session.info.setdefault("new_locations", {})
+    candidates = [obj for obj in session.new if isinstance(obj, ADDRESSED_MODELS)]
+    candidates += [
+        obj for obj in session.dirty
+        if isinstance(obj, ADDRESSED_MODELS) and _address_changed(obj)
+    ]
+    for obj in candidates:
+        location = build_location(obj.country, obj.state, obj.city, obj.zip)
+        if location is None:
+            obj.location_id = None
+            continue
+        obj.location_id = location.id
+        if location.id in pending:
+            continue
+        with session.no_autoflush:
+            if session.get(Location, location.id) is None and insert_location(session, location):
+                pending[location.id] = LocationEntry(location)
+
+
+@event.listens_for(Session, "after_commit")
+def _index_new_locations(session: Session) -> None:
+    pending = session.info.pop("new_locations", None)
+    if pending:
+        location_index.add(pending.values())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_locations(session: Session) -> None:
+    session.info.pop("new_locations", None)
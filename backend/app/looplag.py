@@ -0,0 +1,122 @@
+"""
+Event-loop lag monitor, enabled with ``LOOP_LAG_MONITOR=1``.
+
+A heartbeat coroutine sleeps for ``LOOP_LAG_INTERVAL_MS`` and records how late
+it wakes up; the lags go into a histogram exported by ``GET /admin/metrics``.
+A watchdog thread checks the heartbeat: once it is more than
+``LOOP_LAG_THRESHOLD_MS`` overdue, something is holding the loop (a sync
+database call in an ``async def``, say), and the watchdog logs the loop
+thread's current stack, once per stall, so the culprit shows up in the logs.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "").lower() in ("1", "true", "yes")
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+
+# Upper bounds (ms) of the histogram buckets; the last one catches the rest
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Heartbeat lag histogram plus a watchdog that logs blocking stacks"""
+
+    def __init__(self, interval_ms: float = LOOP_LAG_INTERVAL_MS, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.interval_ms = interval_ms
+        self.threshold_ms = threshold_ms
+        self.counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.stalls = 0
+        self.last_stack: Optional[str] = None
+        self._beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._watchdog.join()
+        self._task = self._watchdog = None
+
+    def record(self, lag_ms: float) -> None:
+        index = next((i for i, bound in enumerate(LAG_BUCKETS_MS) if lag_ms <= bound), len(LAG_BUCKETS_MS))
+        self.counts[index] += 1
+        self.samples += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    async def _heartbeat(self) -> None:
+        interval = self.interval_ms / 1000
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(interval)
+            self.record(max(0.0, (time.monotonic() - self._beat - interval) * 1000))
+
+    def _watch(self) -> None:
+        reported = None
+        limit = (self.interval_ms + self.threshold_ms) / 1000
+        poll = min(self.interval_ms, self.threshold_ms) / 2000
+        while not self._stopping.wait(poll):
+            beat = self._beat
+            overdue = time.monotonic() - beat
+            if overdue <= limit or beat == reported:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self.stalls += 1
+            self.last_stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                "Event loop blocked for %.0f ms (still running), at:\n%s",
+                (overdue * 1000) - self.interval_ms, self.last_stack,
+            )
+
+    def stats(self) -> Dict:
+        buckets = [f"le_{bound}ms" for bound in LAG_BUCKETS_MS] + ["inf"]
+        return {
+            "enabled": self.running,
+            "interval_ms": self.interval_ms,
+            "threshold_ms": self.threshold_ms,
+            "samples": self.samples,
+            "mean_ms": round(self.total_ms / self.samples, 3) if self.samples else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "stalls": self.stalls,
+            "histogram": dict(zip(buckets, self.counts)),
+        }
+
+
+loop_lag = LoopLagMonitor()
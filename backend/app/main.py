@@ -1,8 +1,50 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, students, requests, offers, chats, admin, donor_partners, flags, ratings
+from app.database import IS_SQLITE, SQLITE_PROFILE
+from app.feed import feed
+from app.httpcache import ResponseCacheMiddleware, response_cache
+from app.looplag import LOOP_LAG_MONITOR, loop_lag
+from app.marketplace import MARKETPLACE_VIEW, load_all as load_marketplace
+from app.maintenance import maintenance
+from app.passwords import password_pool
+from app.realtime import hub
+from app.replicas import ReadYourWritesMiddleware
+from app.snapshots import snapshots
+from app.writer import stop_writers
+from app.routers import auth, students, requests, offers, chats, admin, donor_partners, flags, ratings, locations, feed as feed_router
 
-app = FastAPI(title="StudentSupport API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_LAG_MONITOR:
+        await loop_lag.start()
+    await hub.start()
+    await feed.start()
+    await snapshots.start()
+    await response_cache.start()
+    if MARKETPLACE_VIEW:
+        await run_in_threadpool(load_marketplace)
+    if IS_SQLITE and SQLITE_PROFILE == "production":
+        await maintenance.start()
+    try:
+        yield
+    finally:
+        await maintenance.stop()
+        await run_in_threadpool(stop_writers)
+        await response_cache.stop()
+        await snapshots.stop()
+        await feed.stop()
+        await hub.stop()
+        password_pool.stop()
+        await loop_lag.stop()
+
+
+app = FastAPI(title="StudentSupport API", version="0.1.0", lifespan=lifespan)
+
+# Inside CORS, so cached responses still get CORS headers
+app.add_middleware(ResponseCacheMiddleware)
 
 # CORS configuration - must be added before routers
 app.add_middleware(
@@ -25,6 +67,7 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(ReadYourWritesMiddleware)
 
 # Include routers
 app.include_router(auth.router)
@@ -36,6 +79,8 @@ app.include_router(admin.router)
 app.include_router(donor_partners.router)
 app.include_router(flags.router)
 app.include_router(ratings.router)
+app.include_router(locations.router)
+app.include_router(feed_router.router)
 
 
 @app.get("/health", tags=["system"])
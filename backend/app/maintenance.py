@@ -0,0 +1,129 @@
+"""
+Periodic SQLite maintenance.
+
+Every ``SQLITE_MAINTENANCE_INTERVAL_SECONDS`` (default hourly) a background
+task, in the threadpool:
+
+- runs ``ANALYZE`` if the database has no statistics yet, ``PRAGMA optimize``
+  otherwise, so the planner's statistics follow the data;
+- returns up to ``SQLITE_VACUUM_PAGES`` free pages to the filesystem with
+  ``PRAGMA incremental_vacuum``, once more than ``SQLITE_VACUUM_MIN_FREE_PAGES``
+  have accumulated;
+- checkpoints the WAL so it doesn't grow between quiet periods.
+
+Incremental vacuum needs ``auto_vacuum=INCREMENTAL``, which new databases get
+from the connection pragmas. An existing database is converted with a full
+``VACUUM``, run offline:
+
+    python -m app.maintenance --vacuum
+
+That rewrites the file (and may renumber rowids), so the search indexes are
+rebuilt afterwards. ``python -m app.maintenance`` alone runs one cycle.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.database import engine as default_engine
+from app.models import MealOffer, MealRequest
+from app.search import sqlite_rebuild
+
+SQLITE_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+SQLITE_VACUUM_PAGES = int(os.getenv("SQLITE_VACUUM_PAGES", "2000"))
+SQLITE_VACUUM_MIN_FREE_PAGES = int(os.getenv("SQLITE_VACUUM_MIN_FREE_PAGES", "100"))
+
+INCREMENTAL = 2  # PRAGMA auto_vacuum value
+
+logger = logging.getLogger(__name__)
+
+
+def run_maintenance(engine: Engine) -> Dict[str, int]:
+    """One maintenance cycle; returns what it did"""
+    report = {"analyzed": 0, "optimized": 0, "vacuumed_pages": 0}
+    with engine.connect() as connection:
+        has_stats = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).first()
+        if has_stats is None:
+            connection.exec_driver_sql("ANALYZE")
+            report["analyzed"] = 1
+        else:
+            connection.exec_driver_sql("PRAGMA optimize")
+            report["optimized"] = 1
+        connection.commit()
+
+        auto_vacuum = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if auto_vacuum == INCREMENTAL and free_pages > SQLITE_VACUUM_MIN_FREE_PAGES:
+            pages = min(free_pages, SQLITE_VACUUM_PAGES)
+            # The pragma frees one page per step, and sqlite3's execute() steps
+            # once; executescript() runs it to completion
+            connection.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+            report["vacuumed_pages"] = free_pages - connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+    return report
+
+
+def full_vacuum(engine: Engine) -> None:
+    """Switch to incremental auto-vacuum, rewrite the file, rebuild search"""
+    # VACUUM can't run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+    with engine.begin() as connection:
+        for model in (MealRequest, MealOffer):
+            connection.execute(text(sqlite_rebuild(model.__tablename__)))
+        connection.exec_driver_sql("ANALYZE")
+
+
+class SQLiteMaintenance:
+    """Background task running ``run_maintenance`` on an interval"""
+
+    def __init__(self, engine: Engine = default_engine, interval: float = SQLITE_MAINTENANCE_INTERVAL_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await run_in_threadpool(run_maintenance, self.engine)
+                logger.info("SQLite maintenance: %s", report)
+            except Exception:
+                logger.exception("SQLite maintenance failed")
+
+
+maintenance = SQLiteMaintenance()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite maintenance")
+    parser.add_argument("--vacuum", action="store_true", help="full VACUUM, converting to incremental auto-vacuum")
+    args = parser.parse_args()
+    if args.vacuum:
+        full_vacuum(default_engine)
+        print("Vacuumed and rebuilt search indexes")
+    else:
+        print(run_maintenance(default_engine))
@@ -0,0 +1,464 @@
+"""
+In-memory view of the open marketplace: OPEN requests and AVAILABLE offers.
+
+With ``MARKETPLACE_VIEW=1``, browsing those statuses (optionally by
+``city``, ``location_id`` and ``diet``, paged or not) is answered from
+memory: each item is held as a ``Listing`` carrying its ready-built
+response (author name, avatar... included), with secondary indexes by
+status, city, location and dietary bit, and one list of all listings in
+page order. Searches, ``near``, ``for_offer``/``for_request`` and other
+statuses still go to the database.
+
+Each view also keeps its items' coordinates in a ``PointIndex``
+(``app.geoindex``), which answers ``/requests/nearby`` and ``/offers/nearby``
+whether or not ``MARKETPLACE_VIEW`` is on: those endpoints load the view on
+first use.
+
+The view is loaded at startup (or on first use) and kept in step by:
+
+- session events: commits touching requests, offers or users queue the
+  changed ids, which are re-read (one query per kind) by the next browse;
+  bulk ``UPDATE``s, whose ids aren't known, make the next browse poll;
+- a change poll every ``MARKETPLACE_POLL_SECONDS`` (default 2), for rows
+  written by other workers: rows and authors with a newer ``updated_at``
+  are re-read, and the ids in the working set are reconciled so inserts
+  and deletes are seen too.
+
+One sync runs at a time, so an older fetch is never applied over a newer
+one. A browse that finds a sync in progress waits for it when changes are
+queued (the running sync goes on to apply them), so writes committed before
+the browse are always seen; with nothing queued it serves the view as it is.
+On the async path the wait happens in the threadpool.
+
+Reads go to the primary (the handler's ``get_db`` session). ``check()``
+compares the view with the database and reports missing, extra and stale
+items; it backs ``GET /admin/marketplace``.
+"""
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.compatibility import DIETARY_BITS
+from app.database import SessionLocal
+from app.geo import Origin
+from app.geoindex import PointIndex
+from app.locations import normalize
+from app.models import DietaryPreference, MealOffer, MealRequest, User
+from app.pagination import decode_cursor, encode_cursor
+
+MARKETPLACE_VIEW = os.getenv("MARKETPLACE_VIEW", "").lower() in ("1", "true", "yes")
+MARKETPLACE_POLL_SECONDS = float(os.getenv("MARKETPLACE_POLL_SECONDS", "2"))
+
+# Re-read a little further back than the last poll, for clock skew between
+# workers and for commits that were in flight while it ran
+_POLL_OVERLAP = timedelta(seconds=5)
+
+Build = Callable[[Session, List[Any]], List[Any]]
+
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC, so SQLite (naive) and Postgres (aware) values sort alike"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class Listing:
+    """One item of the view, with what browse filters and sorts on"""
+
+    __slots__ = ("id", "key", "status", "location_id", "city_key", "dietary_mask", "author_id", "version",
+                 "latitude", "longitude", "item")
+
+    def __init__(self, row, timestamp_attr: str, author_attr: str, item):
+        self.id = row.id
+        self.key: Tuple[datetime, str] = (_utc(getattr(row, timestamp_attr)), row.id)
+        self.status = row.status
+        self.location_id = row.location_id
+        self.city_key = normalize(row.city) if row.location_id else None
+        self.dietary_mask = row.dietary_mask or 0
+        self.author_id = getattr(row, author_attr)
+        self.version = _utc(row.updated_at) or self.key[0]
+        self.latitude = row.latitude
+        self.longitude = row.longitude
+        self.item = item
+
+
+def _add_to(index: Dict[Any, Set[str]], value, item_id: str) -> None:
+    index.setdefault(value, set()).add(item_id)
+
+
+def _remove_from(index: Dict[Any, Set[str]], value, item_id: str) -> None:
+    ids = index.get(value)
+    if ids is not None:
+        ids.discard(item_id)
+        if not ids:
+            del index[value]
+
+
+class MarketplaceView:
+    """Working set of one model (rows in ``statuses``), indexed for browse"""
+
+    def __init__(self, name: str, model, statuses: Sequence, timestamp_column, author_column, build: Build,
+                 poll_seconds: float = MARKETPLACE_POLL_SECONDS):
+        self.name = name
+        self.model = model
+        self.statuses = frozenset(statuses)
+        self.timestamp_column = timestamp_column
+        self.author_column = author_column
+        self.build = build
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        # Notified whenever a sync finishes
+        self._synced = threading.Condition(self._lock)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._listings: Dict[str, Listing] = {}
+        self._order: List[Tuple[datetime, str]] = []
+        self._by_status: Dict[Any, Set[str]] = {}
+        self._by_location: Dict[str, Set[str]] = {}
+        self._by_city: Dict[str, Set[str]] = {}
+        self._city_keys: List[str] = []
+        self._by_diet: Dict[int, Set[str]] = {}
+        self._points = PointIndex()
+        self._loaded = False
+        self._polled_at = 0.0
+        self._poll_since: Optional[datetime] = None
+        self._pending: Set[str] = set()
+        self._pending_authors: Set[str] = set()
+        self._poll_requested = False
+        self._syncing = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def serves(self, status: Optional[str]) -> bool:
+        """Whether a browse for ``status`` can be answered from the view"""
+        return MARKETPLACE_VIEW and status is not None and status in {s.value for s in self.statuses}
+
+    # Index maintenance; callers hold the lock
+
+    def _insert(self, listing: Listing) -> None:
+        self._listings[listing.id] = listing
+        bisect.insort(self._order, listing.key)
+        _add_to(self._by_status, listing.status, listing.id)
+        if listing.location_id:
+            _add_to(self._by_location, listing.location_id, listing.id)
+        if listing.city_key is not None:
+            if listing.city_key not in self._by_city:
+                bisect.insort(self._city_keys, listing.city_key)
+            _add_to(self._by_city, listing.city_key, listing.id)
+        for bit in DIETARY_BITS.values():
+            if listing.dietary_mask & bit:
+                _add_to(self._by_diet, bit, listing.id)
+        if not listing.dietary_mask:
+            _add_to(self._by_diet, 0, listing.id)
+        if listing.latitude is not None and listing.longitude is not None:
+            self._points.upsert(listing.id, listing.latitude, listing.longitude)
+
+    def _delete(self, item_id: str) -> Optional[Listing]:
+        listing = self._listings.pop(item_id, None)
+        if listing is None:
+            return None
+        position = bisect.bisect_left(self._order, listing.key)
+        if position < len(self._order) and self._order[position] == listing.key:
+            del self._order[position]
+        _remove_from(self._by_status, listing.status, item_id)
+        if listing.location_id:
+            _remove_from(self._by_location, listing.location_id, item_id)
+        if listing.city_key is not None:
+            _remove_from(self._by_city, listing.city_key, item_id)
+            if listing.city_key not in self._by_city:
+                del self._city_keys[bisect.bisect_left(self._city_keys, listing.city_key)]
+        for bit in list(self._by_diet):
+            _remove_from(self._by_diet, bit, item_id)
+        self._points.remove(item_id)
+        return listing
+
+    def _apply(self, listings: Dict[str, Listing], ids: Iterable[str]) -> None:
+        """Store fresh listings and drop ``ids`` that left the working set"""
+        for item_id in ids:
+            fresh = listings.get(item_id)
+            current = self._listings.get(item_id)
+            if fresh is None:
+                self._delete(item_id)
+            elif current is None or fresh.version >= current.version:
+                self._delete(item_id)
+                self._insert(fresh)
+
+    # Loading from the database; never with the lock held, since on the
+    # async path a blocking lock would stall the event loop mid-query
+
+    def _listings_for(self, db: Session, rows: List[Any]) -> Dict[str, Listing]:
+        rows = [row for row in rows if row.status in self.statuses]
+        items = self.build(db, rows)
+        return {
+            row.id: Listing(row, self.timestamp_column.key, self.author_column.key, item)
+            for row, item in zip(rows, items)
+        }
+
+    def _fetch(self, db: Session, ids: Iterable[str]) -> Dict[str, Listing]:
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = db.query(self.model).filter(self.model.id.in_(ids)).all()
+        return self._listings_for(db, rows)
+
+    def load(self, db: Session) -> None:
+        started = datetime.now(timezone.utc)
+        rows = db.query(self.model).filter(self.model.status.in_(self.statuses)).all()
+        listings = self._listings_for(db, rows)
+        with self._lock:
+            self._reset()
+            for listing in listings.values():
+                self._insert(listing)
+            self._loaded = True
+            self._polled_at = time.monotonic()
+            self._poll_since = started
+
+    def _poll(self, db: Session, since: datetime) -> Tuple[List[str], Dict[str, Listing]]:
+        """Ids to refresh, and their listings, for changes since ``since``"""
+        model = self.model
+        changed = set(db.execute(select(model.id).where(
+            or_(model.updated_at >= since, self.timestamp_column >= since)
+        )).scalars())
+        authors = set(db.execute(select(User.id).where(User.updated_at >= since)).scalars())
+        current = set(db.execute(select(model.id).where(model.status.in_(self.statuses))).scalars())
+        with self._lock:
+            held = set(self._listings)
+            changed |= {item_id for item_id in held if self._listings[item_id].author_id in authors}
+        ids = changed | (current ^ held)
+        return list(ids), self._fetch(db, ids)
+
+    def mark_changed(self, ids: Iterable[str] = (), authors: Iterable[str] = (), poll: bool = False) -> None:
+        """Queue ids (and authors) committed by this process for the next sync"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._pending.update(ids)
+            self._pending_authors.update(authors)
+            self._poll_requested = self._poll_requested or poll
+
+    def sync(self, db: Session) -> None:
+        """Load the view, or bring it up to date with queued and polled changes"""
+        if not self._loaded:
+            self.load(db)
+            return
+        while True:
+            with self._lock:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                if not (self._pending or self._pending_authors or self._poll_requested):
+                    return
+            if db.get_bind().dialect.is_async:
+                await_only(run_in_threadpool(self._wait_for_sync))
+            else:
+                self._wait_for_sync()
+        try:
+            due = True
+            while self._sync_once(db, due):
+                due = False
+        finally:
+            with self._lock:
+                self._syncing = False
+                self._synced.notify_all()
+
+    def _wait_for_sync(self) -> None:
+        with self._synced:
+            self._synced.wait_for(lambda: not self._syncing)
+
+    def _sync_once(self, db: Session, due: bool) -> bool:
+        """Fetch and apply what is queued, polling if requested (or ``due`` and time to); False if idle"""
+        now = time.monotonic()
+        with self._lock:
+            poll = self._poll_requested or (due and now - self._polled_at >= self.poll_seconds)
+            pending, authors = self._pending, self._pending_authors
+            if authors:
+                pending |= {item_id for item_id, listing in self._listings.items() if listing.author_id in authors}
+            if not poll and not pending:
+                return False
+            self._pending, self._pending_authors = set(), set()
+            since = self._poll_since
+            if poll:
+                self._poll_requested = False
+                self._polled_at = now
+                self._poll_since = datetime.now(timezone.utc)
+        try:
+            ids, listings = list(pending), self._fetch(db, pending)
+            if poll:
+                polled_ids, polled = self._poll(db, since - _POLL_OVERLAP)
+                ids += polled_ids
+                listings.update(polled)
+        except BaseException:
+            with self._lock:
+                self._pending |= pending
+                self._poll_requested = self._poll_requested or poll
+            raise
+        with self._lock:
+            self._apply(listings, ids)
+        return True
+
+    # Browse
+
+    def _matching(self, status, location_id: Optional[str], city: Optional[str], diet: Optional[str]) -> Set[str]:
+        matched = set(self._by_status.get(status, ()))
+        if location_id:
+            matched &= self._by_location.get(location_id, set())
+        if city and city.strip():
+            key = normalize(city)
+            start = bisect.bisect_left(self._city_keys, key)
+            end = bisect.bisect_left(self._city_keys, key + "\U0010ffff")
+            in_city: Set[str] = set()
+            for city_key in self._city_keys[start:end]:
+                in_city |= self._by_city[city_key]
+            matched &= in_city
+        if diet:
+            try:
+                preference = DietaryPreference(diet)
+            except ValueError:
+                return set()
+            bit = 0 if preference is DietaryPreference.NONE else DIETARY_BITS[preference]
+            matched &= self._by_diet.get(bit, set())
+        return matched
+
+    def browse(self, db: Session, primary: Session, status: str, location_id: Optional[str] = None,
+               city: Optional[str] = None, diet: Optional[str] = None, cursor: Optional[str] = None,
+               limit: Optional[int] = None) -> Tuple[List[Any], Optional[str], int]:
+        """(items newest first, next cursor, total matches), like ``paginate``.
+
+        Without ``limit`` every match is returned. ``db`` is the handler's read
+        session: on the async path it is the primary and is used for syncing
+        (a sync session would block the loop); otherwise ``primary`` is.
+        """
+        self.sync(db if db.get_bind().dialect.is_async else primary)
+        status = next(s for s in self.statuses if s.value == status)
+        after = None
+        if cursor:
+            timestamp, item_id = decode_cursor(cursor)
+            after = (_utc(timestamp), item_id)
+        with self._lock:
+            matched = self._matching(status, location_id, city, diet)
+            end = bisect.bisect_left(self._order, after) if after else len(self._order)
+            page: List[Listing] = []
+            for position in range(end - 1, -1, -1):
+                key = self._order[position]
+                if key[1] in matched:
+                    page.append(self._listings[key[1]])
+                    if limit is not None and len(page) > limit:
+                        break
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(*page[-1].key)
+        return [listing.item for listing in page], next_cursor, len(matched)
+
+    def nearby(self, db: Session, primary: Session, origin: Origin, radius_km: float,
+               limit: int) -> List[Tuple[Any, float]]:
+        """(item, distance in km) of up to ``limit`` items within ``radius_km``, nearest first"""
+        self.sync(db if db.get_bind().dialect.is_async else primary)
+        found = self._points.search(origin[0], origin[1], radius_km, limit)
+        with self._lock:
+            listings = [(self._listings.get(item_id), distance) for item_id, distance in found]
+        return [(listing.item, distance) for listing, distance in listings if listing is not None]
+
+    # Consistency
+
+    def check(self, db: Session) -> Dict[str, Any]:
+        """Compare the view with the database after syncing it"""
+        self.sync(db)
+        rows = db.query(self.model).filter(self.model.status.in_(self.statuses)).all()
+        fresh = self._listings_for(db, rows)
+        with self._lock:
+            held = dict(self._listings)
+        stale = [
+            item_id for item_id in fresh.keys() & held.keys()
+            if fresh[item_id].key != held[item_id].key
+            or fresh[item_id].item.model_dump() != held[item_id].item.model_dump()
+        ]
+        return {
+            "name": self.name,
+            "enabled": MARKETPLACE_VIEW,
+            "size": len(held),
+            "missing": sorted(fresh.keys() - held.keys()),
+            "extra": sorted(held.keys() - fresh.keys()),
+            "stale": sorted(stale),
+        }
+
+
+views: Dict[type, MarketplaceView] = {}
+
+
+def register(name: str, model, statuses: Sequence, timestamp_column, author_column, build: Build) -> MarketplaceView:
+    view = views[model] = MarketplaceView(name, model, statuses, timestamp_column, author_column, build)
+    return view
+
+
+def load_all() -> None:
+    """Load every view from the primary database, at startup"""
+    with SessionLocal() as db:
+        for view in views.values():
+            view.load(db)
+
+
+def clear_all() -> None:
+    for view in views.values():
+        view.clear()
+
+
+def _any_loaded() -> bool:
+    return any(view.loaded for view in views.values())
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_marketplace_changes(session: Session, flush_context, instances) -> None:
+    if not _any_loaded():
+        return
+    changed = session.info.setdefault("marketplace_changes", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (MealRequest, MealOffer, User)):
+            changed.add((type(obj), obj.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_changes(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete) or not _any_loaded():
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in views:
+        orm_execute_state.session.info.setdefault("marketplace_bulk", set()).add(mapper.class_)
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_marketplace_changes(session: Session) -> None:
+    changed = session.info.pop("marketplace_changes", ())
+    bulk = session.info.pop("marketplace_bulk", ())
+    if not changed and not bulk:
+        return
+    authors = [item_id for model, item_id in changed if model is User]
+    for model, view in views.items():
+        ids = [item_id for changed_model, item_id in changed if changed_model is model]
+        if ids or authors or model in bulk:
+            view.mark_changed(ids, authors, poll=model in bulk)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_marketplace_changes(session: Session) -> None:
+    session.info.pop("marketplace_changes", None)
+    session.info.pop("marketplace_bulk", None)
@@ -1,10 +1,23 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Text, JSON, and_
+from sqlalchemy import Column, String, Integer, Float, Boolean, Date, DateTime, ForeignKey, Enum as SQLEnum, Text, JSON, Index, and_
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from datetime import datetime, timezone
 import enum
 
 
+# Keys searched by prefix range (``key >= prefix AND key < prefix + sentinel``).
+# Postgres compares with the database collation, which doesn't follow code
+# point order outside "C"; SQLite always compares bytes.
+PrefixString = String().with_variant(String(collation="C"), "postgresql")
+
+
+def utcnow() -> datetime:
+    """Update timestamp; set client-side so it has microseconds on SQLite too,
+    which lets ``updated_at`` serve as the row's version for ETags"""
+    return datetime.now(timezone.utc)
+
+
 class UserRole(str, enum.Enum):
     GUEST = "GUEST"
     SEEKER = "SEEKER"
@@ -88,10 +101,24 @@ class DonorTier(str, enum.Enum):
     COMMUNITY = "Community Partner"
 
 
+class Location(Base):
+    """One country/state/city/zip combination, shared by users, requests and offers"""
+    __tablename__ = "locations"
+
+    id = Column(String, primary_key=True)  # Derived from key (see app.locations)
+    key = Column(String, unique=True, nullable=False)  # Casefolded "country|state|city|zip"
+    city_key = Column(PrefixString, nullable=False, index=True)  # Casefolded city, for prefix lookups
+    country = Column(String, nullable=False)
+    state = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    zip = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(SQLEnum(UserRole), nullable=False, default=UserRole.GUEST)
@@ -104,6 +131,7 @@ class User(Base):
     state = Column(String, nullable=False, default="")
     zip = Column(String, nullable=False, default="")
     country = Column(String, nullable=False, default="United States")
+    location_id = Column(String, ForeignKey("locations.id"), nullable=True, index=True)  # Set from the fields above
     radius = Column(Float, default=10.0)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
@@ -113,10 +141,10 @@ class User(Base):
     languages = Column(JSON, nullable=False, default=[])  # Array of strings
     is_anonymous = Column(Boolean, default=False)
     weekly_meal_limit = Column(Integer, nullable=True)
-    current_weekly_meals = Column(Integer, default=0)
+    current_weekly_meals = Column(Integer, default=0)  # Offers posted in the rolling week (see app.capacity)
     donor_category = Column(SQLEnum(DonorCategory), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
 
     # Relationships
     requests = relationship("MealRequest", back_populates="seeker", foreign_keys="MealRequest.seeker_id")
@@ -129,18 +157,31 @@ class User(Base):
 
 class MealRequest(Base):
     __tablename__ = "meal_requests"
-
-    id = Column(String, primary_key=True, index=True)
+    __table_args__ = (
+        # Browse (optionally by status) and a seeker's own list, newest first
+        Index("ix_meal_requests_posted_at_id", "posted_at", "id"),
+        Index("ix_meal_requests_status_posted_at_id", "status", "posted_at", "id"),
+        Index("ix_meal_requests_seeker_id_posted_at_id", "seeker_id", "posted_at", "id"),
+        Index("ix_meal_requests_location_id_posted_at_id", "location_id", "posted_at", "id"),
+    )
+
+    id = Column(String, primary_key=True)
     seeker_id = Column(String, ForeignKey("users.id"), nullable=False)
     city = Column(String, nullable=False)
     state = Column(String, nullable=False)
     zip = Column(String, nullable=False)
     country = Column(String, nullable=False, default="United States")
+    location_id = Column(String, ForeignKey("locations.id"), nullable=True)  # Set from the fields above
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(PrefixString, nullable=True, index=True)  # Set from latitude/longitude
     dietary_needs = Column(JSON, nullable=False)  # Array of DietaryPreference
     medical_needs = Column(JSON, nullable=False)  # Array of MedicalPreference
     logistics = Column(JSON, nullable=False)  # Array of FulfillmentOption
+    # Bitmasks compiled from the tag arrays above (see app.compatibility)
+    dietary_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    medical_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    logistics_mask = Column(Integer, nullable=False, default=0, server_default="0")
     description = Column(Text, nullable=False)
     availability = Column(String, nullable=False)
     frequency = Column(SQLEnum(Frequency), nullable=False)
@@ -148,7 +189,7 @@ class MealRequest(Base):
     status = Column(SQLEnum(RequestStatus), nullable=False, default=RequestStatus.OPEN)
     completion_pin = Column(String, nullable=True)
     posted_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
 
     # Relationships
     seeker = relationship("User", back_populates="requests", foreign_keys=[seeker_id])
@@ -157,38 +198,67 @@ class MealRequest(Base):
 
 class MealOffer(Base):
     __tablename__ = "meal_offers"
-
-    id = Column(String, primary_key=True, index=True)
+    __table_args__ = (
+        # Browse (optionally by status) and a donor's own list
+        Index("ix_meal_offers_created_at_id", "created_at", "id"),
+        Index("ix_meal_offers_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_meal_offers_donor_id_created_at_id", "donor_id", "created_at", "id"),
+        Index("ix_meal_offers_location_id_created_at_id", "location_id", "created_at", "id"),
+    )
+
+    id = Column(String, primary_key=True)
     donor_id = Column(String, ForeignKey("users.id"), nullable=False)
     city = Column(String, nullable=False)
     state = Column(String, nullable=False)
     zip = Column(String, nullable=False)
     country = Column(String, nullable=False, default="United States")
+    location_id = Column(String, ForeignKey("locations.id"), nullable=True)  # Set from the fields above
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(PrefixString, nullable=True, index=True)  # Set from latitude/longitude
     description = Column(Text, nullable=False)
     image_url = Column(String, nullable=True)
     dietary_tags = Column(JSON, nullable=False)  # Array of DietaryPreference
     medical_tags = Column(JSON, nullable=True)  # Array of MedicalPreference
     available_until = Column(DateTime(timezone=True), nullable=False)
     logistics = Column(JSON, nullable=False)  # Array of FulfillmentOption
+    # Bitmasks of everything the tags above satisfy (see app.compatibility)
+    dietary_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    medical_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    logistics_mask = Column(Integer, nullable=False, default=0, server_default="0")
     availability = Column(String, nullable=False)
     frequency = Column(SQLEnum(Frequency), nullable=False)
     is_anonymous = Column(Boolean, default=False)
     status = Column(SQLEnum(OfferStatus), nullable=False, default=OfferStatus.AVAILABLE)
     completion_pin = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
 
     # Relationships
     donor = relationship("User", back_populates="offers", foreign_keys=[donor_id])
     messages = relationship("Message", back_populates="offer", foreign_keys="Message.offer_id")
 
 
+class DonorDailyOffers(Base):
+    """Offers a donor posted on one UTC day; the last week's rows add up to current_weekly_meals"""
+    __tablename__ = "donor_daily_offers"
+
+    donor_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    offers = Column(Integer, nullable=False, default=0)
+
+
 class ChatThread(Base):
     __tablename__ = "chat_threads"
-
-    id = Column(String, primary_key=True, index=True)
+    __table_args__ = (
+        # A participant's threads; match acceptance and PIN lookups by item
+        Index("ix_chat_threads_student_id_updated_at", "student_id", "updated_at"),
+        Index("ix_chat_threads_donor_id_updated_at", "donor_id", "updated_at"),
+        Index("ix_chat_threads_request_id", "request_id"),
+        Index("ix_chat_threads_offer_id", "offer_id"),
+    )
+
+    id = Column(String, primary_key=True)
     request_id = Column(String, ForeignKey("meal_requests.id"), nullable=True)
     offer_id = Column(String, ForeignKey("meal_offers.id"), nullable=True)
     item_type = Column(String, nullable=False)  # 'REQUEST' or 'OFFER'
@@ -196,8 +266,15 @@ class ChatThread(Base):
     student_id = Column(String, ForeignKey("users.id"), nullable=False)
     donor_id = Column(String, ForeignKey("users.id"), nullable=False)
     status = Column(String, default="IN_PROGRESS")  # IN_PROGRESS, COMPLETED, etc.
+    # Denormalized inbox summary, maintained by send_message.
+    # last_message_id has no foreign key to avoid a chat_threads <-> messages cycle.
+    last_message_id = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    student_unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    donor_unread_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
 
     # Relationships
     messages = relationship("Message", back_populates="thread")
@@ -207,8 +284,15 @@ class ChatThread(Base):
 
 class Message(Base):
     __tablename__ = "messages"
-
-    id = Column(String, primary_key=True, index=True)
+    __table_args__ = (
+        # Serves history pages and after= polling for one thread
+        Index("ix_messages_thread_id_timestamp_id", "thread_id", "timestamp", "id"),
+        # Loaded through MealRequest.messages / MealOffer.messages on delete
+        Index("ix_messages_request_id", "request_id"),
+        Index("ix_messages_offer_id", "offer_id"),
+    )
+
+    id = Column(String, primary_key=True)
     thread_id = Column(String, ForeignKey("chat_threads.id"), nullable=False)
     sender_id = Column(String, ForeignKey("users.id"), nullable=False)
     text = Column(Text, nullable=False)
@@ -228,8 +312,13 @@ class Message(Base):
 
 class Rating(Base):
     __tablename__ = "ratings"
+    __table_args__ = (
+        # Public ratings, overall or for one user, newest first
+        Index("ix_ratings_is_public_timestamp_id", "is_public", "timestamp", "id"),
+        Index("ix_ratings_to_user_id_is_public_timestamp_id", "to_user_id", "is_public", "timestamp", "id"),
+    )
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     from_user_id = Column(String, ForeignKey("users.id"), nullable=False)
     to_user_id = Column(String, ForeignKey("users.id"), nullable=False)
     transaction_id = Column(String, nullable=False)  # The request/offer ID that was completed
@@ -245,8 +334,13 @@ class Rating(Base):
 
 class FlaggedContent(Base):
     __tablename__ = "flagged_content"
+    __table_args__ = (
+        # Moderation queue and the duplicate-flag check
+        Index("ix_flagged_content_dismissed_timestamp_id", "dismissed", "timestamp", "id"),
+        Index("ix_flagged_content_item_id_flagged_by", "item_id", "flagged_by"),
+    )
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     item_id = Column(String, nullable=False)  # Request or Offer ID
     item_type = Column(String, nullable=False)  # 'REQUEST' or 'OFFER'
     reason = Column(String, nullable=False)
@@ -263,8 +357,11 @@ class FlaggedContent(Base):
 
 class DonorPartner(Base):
     __tablename__ = "donor_partners"
+    __table_args__ = (
+        Index("ix_donor_partners_created_at", "created_at"),
+    )
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
     category = Column(SQLEnum(DonorCategory), nullable=False)
     tier = Column(SQLEnum(DonorTier), nullable=False)
@@ -278,5 +375,9 @@ class DonorPartner(Base):
     since = Column(String, nullable=False)
     is_recurring = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utcnow)
+
+
 
+# Register the events that keep the compatibility masks, locations and search indexes in step
+from app import compatibility, locations, search  # noqa: E402,F401
@@ -0,0 +1,114 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered newest first on a ``(timestamp, id)`` pair, and the cursor
+handed back to the client is an opaque encoding of the last row's pair. The
+next page is everything strictly "before" that pair, so page cost stays flat
+however deep the client scrolls.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session
+
+from app.cache import LRUCache
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+COUNT_CACHE_TTL_SECONDS = 30.0
+# Keys include client-chosen filters, so the cache is bounded
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "1000"))
+
+
+def encode_cursor(timestamp: datetime, item_id: str) -> str:
+    """Encode a (timestamp, id) pair as an opaque cursor string"""
+    raw = json.dumps([timestamp.isoformat(), item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by ``encode_cursor``"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), str(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def bind_timestamp(db: Session, value: datetime) -> Any:
+    """Render a cursor timestamp the way the database stores it.
+
+    SQLite keeps datetimes as text. ``server_default=func.now()`` writes
+    ``YYYY-MM-DD HH:MM:SS`` while values set from Python are written with a
+    ``.ffffff`` suffix, so binding a whole-second cursor as a datetime would
+    never compare equal to the row it came from.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return value
+    rendered = value.strftime("%Y-%m-%d %H:%M:%S")
+    if value.microsecond:
+        rendered += f".{value.microsecond:06d}"
+    return rendered
+
+
+def keyset_filter(db: Session, timestamp_column, id_column, cursor: str, descending: bool = True):
+    """Return the WHERE clause selecting rows after ``cursor`` in page order"""
+    timestamp, item_id = decode_cursor(cursor)
+    timestamp = bind_timestamp(db, timestamp)
+    if descending:
+        return or_(
+            timestamp_column < timestamp,
+            and_(timestamp_column == timestamp, id_column < item_id),
+        )
+    return or_(
+        timestamp_column > timestamp,
+        and_(timestamp_column == timestamp, id_column > item_id),
+    )
+
+
+def paginate(
+    db: Session,
+    query: Query,
+    timestamp_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[List[Any], Optional[str]]:
+    """Fetch one page of ``query`` newest first.
+
+    Returns the rows and the cursor for the following page, or ``None`` when
+    this is the last page.
+    """
+    if cursor:
+        query = query.filter(keyset_filter(db, timestamp_column, id_column, cursor))
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+count_cache = LRUCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL_SECONDS)
+
+
+def approximate_count(query: Query, key: Hashable) -> int:
+    """Total rows matching ``query``, cached for a short while under ``key``.
+
+    The value may lag recent writes by up to ``COUNT_CACHE_TTL_SECONDS``; it
+    is meant for "about N results" hints, not for page arithmetic.
+    """
+    cached = count_cache.get(key)
+    if cached is not None:
+        return cached
+    total = query.order_by(None).count()
+    count_cache.set(key, total)
+    return total
@@ -0,0 +1,123 @@
+"""
+Password hashing off the event loop and off the web threadpool.
+
+bcrypt is deliberately slow, so a burst of logins run inline would occupy
+the threadpool that every sync handler shares and browse traffic would queue
+behind it. Hashes and checks are sent instead to a dedicated process pool of
+``PASSWORD_HASH_WORKERS`` processes. At most ``PASSWORD_HASH_MAX_PENDING`` jobs
+may be queued or running; beyond that callers get a 503 with ``Retry-After``
+instead of waiting without bound.
+
+New hashes use ``BCRYPT_ROUNDS``. A successful check against a hash with a
+different cost also returns a fresh hash at the target cost, so changing the
+setting migrates users as they log in.
+
+This module is imported by the worker processes, so it must stay free of
+app imports (database, models) that would be loaded in every worker.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import bcrypt
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if not bcrypt"""
+    parts = hashed.split("$")
+    if len(parts) > 3 and parts[1].startswith("2") and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    # Use bcrypt directly to avoid passlib compatibility issues
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def check_password(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except Exception:
+        # Fallback to passlib for backwards compatibility
+        return pwd_context.verify(password, hashed)
+
+
+def check_and_rehash(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """(matches, replacement hash when the stored cost isn't ``rounds``)"""
+    if not check_password(password, hashed):
+        return False, None
+    if hash_rounds(hashed) != rounds:
+        return True, hash_password(password, rounds)
+    return True, None
+
+
+class PasswordPool:
+    """Bounded process pool for bcrypt, with queue-depth counters"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in attempts, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, BCRYPT_ROUNDS)
+
+    async def check(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Whether ``password`` matches, plus a rehash if the cost changed"""
+        return await self._run(check_and_rehash, password, hashed, BCRYPT_ROUNDS)
+
+    def stats(self) -> Dict[str, int]:
+        pending = self.pending
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "queued": max(0, pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordPool()
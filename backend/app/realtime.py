@@ -0,0 +1,280 @@
+"""
+In-process pub/sub hub for pushing chat events over WebSockets.
+
+Handlers publish events addressed to user ids; every WebSocket connection of
+those users receives them. Publishing is thread-safe so the sync route
+handlers (which FastAPI runs in its threadpool) can call it directly.
+
+Delivery goes through a fan-out backend. ``LocalBackend`` delivers within
+the current process; ``RedisBackend`` relays through Redis pub/sub so that
+several uvicorn workers share one logical hub. Select it with
+``REALTIME_BACKEND_URL=redis://...`` (requires the ``redis`` package).
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REALTIME_BACKEND_URL = os.getenv("REALTIME_BACKEND_URL", "")
+# Events buffered per connection before a slow client starts losing them
+SUBSCRIBER_QUEUE_SIZE = 256
+
+Deliver = Callable[[Dict[str, Any]], None]
+
+
+class FanoutBackend(ABC):
+    """Carries published envelopes to every hub sharing the backend"""
+
+    @abstractmethod
+    async def start(self, deliver: Deliver, loop: asyncio.AbstractEventLoop) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, envelope: Dict[str, Any]) -> None:
+        """Send an envelope; must be safe to call from any thread"""
+
+    @abstractmethod
+    def publish_sequenced(self, envelope: Dict[str, Any], key: str = "seq") -> None:
+        """Send an envelope numbered under ``key`` from the backend's one sequence.
+
+        Every subscriber receives sequenced envelopes in increasing order of
+        their numbers, whichever process published them.
+        """
+
+    @abstractmethod
+    async def current_sequence(self) -> int:
+        """The last number handed out by ``publish_sequenced``"""
+
+    async def stop(self) -> None:
+        pass
+
+
+class LocalBackend(FanoutBackend):
+    """Delivers envelopes to the hub in this process only"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        self._lock = threading.Lock()
+        # Starts above any number handed out before a restart
+        self._sequence = time.time_ns()
+
+    async def start(self, deliver: Deliver, loop: asyncio.AbstractEventLoop) -> None:
+        self._deliver = deliver
+
+    def publish(self, envelope: Dict[str, Any]) -> None:
+        if self._deliver is not None:
+            self._deliver(envelope)
+
+    def publish_sequenced(self, envelope: Dict[str, Any], key: str = "seq") -> None:
+        # Numbered and delivered under one lock, so delivery order is number order
+        with self._lock:
+            self._sequence += 1
+            envelope[key] = self._sequence
+            if self._deliver is not None:
+                self._deliver(envelope)
+
+    async def current_sequence(self) -> int:
+        with self._lock:
+            return self._sequence
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+
+# Numbers the envelope (a JSON object, ARGV[1]) under ARGV[2] and publishes it
+# in one atomic step, so Redis delivers sequenced envelopes in number order
+_PUBLISH_SEQUENCED = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', KEYS[2], '{"' .. ARGV[2] .. '":' .. seq .. ',' .. string.sub(ARGV[1], 2))
+return seq
+"""
+
+
+class RedisBackend(FanoutBackend):
+    """Relays envelopes through a Redis pub/sub channel shared by all workers"""
+
+    def __init__(self, url: str, channel: str = "studentsupport:realtime"):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def sequence_key(self) -> str:
+        return f"{self.channel}:seq"
+
+    async def start(self, deliver: Deliver, loop: asyncio.AbstractEventLoop) -> None:
+        import redis.asyncio as redis
+
+        self._loop = loop
+        self._redis = redis.from_url(self.url)
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+
+        async def listen():
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    deliver(json.loads(message["data"]))
+
+        self._listener = loop.create_task(listen())
+
+    def publish(self, envelope: Dict[str, Any]) -> None:
+        if self._redis is None or self._loop is None:
+            return
+        self._schedule(self._redis.publish(self.channel, json.dumps(envelope, default=str)))
+
+    def publish_sequenced(self, envelope: Dict[str, Any], key: str = "seq") -> None:
+        if self._redis is None or self._loop is None:
+            return
+        payload = json.dumps(envelope, default=str)
+        self._schedule(self._redis.eval(_PUBLISH_SEQUENCED, 2, self.sequence_key, self.channel, payload, key))
+
+    async def current_sequence(self) -> int:
+        if self._redis is None:
+            return 0
+        return int(await self._redis.get(self.sequence_key) or 0)
+
+    def _schedule(self, coro) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.create_task(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._redis is not None:
+            await self._redis.close()
+        self._redis = None
+
+
+class Subscription:
+    """One WebSocket connection's view of the hub"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class Hub:
+    """Routes events to the WebSocket subscriptions of the addressed users"""
+
+    def __init__(self, backend: Optional[FanoutBackend] = None):
+        self.backend = backend or LocalBackend()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        await self.backend.start(self._deliver, self._loop)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+        self._loop = None
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def is_online(self, user_id: str) -> bool:
+        with self._lock:
+            return bool(self._subscriptions.get(user_id))
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def publish(self, user_ids: Iterable[str], event: Dict[str, Any]) -> None:
+        """Send ``event`` to every connection of the given users.
+
+        Safe to call from any thread. Events published before the hub has
+        started (or after it stopped) are dropped.
+        """
+        if self._loop is None:
+            return
+        self.backend.publish({"user_ids": sorted(set(user_ids)), "event": event})
+
+    def _deliver(self, envelope: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in envelope["user_ids"]
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in targets:
+            loop.call_soon_threadsafe(subscription.offer, envelope["event"])
+
+
+def create_backend(url: str = REALTIME_BACKEND_URL) -> FanoutBackend:
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    return LocalBackend()
+
+
+hub = Hub(create_backend())
+
+
+def publish_message(thread, message) -> None:
+    """Notify both participants of a new chat message"""
+    if not hub.started:
+        return
+    hub.publish((thread.student_id, thread.donor_id), {
+        "type": "message",
+        "thread_id": thread.id,
+        "message": {
+            "id": message.id,
+            "sender_id": message.sender_id,
+            "text": message.text,
+            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+            "is_system": bool(message.is_system),
+        },
+    })
+
+
+def publish_thread_status(thread) -> None:
+    """Notify both participants that a thread changed status"""
+    if not hub.started:
+        return
+    hub.publish((thread.student_id, thread.donor_id), {
+        "type": "thread_status",
+        "thread_id": thread.id,
+        "status": thread.status,
+    })
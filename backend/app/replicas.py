@@ -0,0 +1,103 @@
+"""
+Read replicas for read-only handlers.
+
+``DATABASE_READ_URLS`` is a comma-separated list of replica URLs (any URL
+``DATABASE_URL`` accepts). Handlers that only read take their session from
+``get_read_db``, which hands out replica sessions round-robin; everything
+else keeps using the primary through ``get_db``. Without replicas
+``get_read_db`` is just the primary.
+
+Replicas lag the primary, so a caller who has just written would not see
+their own change. After any successful write request, the caller (keyed by
+a hash of their bearer token) reads from the primary for
+``READ_YOUR_WRITES_SECONDS``. That memory is per process, so with several
+workers a follow-up read handled by another worker may still see the
+replica.
+
+Handlers on the async path (``ASYNC_DB_ROUTERS``) read from the primary, and
+so do requests filling the response cache (``app.httpcache``).
+"""
+import hashlib
+import itertools
+import os
+import threading
+from typing import Iterator, List, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.cache import LRUCache
+from app.database import get_db, make_engine
+from app.httpcache import READ_PRIMARY
+
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_SIZE = int(os.getenv("READ_YOUR_WRITES_SIZE", "100000"))
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReplicaSet:
+    """Session factories for the replicas, picked round-robin"""
+
+    def __init__(self, urls: List[str]):
+        self.engines = [make_engine(url) for url in urls]
+        self._sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines
+        ]
+        self._next = itertools.cycle(self._sessionmakers)
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self._sessionmakers)
+
+    def session(self) -> Session:
+        with self._lock:
+            factory = next(self._next)
+        return factory()
+
+
+replicas = ReplicaSet(DATABASE_READ_URLS)
+recent_writers = LRUCache(READ_YOUR_WRITES_SIZE, READ_YOUR_WRITES_SECONDS)
+
+
+def caller_key(authorization: Optional[str]) -> Optional[bytes]:
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode("utf-8")).digest()
+
+
+def get_read_db(request: Request, db: Session = Depends(get_db)) -> Iterator[Session]:
+    """A replica session, or the primary one when there are no replicas or
+    the caller wrote within ``READ_YOUR_WRITES_SECONDS``"""
+    key = caller_key(request.headers.get("authorization"))
+    if not replicas or request.scope.get(READ_PRIMARY) or (key is not None and recent_writers.get(key)):
+        yield db
+        return
+    replica = replicas.session()
+    try:
+        yield replica
+    finally:
+        replica.close()
+
+
+class ReadYourWritesMiddleware:
+    """Remembers callers whose write requests succeeded"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = caller_key(headers.get(b"authorization", b"").decode("latin-1"))
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        async def send_and_mark(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                recent_writers.set(key, True)
+            await send(message)
+
+        await self.app(scope, receive, send_and_mark)
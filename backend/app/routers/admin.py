@@ -1,25 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, FlaggedContent, MealRequest, MealOffer, RequestStatus, OfferStatus
-from app.schemas import FlagResponse
-from app.auth import require_admin
-from typing import List
+from app import marketplace
+from app.asyncdb import db_route
+from app.models import FlaggedContent, MealRequest, MealOffer, RequestStatus, OfferStatus
+from app.schemas import FlagResponse, FlagPage, MarketplaceCheck, SystemMetrics
+from app.auth import Principal, require_admin
+from app.feed import publish_request, publish_offer
+from app.httpcache import invalidate_offer, invalidate_request, response_cache
+from app.capacity import release_offer_slot
+from app.looplag import loop_lag
+from app.passwords import password_pool
+from app.writer import writer_stats
+from app.pagination import paginate, approximate_count, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import List, Optional, Union
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-@router.get("/flags", response_model=List[FlagResponse])
-def get_flagged_items(
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
-):
-    """Get all flagged items for moderation"""
-    flags = db.query(FlaggedContent).filter(
-        FlaggedContent.dismissed == False
-    ).order_by(FlaggedContent.timestamp.desc()).all()
-    
-    return [FlagResponse(
+def flag_response(flag: FlaggedContent) -> FlagResponse:
+    return FlagResponse(
         id=flag.id,
         item_id=flag.item_id,
         item_type=flag.item_type,
@@ -28,13 +28,43 @@ def get_flagged_items(
         description=flag.description,
         timestamp=flag.timestamp,
         dismissed=flag.dismissed
-    ) for flag in flags]
+    )
+
+
+@router.get("/flags", response_model=Union[FlagPage, List[FlagResponse]])
+@db_route
+def get_flagged_items(
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = Query(False),
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Get all flagged items for moderation"""
+    query = db.query(FlaggedContent).filter(FlaggedContent.dismissed == False)
+
+    if limit is None and cursor is None:
+        flags = query.order_by(FlaggedContent.timestamp.desc(), FlaggedContent.id.desc()).all()
+        return [flag_response(flag) for flag in flags]
+
+    flags, next_cursor = paginate(
+        db, query, FlaggedContent.timestamp, FlaggedContent.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    total_estimate = None
+    if include_total:
+        total_estimate = approximate_count(query, ("flags",))
+    return FlagPage(
+        items=[flag_response(flag) for flag in flags],
+        next_cursor=next_cursor,
+        total_estimate=total_estimate
+    )
 
 
 @router.post("/flags/{flag_id}/dismiss", response_model=FlagResponse)
+@db_route
 def dismiss_flag(
     flag_id: str,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """Dismiss a flag (mark as reviewed, don't delete content)"""
@@ -56,23 +86,21 @@ def dismiss_flag(
     
     db.commit()
     db.refresh(flag)
+    if item and flag.item_type == "REQUEST":
+        publish_request("updated", item)
+        invalidate_request(item.id)
+    elif item:
+        publish_offer("updated", item)
+        invalidate_offer(item.id)
     
-    return FlagResponse(
-        id=flag.id,
-        item_id=flag.item_id,
-        item_type=flag.item_type,
-        reason=flag.reason,
-        flagged_by=flag.flagged_by,
-        description=flag.description,
-        timestamp=flag.timestamp,
-        dismissed=flag.dismissed
-    )
+    return flag_response(flag)
 
 
 @router.delete("/flags/{flag_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_route
 def delete_flagged_content(
     flag_id: str,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """Delete flagged content (permanently remove the request/offer)"""
@@ -82,17 +110,45 @@ def delete_flagged_content(
     
     # Delete the underlying content
     if flag.item_type == "REQUEST":
-        request = db.query(MealRequest).filter(MealRequest.id == flag.item_id).first()
-        if request:
-            db.delete(request)
+        item = db.query(MealRequest).filter(MealRequest.id == flag.item_id).first()
     else:
-        offer = db.query(MealOffer).filter(MealOffer.id == flag.item_id).first()
-        if offer:
-            db.delete(offer)
+        item = db.query(MealOffer).filter(MealOffer.id == flag.item_id).first()
+    if item:
+        if flag.item_type != "REQUEST":
+            release_offer_slot(db, item)
+        db.delete(item)
     
     # Delete the flag record
+    item_type = flag.item_type
     db.delete(flag)
     db.commit()
+    if item and item_type == "REQUEST":
+        publish_request("deleted", item)
+        invalidate_request(item.id)
+    elif item:
+        publish_offer("deleted", item)
+        invalidate_offer(item.id)
     
     return None
 
+
+
+@router.get("/metrics", response_model=SystemMetrics)
+def get_metrics(current_user: Principal = Depends(require_admin)):
+    """Queue depths of the worker pools, event-loop lag, group commits and the response cache"""
+    return SystemMetrics(
+        password_hashing=password_pool.stats(),
+        loop_lag=loop_lag.stats(),
+        group_commit=writer_stats(),
+        response_cache=response_cache.stats()
+    )
+
+
+@router.get("/marketplace", response_model=List[MarketplaceCheck])
+@db_route
+def check_marketplace(
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Compare the in-memory marketplace view with the database"""
+    return [MarketplaceCheck(**view.check(db)) for view in marketplace.views.values()]
@@ -1,22 +1,25 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User, UserRole, VerificationStatus
 from app.schemas import UserCreate, UserLogin, Token, UserResponse
 from app.auth import (
-    get_password_hash, authenticate_user, create_access_token,
+    authenticate_user, create_access_token,
     get_current_active_user, get_user_by_email
 )
+from app.geocoder import fill_coordinates
+from app.passwords import password_pool
 import uuid
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
-    existing_user = get_user_by_email(db, user_data.email)
+    existing_user = await run_in_threadpool(get_user_by_email, db, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -25,7 +28,10 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_pool.hash(user_data.password)
+    latitude, longitude = fill_coordinates(
+        None, None, user_data.zip, user_data.city, user_data.state, user_data.country
+    )
     
     # For MVP, mark email as verified immediately (simulation behavior)
     new_user = User(
@@ -38,6 +44,8 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         state=user_data.state,
         zip=user_data.zip,
         country=user_data.country,
+        latitude=latitude,
+        longitude=longitude,
         email_verified=True,  # MVP: auto-verify
         verification_status=VerificationStatus.VERIFIED,  # MVP: auto-verify
         verification_steps={
@@ -48,21 +56,20 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(db.commit)
 
     # Create access token
     access_token_expires = timedelta(minutes=60 * 24 * 7)  # 7 days
     access_token = create_access_token(
-        data={"sub": new_user.id}, expires_delta=access_token_expires
+        data={"sub": user_id}, expires_delta=access_token_expires
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
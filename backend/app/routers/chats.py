@@ -1,20 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import case, or_, update
 from app.database import get_db
-from app.models import User, ChatThread, Message, MealRequest, MealOffer, RequestStatus, OfferStatus
-from app.schemas import MessageCreate, MessageResponse, ChatThreadResponse, MatchAcceptResponse, PinVerify, PinVerifyResponse
-from app.auth import get_current_active_user, require_seeker_or_donor
-from typing import List
+from app.asyncdb import db_route
+from app.models import User, ChatThread, Message, MealRequest, MealOffer, RequestStatus, OfferStatus, utcnow
+from app.schemas import (
+    MessageCreate, MessageResponse, ChatThreadResponse, ChatInboxEntry, ChatParticipantSummary,
+    MatchAcceptResponse, PinVerify, PinVerifyResponse
+)
+from app.auth import Principal, get_current_principal, require_seeker_or_donor, decode_access_token, load_principal
+from app.etags import weak_etag, etag_matches, not_modified
+from app.realtime import hub, publish_message, publish_thread_status
+from app.feed import publish_request, publish_offer
+from app.httpcache import invalidate_offer, invalidate_request
+from app.pagination import keyset_filter, encode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.writer import write
+from typing import Dict, List, Optional
 import uuid
 import random
-from datetime import datetime
+import time
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
+# Minimum gap between contact reloads for typing frames naming unknown threads
+CONTACTS_RELOAD_SECONDS = 5.0
+
+
+def message_response(msg: Message) -> MessageResponse:
+    return MessageResponse(
+        id=msg.id,
+        sender_id=msg.sender_id,
+        text=msg.text,
+        timestamp=msg.timestamp,
+        is_system=msg.is_system
+    )
+
+
+def get_participant_thread(db: Session, thread_id: str, user_id: str, action: str = "access") -> ChatThread:
+    """Load a thread the user takes part in, or raise 404/403"""
+    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
+    if not thread:
+        raise HTTPException(status_code=404, detail="Chat thread not found")
+    
+    if thread.student_id != user_id and thread.donor_id != user_id:
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action} this chat")
+    return thread
+
 
 @router.get("", response_model=List[ChatThreadResponse])
+@db_route
 def get_chat_threads(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get all chat threads for current user"""
@@ -22,77 +60,276 @@ def get_chat_threads(
         (ChatThread.student_id == current_user.id) | (ChatThread.donor_id == current_user.id)
     ).order_by(ChatThread.updated_at.desc()).all()
     
-    result = []
-    for thread in threads:
-        messages = db.query(Message).filter(Message.thread_id == thread.id).order_by(Message.timestamp).all()
-        result.append(ChatThreadResponse(
-            id=thread.id,
-            item_type=thread.item_type,
-            item_id=thread.item_id,
-            student_id=thread.student_id,
-            donor_id=thread.donor_id,
-            status=thread.status,
-            created_at=thread.created_at,
-            messages=[MessageResponse(
-                id=msg.id,
-                sender_id=msg.sender_id,
-                text=msg.text,
-                timestamp=msg.timestamp,
-                is_system=msg.is_system
-            ) for msg in messages]
-        ))
+    # Load every thread's messages in one query rather than one per thread
+    messages_by_thread: Dict[str, List[Message]] = {thread.id: [] for thread in threads}
+    if threads:
+        messages = db.query(Message).filter(
+            Message.thread_id.in_(list(messages_by_thread))
+        ).order_by(Message.timestamp, Message.id).all()
+        for msg in messages:
+            messages_by_thread[msg.thread_id].append(msg)
+    
+    return [ChatThreadResponse(
+        id=thread.id,
+        item_type=thread.item_type,
+        item_id=thread.item_id,
+        student_id=thread.student_id,
+        donor_id=thread.donor_id,
+        status=thread.status,
+        created_at=thread.created_at,
+        messages=[message_response(msg) for msg in messages_by_thread[thread.id]]
+    ) for thread in threads]
+
+
+def get_thread_contacts(db: Session, user_id: str) -> Dict[str, str]:
+    """Map each of the user's thread ids to the other participant's id"""
+    threads = db.query(ChatThread.id, ChatThread.student_id, ChatThread.donor_id).filter(
+        (ChatThread.student_id == user_id) | (ChatThread.donor_id == user_id)
+    ).all()
+    return {
+        thread_id: donor_id if student_id == user_id else student_id
+        for thread_id, student_id, donor_id in threads
+    }
+
+
+def load_socket_contacts(db: Session, user_id: str) -> Optional[Dict[str, str]]:
+    """Thread contacts for a socket's user, or None if the user doesn't exist.
+
+    Ends the read transaction afterwards so a long-lived socket doesn't hold
+    a pooled connection open.
+    """
+    try:
+        if load_principal(db, user_id) is None:
+            return None
+        return get_thread_contacts(db, user_id)
+    finally:
+        db.rollback()
+
+
+@router.websocket("/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Push channel for chat messages, thread status, typing and presence.
+
+    Authenticate with the same JWT as the REST API, either as ``?token=`` or
+    an ``Authorization: Bearer`` header. Clients may send
+    ``{"type": "typing", "thread_id": ...}`` and ``{"type": "ping"}``.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    user_id = decode_access_token(token) if token else None
+    contacts = await run_in_threadpool(load_socket_contacts, db, user_id) if user_id else None
+    if contacts is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Subscribe before accepting so nothing published after the handshake is missed
+    came_online = not hub.is_online(user_id)
+    subscription = hub.subscribe(user_id)
+    await websocket.accept()
+    await websocket.send_json({"type": "ready", "user_id": user_id})
+    if came_online:
+        hub.publish(set(contacts.values()), {"type": "presence", "user_id": user_id, "online": True})
+    
+    async def forward_events():
+        while True:
+            event = await subscription.queue.get()
+            await websocket.send_json(event)
+    
+    sender = asyncio.create_task(forward_events())
+    reloaded_at = None
+    try:
+        while True:
+            data = await websocket.receive_json()
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "ping":
+                await websocket.send_json({"type": "pong"})
+            elif kind == "typing":
+                thread_id = data.get("thread_id")
+                if not isinstance(thread_id, str):
+                    continue
+                if thread_id not in contacts and (
+                    reloaded_at is None or time.monotonic() - reloaded_at >= CONTACTS_RELOAD_SECONDS
+                ):
+                    # The thread may have been created after we connected; unknown
+                    # ids reload at most once per interval so they can't flood the DB
+                    reloaded_at = time.monotonic()
+                    contacts = await run_in_threadpool(load_socket_contacts, db, user_id) or {}
+                if thread_id in contacts:
+                    hub.publish([contacts[thread_id]], {
+                        "type": "typing",
+                        "thread_id": thread_id,
+                        "user_id": user_id
+                    })
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(subscription)
+        if not hub.is_online(user_id):
+            hub.publish(set(contacts.values()), {"type": "presence", "user_id": user_id, "online": False})
+
+
+@router.get("/inbox", response_model=List[ChatInboxEntry])
+@db_route
+def get_chat_inbox(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's inbox: one summary row per thread.
+
+    Reads the denormalized counters on ``ChatThread`` and joins the last
+    message and the other participant, so this is a single query regardless
+    of how long the conversations are.
+    """
+    other_user = aliased(User)
+    last_message = aliased(Message)
+    other_user_id = case(
+        (ChatThread.student_id == current_user.id, ChatThread.donor_id),
+        else_=ChatThread.student_id
+    )
+    rows = db.query(ChatThread, last_message, other_user).outerjoin(
+        last_message, last_message.id == ChatThread.last_message_id
+    ).join(
+        other_user, other_user.id == other_user_id
+    ).filter(
+        or_(ChatThread.student_id == current_user.id, ChatThread.donor_id == current_user.id)
+    ).order_by(
+        ChatThread.last_message_at.desc().nulls_last(), ChatThread.created_at.desc()
+    ).all()
     
-    return result
+    return [ChatInboxEntry(
+        id=thread.id,
+        item_type=thread.item_type,
+        item_id=thread.item_id,
+        student_id=thread.student_id,
+        donor_id=thread.donor_id,
+        status=thread.status,
+        created_at=thread.created_at,
+        last_message=message_response(msg) if msg else None,
+        last_message_at=thread.last_message_at,
+        message_count=thread.message_count,
+        unread_count=(
+            thread.student_unread_count if thread.student_id == current_user.id
+            else thread.donor_unread_count
+        ),
+        other_participant=ChatParticipantSummary(
+            id=other.id,
+            display_name=other.display_name,
+            avatar_id=other.avatar_id
+        )
+    ) for thread, msg, other in rows]
 
 
 @router.get("/{thread_id}", response_model=ChatThreadResponse)
+@db_route
 def get_chat_thread(
     thread_id: str,
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    before: Optional[str] = Query(None),
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Get a specific chat thread with messages"""
-    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
-    if not thread:
-        raise HTTPException(status_code=404, detail="Chat thread not found")
-    
-    if thread.student_id != current_user.id and thread.donor_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to access this chat")
+    """Get a specific chat thread with messages.
+
+    Without paging parameters the whole history is returned. With ``limit``
+    and/or ``before`` the newest page older than ``before`` is returned;
+    with ``after`` the messages newer than ``after`` are returned, which is
+    what clients poll with. Messages are always in chronological order.
+    A weak ETag covers the thread's last update and message count, so an
+    unchanged thread is answered with 304 before messages are loaded.
+    """
+    thread = get_participant_thread(db, thread_id, current_user.id)
     
-    messages = db.query(Message).filter(Message.thread_id == thread_id).order_by(Message.timestamp).all()
+    etag = weak_etag(thread.id, thread.updated_at or thread.created_at, thread.message_count,
+                     thread.status, before, after, limit)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     
-    return ChatThreadResponse(
+    thread_response = ChatThreadResponse(
         id=thread.id,
         item_type=thread.item_type,
         item_id=thread.item_id,
         student_id=thread.student_id,
         donor_id=thread.donor_id,
         status=thread.status,
-        created_at=thread.created_at,
-        messages=[MessageResponse(
-            id=msg.id,
-            sender_id=msg.sender_id,
-            text=msg.text,
-            timestamp=msg.timestamp,
-            is_system=msg.is_system
-        ) for msg in messages]
+        created_at=thread.created_at
     )
+    
+    query = db.query(Message).filter(Message.thread_id == thread_id)
+    if limit is None and before is None and after is None:
+        messages = query.order_by(Message.timestamp, Message.id).all()
+        thread_response.messages = [message_response(msg) for msg in messages]
+        return thread_response
+    
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    
+    page_size = limit or DEFAULT_PAGE_SIZE
+    if after:
+        query = query.filter(keyset_filter(db, Message.timestamp, Message.id, after, descending=False))
+        messages = query.order_by(Message.timestamp, Message.id).limit(page_size + 1).all()
+        thread_response.has_more = len(messages) > page_size
+        messages = messages[:page_size]
+    else:
+        if before:
+            query = query.filter(keyset_filter(db, Message.timestamp, Message.id, before))
+        messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(page_size + 1).all()
+        thread_response.has_more = len(messages) > page_size
+        messages = list(reversed(messages[:page_size]))
+    
+    thread_response.messages = [message_response(msg) for msg in messages]
+    if messages:
+        thread_response.before_cursor = encode_cursor(messages[0].timestamp, messages[0].id)
+        thread_response.after_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+    else:
+        # Nothing new: keep polling from the same position
+        thread_response.after_cursor = after
+    return thread_response
+
+
+@router.post("/{thread_id}/read", status_code=status.HTTP_204_NO_CONTENT)
+@db_route
+def mark_thread_read(
+    thread_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Reset the current user's unread count for a thread"""
+    thread = get_participant_thread(db, thread_id, current_user.id)
+    
+    if thread.student_id == current_user.id:
+        unread = {"student_unread_count": 0}
+    else:
+        unread = {"donor_unread_count": 0}
+    
+    def reset_unread(session: Session) -> None:
+        session.execute(update(ChatThread).where(ChatThread.id == thread_id).values(**unread))
+    
+    write(db, reset_unread)
+    db.refresh(thread)
+    return None
 
 
 @router.post("/{thread_id}/messages", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def send_message(
     thread_id: str,
     message_data: MessageCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Send a message in a chat thread"""
-    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
-    if not thread:
-        raise HTTPException(status_code=404, detail="Chat thread not found")
-    
-    if thread.student_id != current_user.id and thread.donor_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to send messages in this chat")
+    thread = get_participant_thread(db, thread_id, current_user.id, action="send messages in")
     
     # Determine request_id or offer_id
     request_id = None
@@ -102,34 +339,47 @@ def send_message(
     else:
         offer_id = thread.item_id
     
+    sent_at = utcnow()
     new_message = Message(
         id=str(uuid.uuid4()),
         thread_id=thread_id,
         sender_id=current_user.id,
         text=message_data.text,
         is_system=message_data.is_system,
+        timestamp=sent_at,
         request_id=request_id,
         offer_id=offer_id
     )
     
-    db.add(new_message)
-    thread.updated_at = datetime.utcnow()
-    db.commit()
+    if thread.student_id == current_user.id:
+        unread = {"donor_unread_count": ChatThread.donor_unread_count + 1}
+    else:
+        unread = {"student_unread_count": ChatThread.student_unread_count + 1}
+    
+    def insert_message(session: Session) -> None:
+        session.add(new_message)
+        # Keep the inbox summary current; increments are done in SQL so
+        # concurrent senders don't lose updates.
+        session.execute(update(ChatThread).where(ChatThread.id == thread_id).values(
+            updated_at=sent_at,
+            last_message_id=new_message.id,
+            last_message_at=sent_at,
+            message_count=ChatThread.message_count + 1,
+            **unread
+        ))
+    
+    write(db, insert_message)
     db.refresh(new_message)
+    publish_message(thread, new_message)
     
-    return MessageResponse(
-        id=new_message.id,
-        sender_id=new_message.sender_id,
-        text=new_message.text,
-        timestamp=new_message.timestamp,
-        is_system=new_message.is_system
-    )
+    return message_response(new_message)
 
 
 @router.post("/matches/{item_id}/accept", response_model=MatchAcceptResponse)
+@db_route
 def accept_match(
     item_id: str,
-    current_user: User = Depends(require_seeker_or_donor),
+    current_user: Principal = Depends(require_seeker_or_donor),
     db: Session = Depends(get_db)
 ):
     """Accept a match and generate a completion PIN"""
@@ -169,9 +419,10 @@ def accept_match(
             ChatThread.donor_id == other_user_id
         ).first()
     
+    new_thread = None
     if not thread:
         # Create new thread
-        thread = ChatThread(
+        thread = new_thread = ChatThread(
             id=str(uuid.uuid4()),
             item_type=item_type,
             item_id=item_id,
@@ -181,22 +432,33 @@ def accept_match(
             offer_id=item_id if item_type == "OFFER" else None,
             status="IN_PROGRESS"
         )
-        db.add(thread)
     
     # Generate 4-digit PIN
     completion_pin = f"{random.randint(1000, 9999)}"
+    thread_id = thread.id
     
-    # Update item status and PIN
-    if request:
-        request.status = RequestStatus.IN_PROGRESS
-        request.completion_pin = completion_pin
-    else:
-        offer.status = OfferStatus.IN_PROGRESS
-        offer.completion_pin = completion_pin
+    def accept(session: Session) -> None:
+        # Update item status and PIN
+        row = session.get(MealRequest if request else MealOffer, item_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        row.status = RequestStatus.IN_PROGRESS if request else OfferStatus.IN_PROGRESS
+        row.completion_pin = completion_pin
+        if new_thread is not None:
+            session.add(new_thread)
+        else:
+            session.get(ChatThread, thread_id).status = "IN_PROGRESS"
     
-    thread.status = "IN_PROGRESS"
-    db.commit()
+    write(db, accept)
     db.refresh(thread)
+    db.refresh(request or offer)
+    publish_thread_status(thread)
+    if request:
+        publish_request("updated", request)
+        invalidate_request(request.id)
+    else:
+        publish_offer("updated", offer)
+        invalidate_offer(offer.id)
     
     return MatchAcceptResponse(
         thread_id=thread.id,
@@ -206,10 +468,11 @@ def accept_match(
 
 
 @router.post("/matches/{item_id}/verify-pin", response_model=PinVerifyResponse)
+@db_route
 def verify_pin(
     item_id: str,
     pin_data: PinVerify,
-    current_user: User = Depends(require_seeker_or_donor),
+    current_user: Principal = Depends(require_seeker_or_donor),
     db: Session = Depends(get_db)
 ):
     """Verify completion PIN and mark transaction as complete"""
@@ -230,22 +493,42 @@ def verify_pin(
             message="Invalid PIN"
         )
     
-    # Update status
-    if request:
-        request.status = RequestStatus.FULFILLED
-        request.completion_pin = None
-    else:
-        offer.status = OfferStatus.CLAIMED
-        offer.completion_pin = None
-    
-    # Update thread status
     thread = db.query(ChatThread).filter(
         (ChatThread.request_id == item_id) | (ChatThread.offer_id == item_id)
     ).first()
-    if thread:
-        thread.status = "COMPLETED"
+    thread_id = thread.id if thread else None
     
-    db.commit()
+    def complete(session: Session) -> bool:
+        row = session.get(MealRequest if request else MealOffer, item_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        if row.completion_pin != pin_data.pin:
+            # Completed (or re-accepted with a new PIN) since we checked
+            return False
+        # Update item and thread status
+        row.status = RequestStatus.FULFILLED if request else OfferStatus.CLAIMED
+        row.completion_pin = None
+        if thread_id is not None:
+            session.get(ChatThread, thread_id).status = "COMPLETED"
+        return True
+    
+    completed = write(db, complete)
+    db.refresh(request or offer)
+    if not completed:
+        return PinVerifyResponse(
+            success=False,
+            status=request.status.value if request else offer.status.value,
+            message="Invalid PIN"
+        )
+    if thread:
+        db.refresh(thread)
+        publish_thread_status(thread)
+    if request:
+        publish_request("updated", request)
+        invalidate_request(request.id)
+    else:
+        publish_offer("updated", offer)
+        invalidate_offer(offer.id)
     
     return PinVerifyResponse(
         success=True,
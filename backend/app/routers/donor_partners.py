@@ -1,22 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import DonorPartner, User
+from app.asyncdb import db_route
+from app.models import DonorPartner
 from app.schemas import DonorPartnerResponse, DonorPartnerCreate
-from app.auth import require_admin
+from app.auth import Principal, require_admin
+from app.snapshots import snapshot_response, snapshots
 from typing import List
 import uuid
 
 router = APIRouter(prefix="/donor-partners", tags=["donor-partners"])
 
 
-@router.get("", response_model=List[DonorPartnerResponse])
-def get_donor_partners(
-    db: Session = Depends(get_db)
-):
-    """Get all donor partners (public endpoint)"""
-    partners = db.query(DonorPartner).order_by(DonorPartner.created_at.desc()).all()
-    return [DonorPartnerResponse(
+def partner_response(partner: DonorPartner) -> DonorPartnerResponse:
+    return DonorPartnerResponse(
         id=partner.id,
         name=partner.name,
         category=partner.category,
@@ -30,13 +28,39 @@ def get_donor_partners(
         location=partner.location,
         since=partner.since,
         is_recurring=partner.is_recurring
-    ) for partner in partners]
+    )
+
+
+_partner_list = TypeAdapter(List[DonorPartnerResponse])
+
+
+def build_partner_list(db: Session) -> bytes:
+    partners = db.query(DonorPartner).order_by(DonorPartner.created_at.desc()).all()
+    return _partner_list.dump_json([partner_response(partner) for partner in partners])
+
+
+partner_snapshot = snapshots.register("donor-partners", build_partner_list)
+
+
+@router.get("", response_model=List[DonorPartnerResponse])
+@db_route
+def get_donor_partners(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Get all donor partners (public endpoint).
+
+    Served from an in-memory snapshot with an ETag; the table is read again
+    only after a partner is added or deleted.
+    """
+    return snapshot_response(request, partner_snapshot, db)
 
 
 @router.post("", response_model=DonorPartnerResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_donor_partner(
     partner_data: DonorPartnerCreate,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """Create a new donor partner (admin only)"""
@@ -59,28 +83,16 @@ def create_donor_partner(
     db.add(new_partner)
     db.commit()
     db.refresh(new_partner)
+    partner_snapshot.invalidate()
     
-    return DonorPartnerResponse(
-        id=new_partner.id,
-        name=new_partner.name,
-        category=new_partner.category,
-        tier=new_partner.tier,
-        logo_url=new_partner.logo_url,
-        website_url=new_partner.website_url,
-        total_contribution_display=new_partner.total_contribution_display,
-        is_anonymous=new_partner.is_anonymous,
-        anonymous_name=new_partner.anonymous_name,
-        quote=new_partner.quote,
-        location=new_partner.location,
-        since=new_partner.since,
-        is_recurring=new_partner.is_recurring
-    )
+    return partner_response(new_partner)
 
 
 @router.delete("/{partner_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_route
 def delete_donor_partner(
     partner_id: str,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """Delete a donor partner (admin only)"""
@@ -90,5 +102,6 @@ def delete_donor_partner(
     
     db.delete(partner)
     db.commit()
+    partner_snapshot.invalidate()
     return None
 
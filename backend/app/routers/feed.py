@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from app.feed import feed, FeedFilter
+from typing import Optional
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+
+@router.get("/stream")
+async def stream_feed(
+    request: Request,
+    city: Optional[str] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    diet: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events stream of marketplace changes (public endpoint).
+
+    Emits ``request`` and ``offer`` events with ``action`` set to
+    ``created``, ``updated`` or ``deleted``. Reconnecting clients resume
+    from ``Last-Event-ID``; a ``reset`` event means the gap could not be
+    replayed and the list should be reloaded.
+    """
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    
+    return StreamingResponse(
+        feed.stream(request, FeedFilter(city=city, status=status_filter, diet=diet), resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
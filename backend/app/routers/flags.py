@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, FlaggedContent, MealRequest, MealOffer, RequestStatus, OfferStatus
+from app.asyncdb import db_route
+from app.models import FlaggedContent, MealRequest, MealOffer, RequestStatus, OfferStatus
 from app.schemas import FlagCreate, FlagResponse
-from app.auth import get_current_active_user
+from app.auth import Principal, get_current_principal
+from app.feed import publish_request, publish_offer
+from app.httpcache import invalidate_offer, invalidate_request
+from app.writer import write
 import uuid
 from datetime import datetime
 
@@ -11,9 +16,10 @@ router = APIRouter(prefix="/flags", tags=["flags"])
 
 
 @router.post("", response_model=FlagResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_flag(
     flag_data: FlagCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Flag a request or offer"""
@@ -47,15 +53,23 @@ def create_flag(
         dismissed=False
     )
     
-    # Update item status to FLAGGED
-    if flag_data.item_type == "REQUEST":
-        item.status = RequestStatus.FLAGGED
-    else:
-        item.status = OfferStatus.FLAGGED
+    model = type(item)
+    flagged = RequestStatus.FLAGGED if flag_data.item_type == "REQUEST" else OfferStatus.FLAGGED
+    
+    def insert_flag(session: Session) -> None:
+        session.add(new_flag)
+        # Update item status to FLAGGED
+        session.execute(update(model).where(model.id == item.id).values(status=flagged))
     
-    db.add(new_flag)
-    db.commit()
+    write(db, insert_flag)
     db.refresh(new_flag)
+    db.refresh(item)
+    if flag_data.item_type == "REQUEST":
+        publish_request("updated", item)
+        invalidate_request(item.id)
+    else:
+        publish_offer("updated", item)
+        invalidate_offer(item.id)
     
     return FlagResponse(
         id=new_flag.id,
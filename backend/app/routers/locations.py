@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.asyncdb import db_route
+from app.schemas import LocationResponse
+from app.locations import location_index
+from typing import List
+
+router = APIRouter(prefix="/locations", tags=["locations"])
+
+
+@router.get("/autocomplete", response_model=List[LocationResponse])
+@db_route
+def autocomplete_locations(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=25),
+    db: Session = Depends(get_db)
+):
+    """Suggest known locations by city, "city state", zip or initials prefix"""
+    return [LocationResponse(
+        id=location.id,
+        city=location.city,
+        state=location.state,
+        zip=location.zip,
+        country=location.country
+    ) for location in location_index.search(db, q, limit)]
@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from app.database import get_db
-from app.models import User, MealOffer, OfferStatus
-from app.schemas import OfferCreate, OfferResponse, OfferUpdate
-from app.auth import get_current_active_user, require_donor
-from typing import List, Optional
+from app import marketplace
+from app.asyncdb import db_route
+from app.replicas import get_read_db
+from app.models import User, MealOffer, MealRequest, OfferStatus
+from app.schemas import OfferCreate, OfferResponse, OfferUpdate, OfferPage
+from app.auth import Principal, get_optional_principal, require_donor
+from app.enrichment import load_users
+from app.etags import weak_etag, etag_matches, not_modified, require_match
+from app.compatibility import diet_filter, offers_satisfying
+from app.search import apply_search, page_by_relevance
+from app.locations import city_location_ids
+from app.capacity import reserve_offer_slot, release_offer_slot
+from app.geocoder import fill_coordinates
+from app.geo import geohash_or_none, parse_near, near_clause, page_nearby, search_area, MAX_RADIUS_KM
+from app.feed import publish_offer
+from app.httpcache import invalidate_offer
+from app.pagination import paginate, approximate_count, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.writer import write
+from typing import List, Optional, Union
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/offers", tags=["offers"])
 
 
-def enrich_offer_response(db: Session, offer: MealOffer) -> OfferResponse:
+def enrich_offer_response(db: Session, offer: MealOffer, donor: Optional[User] = None) -> OfferResponse:
     """Enrich offer with donor info for response"""
-    donor = db.query(User).filter(User.id == offer.donor_id).first()
+    if donor is None:
+        donor = db.query(User).filter(User.id == offer.donor_id).first()
     if not donor:
         raise HTTPException(status_code=404, detail="Donor not found")
     
@@ -29,6 +44,7 @@ def enrich_offer_response(db: Session, offer: MealOffer) -> OfferResponse:
         state=offer.state,
         zip=offer.zip,
         country=offer.country,
+        location_id=offer.location_id,
         latitude=offer.latitude,
         longitude=offer.longitude,
         description=offer.description,
@@ -46,26 +62,36 @@ def enrich_offer_response(db: Session, offer: MealOffer) -> OfferResponse:
     )
 
 
+def offer_etag(offer: MealOffer, donor: Optional[User]) -> str:
+    """Weak ETag from the offer's and its donor's last update"""
+    donor_version = (donor.updated_at or donor.created_at) if donor else None
+    return weak_etag(offer.id, offer.updated_at or offer.created_at, donor_version)
+
+
+def enrich_offer_responses(db: Session, offers: List[MealOffer]) -> List[OfferResponse]:
+    """Enrich a list of offers, loading all donors in one query"""
+    donors = load_users(db, (offer.donor_id for offer in offers))
+    return [enrich_offer_response(db, offer, donors.get(offer.donor_id)) for offer in offers]
+
+
+available_offers = marketplace.register(
+    "offers", MealOffer, [OfferStatus.AVAILABLE], MealOffer.created_at, MealOffer.donor_id,
+    enrich_offer_responses
+)
+
+
 @router.post("", response_model=OfferResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_offer(
     offer_data: OfferCreate,
-    current_user: User = Depends(require_donor),
+    current_user: Principal = Depends(require_donor),
     db: Session = Depends(get_db)
 ):
     """Create a new meal offer"""
-    # Check weekly capacity limit
-    if current_user.weekly_meal_limit:
-        current_week_count = db.query(func.count(MealOffer.id)).filter(
-            MealOffer.donor_id == current_user.id,
-            MealOffer.created_at >= func.date('now', '-7 days')
-        ).scalar() or 0
-        
-        if current_week_count >= current_user.weekly_meal_limit:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Weekly limit reached"
-            )
-    
+    now = datetime.now(timezone.utc)
+    latitude, longitude = fill_coordinates(
+        offer_data.latitude, offer_data.longitude, offer_data.zip, offer_data.city, offer_data.state, offer_data.country
+    )
     new_offer = MealOffer(
         id=str(uuid.uuid4()),
         donor_id=current_user.id,
@@ -73,8 +99,9 @@ def create_offer(
         state=offer_data.state,
         zip=offer_data.zip,
         country=offer_data.country,
-        latitude=offer_data.latitude,
-        longitude=offer_data.longitude,
+        latitude=latitude,
+        longitude=longitude,
+        geohash=geohash_or_none(latitude, longitude),
         description=offer_data.description,
         image_url=offer_data.image_url,
         dietary_tags=offer_data.dietary_tags,
@@ -84,24 +111,67 @@ def create_offer(
         availability=offer_data.availability,
         frequency=offer_data.frequency,
         is_anonymous=offer_data.is_anonymous,
-        status=OfferStatus.AVAILABLE
+        status=OfferStatus.AVAILABLE,
+        created_at=now
     )
     
-    db.add(new_offer)
-    db.commit()
+    def insert_offer(session: Session) -> None:
+        # Check weekly capacity limit; the slot is taken in the same transaction
+        if not reserve_offer_slot(session, current_user.id, now):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Weekly limit reached"
+            )
+        session.add(new_offer)
+    
+    write(db, insert_offer)
     db.refresh(new_offer)
+    publish_offer("created", new_offer)
+    invalidate_offer(new_offer.id)
     
     return enrich_offer_response(db, new_offer)
 
 
-@router.get("", response_model=List[OfferResponse])
+@router.get("", response_model=Union[OfferPage, List[OfferResponse]])
+@db_route
 def browse_offers(
     status_filter: Optional[str] = Query(None, alias="status"),
     diet: Optional[str] = Query(None),
     city: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    location_id: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Search descriptions"),
+    for_request: Optional[str] = Query(None, description="Only offers that satisfy this request"),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = Query(False),
+    near: Optional[str] = Query(None, description="lat,lng"),
+    radius_km: float = Query(10.0, gt=0, le=500),
+    sort: Optional[str] = Query(None, pattern="^(recent|distance)$"),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db)
 ):
-    """Browse/filter meal offers"""
+    """Browse/filter meal offers.
+
+    Passing ``limit`` or ``cursor`` returns an ``OfferPage``; without them the
+    full list is returned for older clients. ``city`` matches the start of
+    the city name, ignoring case and spacing; ``location_id`` comes from
+    ``/locations/autocomplete``. ``near=lat,lng`` restricts results
+    to ``radius_km`` and fills in ``distance_km``; ``sort=distance`` orders
+    them nearest first. ``q`` searches descriptions, best matches first
+    unless ``sort=recent``. ``diet`` matches offers that satisfy that preference,
+    so a Vegan offer is listed under Vegetarian too. ``for_request`` keeps
+    only offers meeting that request's dietary, medical and logistics needs.
+    With ``MARKETPLACE_VIEW`` on, AVAILABLE offers without ``q``, ``near`` or
+    ``for_request`` are served from memory (``app.marketplace``).
+    """
+    if available_offers.serves(status_filter) and not (q or near or for_request):
+        items, next_cursor, total = available_offers.browse(
+            db, primary, status_filter, location_id, city, diet, cursor, limit
+        )
+        if limit is None and cursor is None:
+            return items
+        return OfferPage(items=items, next_cursor=next_cursor, total_estimate=total if include_total else None)
+    
     query = db.query(MealOffer)
     
     if status_filter:
@@ -111,50 +181,152 @@ def browse_offers(
         except ValueError:
             pass
     
-    if city:
-        query = query.filter(MealOffer.city.ilike(f"%{city}%"))
+    if location_id:
+        query = query.filter(MealOffer.location_id == location_id)
+    
+    if city and city.strip():
+        query = query.filter(MealOffer.location_id.in_(city_location_ids(city)))
     
     if diet:
-        query = query.filter(MealOffer.dietary_tags.contains([diet]))
+        query = query.filter(diet_filter(MealOffer.dietary_mask, diet))
+    
+    if for_request:
+        meal_request = db.query(MealRequest).filter(MealRequest.id == for_request).first()
+        if not meal_request:
+            raise HTTPException(status_code=404, detail="Request not found")
+        query = query.filter(offers_satisfying(meal_request))
     
-    offers = query.order_by(MealOffer.created_at.desc()).all()
-    return [enrich_offer_response(db, offer) for offer in offers]
+    rank = None
+    if q:
+        paged = limit is not None or cursor is not None
+        query, rank = apply_search(db, query, MealOffer, q, windowed=paged and not near and sort != "recent")
+    
+    if near:
+        origin = parse_near(near)
+        query = query.filter(near_clause(MealOffer.geohash, origin, radius_km))
+        paged = limit is not None or cursor is not None
+        offers, distances, next_cursor = page_nearby(
+            db, query, MealOffer.created_at, MealOffer.id, origin, radius_km,
+            cursor, (limit or DEFAULT_PAGE_SIZE) if paged else None, sort == "distance"
+        )
+        items = enrich_offer_responses(db, offers)
+        for item, distance in zip(items, distances):
+            item.distance_km = round(distance, 3)
+        return OfferPage(items=items, next_cursor=next_cursor) if paged else items
+    
+    if rank is not None and sort != "recent":
+        paged = limit is not None or cursor is not None
+        offers = page_by_relevance(
+            query, rank, MealOffer.created_at, MealOffer.id, cursor, (limit or DEFAULT_PAGE_SIZE) if paged else None
+        )
+        items = enrich_offer_responses(db, offers)
+        if not paged:
+            return items
+        total_estimate = None
+        if include_total:
+            total_estimate = approximate_count(query, ("offers", status_filter, city, location_id, diet, for_request, q))
+        return OfferPage(items=items, total_estimate=total_estimate)
+    
+    if limit is None and cursor is None:
+        offers = query.order_by(MealOffer.created_at.desc(), MealOffer.id.desc()).all()
+        return enrich_offer_responses(db, offers)
+
+    offers, next_cursor = paginate(
+        db, query, MealOffer.created_at, MealOffer.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    total_estimate = None
+    if include_total:
+        total_estimate = approximate_count(query, ("offers", status_filter, city, location_id, diet, for_request, q))
+    return OfferPage(
+        items=enrich_offer_responses(db, offers),
+        next_cursor=next_cursor,
+        total_estimate=total_estimate
+    )
 
 
-@router.get("/mine", response_model=List[OfferResponse])
+@router.get("/mine", response_model=Union[OfferPage, List[OfferResponse]])
+@db_route
 def get_my_offers(
-    current_user: User = Depends(require_donor),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(require_donor),
     db: Session = Depends(get_db)
 ):
     """Get current donor's own offers"""
-    offers = db.query(MealOffer).filter(
-        MealOffer.donor_id == current_user.id
-    ).order_by(MealOffer.created_at.desc()).all()
-    
-    return [enrich_offer_response(db, offer) for offer in offers]
+    query = db.query(MealOffer).filter(MealOffer.donor_id == current_user.id)
+
+    if limit is None and cursor is None:
+        offers = query.order_by(MealOffer.created_at.desc(), MealOffer.id.desc()).all()
+        return enrich_offer_responses(db, offers)
+
+    offers, next_cursor = paginate(
+        db, query, MealOffer.created_at, MealOffer.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    return OfferPage(items=enrich_offer_responses(db, offers), next_cursor=next_cursor)
+
+
+@router.get("/nearby", response_model=List[OfferResponse])
+@db_route
+def nearby_offers(
+    near: Optional[str] = Query(None, description="lat,lng; defaults to the caller's saved location"),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    principal: Optional[Principal] = Depends(get_optional_principal),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db)
+):
+    """Available offers nearest a point, closest first, with ``distance_km``.
+
+    Without ``near`` the search is centred on the caller's saved location and
+    covers their service ``radius``. Answered from the in-memory index of
+    ``app.marketplace`` rather than a query.
+    """
+    user = db.get(User, principal.id) if principal is not None and not near else None
+    origin, radius = search_area(near, radius_km, user)
+    return [
+        item.model_copy(update={"distance_km": round(distance, 3)})
+        for item, distance in available_offers.nearby(db, primary, origin, radius, limit)
+    ]
 
 
 @router.get("/{offer_id}", response_model=OfferResponse)
+@db_route
 def get_offer(
     offer_id: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
 ):
     """Get a specific offer by ID"""
-    offer = db.query(MealOffer).filter(MealOffer.id == offer_id).first()
-    if not offer:
+    row = db.query(MealOffer, User).outerjoin(User, User.id == MealOffer.donor_id).filter(
+        MealOffer.id == offer_id
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Offer not found")
+    offer, donor = row
     
-    return enrich_offer_response(db, offer)
+    etag = offer_etag(offer, donor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return enrich_offer_response(db, offer, donor)
 
 
 @router.patch("/{offer_id}", response_model=OfferResponse)
+@db_route
 def update_offer(
     offer_id: str,
     offer_update: OfferUpdate,
-    current_user: User = Depends(require_donor),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: Principal = Depends(require_donor),
     db: Session = Depends(get_db)
 ):
-    """Update an offer (status, etc.)"""
+    """Update an offer (status, etc.).
+
+    With ``If-Match``, the update only applies if the offer (and its donor)
+    still carry that ETag; otherwise it fails with 412.
+    """
     offer = db.query(MealOffer).filter(MealOffer.id == offer_id).first()
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
@@ -162,20 +334,36 @@ def update_offer(
     if offer.donor_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this offer")
     
+    donor = db.query(User).filter(User.id == offer.donor_id).first()
+    require_match(if_match, offer_etag(offer, donor))
+    
     update_data = offer_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(offer, field, value)
     
-    db.commit()
+    def apply_update(session: Session) -> None:
+        row = session.get(MealOffer, offer_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Offer not found")
+        if if_match is not None:
+            # Checked again with the row locked, in the transaction that writes it
+            session.refresh(row, with_for_update=True)
+            require_match(if_match, offer_etag(row, session.get(User, row.donor_id)))
+        for field, value in update_data.items():
+            setattr(row, field, value)
+    
+    write(db, apply_update)
     db.refresh(offer)
+    publish_offer("updated", offer)
+    invalidate_offer(offer.id)
     
-    return enrich_offer_response(db, offer)
+    response.headers["ETag"] = offer_etag(offer, donor)
+    return enrich_offer_response(db, offer, donor)
 
 
 @router.delete("/{offer_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_route
 def delete_offer(
     offer_id: str,
-    current_user: User = Depends(require_donor),
+    current_user: Principal = Depends(require_donor),
     db: Session = Depends(get_db)
 ):
     """Delete an offer"""
@@ -186,7 +374,15 @@ def delete_offer(
     if offer.donor_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this offer")
     
-    db.delete(offer)
-    db.commit()
+    def remove_offer(session: Session) -> None:
+        row = session.get(MealOffer, offer_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Offer not found")
+        release_offer_slot(session, row)
+        session.delete(row)
+    
+    write(db, remove_offer)
+    publish_offer("deleted", offer)
+    invalidate_offer(offer.id)
     return None
 
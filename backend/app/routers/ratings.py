@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.asyncdb import db_route
+from app.replicas import get_read_db
 from app.models import User, Rating
-from app.schemas import RatingCreate, RatingResponse
-from app.auth import get_current_active_user
-from typing import List
+from app.schemas import RatingCreate, RatingResponse, RatingPage
+from app.auth import Principal, get_current_principal
+from app.enrichment import load_users
+from app.httpcache import invalidate_ratings
+from app.pagination import paginate, approximate_count, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import Dict, List, Optional, Union
 import uuid
 
 router = APIRouter(prefix="/ratings", tags=["ratings"])
 
 
-def enrich_rating_response(db: Session, rating: Rating) -> RatingResponse:
+def enrich_rating_response(db: Session, rating: Rating, users: Optional[Dict[str, User]] = None) -> RatingResponse:
     """Enrich rating with reviewer info"""
-    from_user = db.query(User).filter(User.id == rating.from_user_id).first()
-    to_user = db.query(User).filter(User.id == rating.to_user_id).first()
+    if users is None:
+        users = load_users(db, (rating.from_user_id, rating.to_user_id))
+    from_user = users.get(rating.from_user_id)
+    to_user = users.get(rating.to_user_id)
     
     if not from_user or not to_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -34,10 +41,18 @@ def enrich_rating_response(db: Session, rating: Rating) -> RatingResponse:
     )
 
 
+def enrich_rating_responses(db: Session, ratings: List[Rating]) -> List[RatingResponse]:
+    """Enrich a list of ratings, loading reviewers and recipients in one query"""
+    user_ids = [rating.from_user_id for rating in ratings] + [rating.to_user_id for rating in ratings]
+    users = load_users(db, user_ids)
+    return [enrich_rating_response(db, rating, users) for rating in ratings]
+
+
 @router.post("", response_model=RatingResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_rating(
     rating_data: RatingCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create a rating"""
@@ -59,14 +74,19 @@ def create_rating(
     db.add(new_rating)
     db.commit()
     db.refresh(new_rating)
+    invalidate_ratings()
     
     return enrich_rating_response(db, new_rating)
 
 
-@router.get("", response_model=List[RatingResponse])
+@router.get("", response_model=Union[RatingPage, List[RatingResponse]])
+@db_route
 def get_ratings(
     to_user_id: str = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = Query(False),
+    db: Session = Depends(get_read_db)
 ):
     """Get ratings (optionally filtered by user)"""
     query = db.query(Rating).filter(Rating.is_public == True)
@@ -74,6 +94,19 @@ def get_ratings(
     if to_user_id:
         query = query.filter(Rating.to_user_id == to_user_id)
     
-    ratings = query.order_by(Rating.timestamp.desc()).all()
-    return [enrich_rating_response(db, rating) for rating in ratings]
+    if limit is None and cursor is None:
+        ratings = query.order_by(Rating.timestamp.desc(), Rating.id.desc()).all()
+        return enrich_rating_responses(db, ratings)
+
+    ratings, next_cursor = paginate(
+        db, query, Rating.timestamp, Rating.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    total_estimate = None
+    if include_total:
+        total_estimate = approximate_count(query, ("ratings", to_user_id))
+    return RatingPage(
+        items=enrich_rating_responses(db, ratings),
+        next_cursor=next_cursor,
+        total_estimate=total_estimate
+    )
 
@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from app.database import get_db
-from app.models import User, MealRequest, RequestStatus
-from app.schemas import RequestCreate, RequestResponse, RequestUpdate
-from app.auth import get_current_active_user, require_seeker
-from typing import List, Optional
+from app import marketplace
+from app.asyncdb import db_route
+from app.replicas import get_read_db
+from app.models import User, MealRequest, MealOffer, RequestStatus
+from app.schemas import RequestCreate, RequestResponse, RequestUpdate, RequestPage
+from app.auth import Principal, get_optional_principal, require_seeker
+from app.enrichment import load_users
+from app.etags import weak_etag, etag_matches, not_modified, require_match
+from app.compatibility import diet_filter, requests_satisfied_by
+from app.search import apply_search, page_by_relevance
+from app.locations import city_location_ids
+from app.geocoder import fill_coordinates
+from app.geo import geohash_or_none, parse_near, near_clause, page_nearby, search_area, MAX_RADIUS_KM
+from app.feed import publish_request
+from app.httpcache import invalidate_request
+from app.pagination import paginate, approximate_count, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.writer import write
+from typing import List, Optional, Union
 import uuid
 from datetime import datetime
 
 router = APIRouter(prefix="/requests", tags=["requests"])
 
 
-def enrich_request_response(db: Session, request: MealRequest) -> RequestResponse:
+def enrich_request_response(db: Session, request: MealRequest, seeker: Optional[User] = None) -> RequestResponse:
     """Enrich request with seeker info for response"""
-    seeker = db.query(User).filter(User.id == request.seeker_id).first()
+    if seeker is None:
+        seeker = db.query(User).filter(User.id == request.seeker_id).first()
     if not seeker:
         raise HTTPException(status_code=404, detail="Seeker not found")
     
@@ -29,6 +44,7 @@ def enrich_request_response(db: Session, request: MealRequest) -> RequestRespons
         state=request.state,
         zip=request.zip,
         country=request.country,
+        location_id=request.location_id,
         latitude=request.latitude,
         longitude=request.longitude,
         dietary_needs=request.dietary_needs,
@@ -44,13 +60,35 @@ def enrich_request_response(db: Session, request: MealRequest) -> RequestRespons
     )
 
 
+def request_etag(request: MealRequest, seeker: Optional[User]) -> str:
+    """Weak ETag from the request's and its seeker's last update"""
+    seeker_version = (seeker.updated_at or seeker.created_at) if seeker else None
+    return weak_etag(request.id, request.updated_at or request.posted_at, seeker_version)
+
+
+def enrich_request_responses(db: Session, requests: List[MealRequest]) -> List[RequestResponse]:
+    """Enrich a list of requests, loading all seekers in one query"""
+    seekers = load_users(db, (req.seeker_id for req in requests))
+    return [enrich_request_response(db, req, seekers.get(req.seeker_id)) for req in requests]
+
+
+open_requests = marketplace.register(
+    "requests", MealRequest, [RequestStatus.OPEN], MealRequest.posted_at, MealRequest.seeker_id,
+    enrich_request_responses
+)
+
+
 @router.post("", response_model=RequestResponse, status_code=status.HTTP_201_CREATED)
+@db_route
 def create_request(
     request_data: RequestCreate,
-    current_user: User = Depends(require_seeker),
+    current_user: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
     """Create a new meal request"""
+    latitude, longitude = fill_coordinates(
+        request_data.latitude, request_data.longitude, request_data.zip, request_data.city, request_data.state, request_data.country
+    )
     new_request = MealRequest(
         id=str(uuid.uuid4()),
         seeker_id=current_user.id,
@@ -58,8 +96,9 @@ def create_request(
         state=request_data.state,
         zip=request_data.zip,
         country=request_data.country,
-        latitude=request_data.latitude,
-        longitude=request_data.longitude,
+        latitude=latitude,
+        longitude=longitude,
+        geohash=geohash_or_none(latitude, longitude),
         dietary_needs=request_data.dietary_needs,
         medical_needs=request_data.medical_needs,
         logistics=request_data.logistics,
@@ -70,21 +109,53 @@ def create_request(
         status=RequestStatus.OPEN
     )
     
-    db.add(new_request)
-    db.commit()
+    write(db, lambda session: session.add(new_request))
     db.refresh(new_request)
+    publish_request("created", new_request)
+    invalidate_request(new_request.id)
     
     return enrich_request_response(db, new_request)
 
 
-@router.get("", response_model=List[RequestResponse])
+@router.get("", response_model=Union[RequestPage, List[RequestResponse]])
+@db_route
 def browse_requests(
     status_filter: Optional[str] = Query(None, alias="status"),
     diet: Optional[str] = Query(None),
     city: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    location_id: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Search descriptions"),
+    for_offer: Optional[str] = Query(None, description="Only requests this offer satisfies"),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = Query(False),
+    near: Optional[str] = Query(None, description="lat,lng"),
+    radius_km: float = Query(10.0, gt=0, le=500),
+    sort: Optional[str] = Query(None, pattern="^(recent|distance)$"),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db)
 ):
-    """Browse/filter meal requests"""
+    """Browse/filter meal requests.
+
+    Passing ``limit`` or ``cursor`` returns a ``RequestPage``; without them the
+    full list is returned for older clients. ``city`` matches the start of
+    the city name, ignoring case and spacing; ``location_id`` comes from
+    ``/locations/autocomplete``. ``near=lat,lng`` restricts results
+    to ``radius_km`` and fills in ``distance_km``; ``sort=distance`` orders
+    them nearest first. ``q`` searches descriptions, best matches first
+    unless ``sort=recent``. ``for_offer`` keeps only requests whose dietary,
+    medical and logistics needs that offer meets. With ``MARKETPLACE_VIEW``
+    on, OPEN requests without ``q``, ``near`` or ``for_offer`` are served
+    from memory (``app.marketplace``).
+    """
+    if open_requests.serves(status_filter) and not (q or near or for_offer):
+        items, next_cursor, total = open_requests.browse(
+            db, primary, status_filter, location_id, city, diet, cursor, limit
+        )
+        if limit is None and cursor is None:
+            return items
+        return RequestPage(items=items, next_cursor=next_cursor, total_estimate=total if include_total else None)
+    
     query = db.query(MealRequest)
     
     if status_filter:
@@ -94,51 +165,152 @@ def browse_requests(
         except ValueError:
             pass
     
-    if city:
-        query = query.filter(MealRequest.city.ilike(f"%{city}%"))
+    if location_id:
+        query = query.filter(MealRequest.location_id == location_id)
+    
+    if city and city.strip():
+        query = query.filter(MealRequest.location_id.in_(city_location_ids(city)))
     
     if diet:
-        # Filter by dietary needs (JSON array contains)
-        query = query.filter(MealRequest.dietary_needs.contains([diet]))
+        query = query.filter(diet_filter(MealRequest.dietary_mask, diet))
+    
+    if for_offer:
+        offer = db.query(MealOffer).filter(MealOffer.id == for_offer).first()
+        if not offer:
+            raise HTTPException(status_code=404, detail="Offer not found")
+        query = query.filter(requests_satisfied_by(offer))
+    
+    rank = None
+    if q:
+        paged = limit is not None or cursor is not None
+        query, rank = apply_search(db, query, MealRequest, q, windowed=paged and not near and sort != "recent")
     
-    requests = query.order_by(MealRequest.posted_at.desc()).all()
-    return [enrich_request_response(db, req) for req in requests]
+    if near:
+        origin = parse_near(near)
+        query = query.filter(near_clause(MealRequest.geohash, origin, radius_km))
+        paged = limit is not None or cursor is not None
+        requests, distances, next_cursor = page_nearby(
+            db, query, MealRequest.posted_at, MealRequest.id, origin, radius_km,
+            cursor, (limit or DEFAULT_PAGE_SIZE) if paged else None, sort == "distance"
+        )
+        items = enrich_request_responses(db, requests)
+        for item, distance in zip(items, distances):
+            item.distance_km = round(distance, 3)
+        return RequestPage(items=items, next_cursor=next_cursor) if paged else items
+    
+    if rank is not None and sort != "recent":
+        paged = limit is not None or cursor is not None
+        requests = page_by_relevance(
+            query, rank, MealRequest.posted_at, MealRequest.id, cursor, (limit or DEFAULT_PAGE_SIZE) if paged else None
+        )
+        items = enrich_request_responses(db, requests)
+        if not paged:
+            return items
+        total_estimate = None
+        if include_total:
+            total_estimate = approximate_count(query, ("requests", status_filter, city, location_id, diet, for_offer, q))
+        return RequestPage(items=items, total_estimate=total_estimate)
+    
+    if limit is None and cursor is None:
+        requests = query.order_by(MealRequest.posted_at.desc(), MealRequest.id.desc()).all()
+        return enrich_request_responses(db, requests)
 
+    requests, next_cursor = paginate(
+        db, query, MealRequest.posted_at, MealRequest.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    total_estimate = None
+    if include_total:
+        total_estimate = approximate_count(query, ("requests", status_filter, city, location_id, diet, for_offer, q))
+    return RequestPage(
+        items=enrich_request_responses(db, requests),
+        next_cursor=next_cursor,
+        total_estimate=total_estimate
+    )
 
-@router.get("/mine", response_model=List[RequestResponse])
+
+@router.get("/mine", response_model=Union[RequestPage, List[RequestResponse]])
+@db_route
 def get_my_requests(
-    current_user: User = Depends(require_seeker),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
     """Get current student's own requests"""
-    requests = db.query(MealRequest).filter(
-        MealRequest.seeker_id == current_user.id
-    ).order_by(MealRequest.posted_at.desc()).all()
-    
-    return [enrich_request_response(db, req) for req in requests]
+    query = db.query(MealRequest).filter(MealRequest.seeker_id == current_user.id)
+
+    if limit is None and cursor is None:
+        requests = query.order_by(MealRequest.posted_at.desc(), MealRequest.id.desc()).all()
+        return enrich_request_responses(db, requests)
+
+    requests, next_cursor = paginate(
+        db, query, MealRequest.posted_at, MealRequest.id, cursor, limit or DEFAULT_PAGE_SIZE
+    )
+    return RequestPage(items=enrich_request_responses(db, requests), next_cursor=next_cursor)
+
+
+@router.get("/nearby", response_model=List[RequestResponse])
+@db_route
+def nearby_requests(
+    near: Optional[str] = Query(None, description="lat,lng; defaults to the caller's saved location"),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    principal: Optional[Principal] = Depends(get_optional_principal),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db)
+):
+    """Open requests nearest a point, closest first, with ``distance_km``.
+
+    Without ``near`` the search is centred on the caller's saved location and
+    covers their service ``radius``. Answered from the in-memory index of
+    ``app.marketplace`` rather than a query.
+    """
+    user = db.get(User, principal.id) if principal is not None and not near else None
+    origin, radius = search_area(near, radius_km, user)
+    return [
+        item.model_copy(update={"distance_km": round(distance, 3)})
+        for item, distance in open_requests.nearby(db, primary, origin, radius, limit)
+    ]
 
 
 @router.get("/{request_id}", response_model=RequestResponse)
+@db_route
 def get_request(
     request_id: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
 ):
     """Get a specific request by ID"""
-    request = db.query(MealRequest).filter(MealRequest.id == request_id).first()
-    if not request:
+    row = db.query(MealRequest, User).outerjoin(User, User.id == MealRequest.seeker_id).filter(
+        MealRequest.id == request_id
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Request not found")
+    request, seeker = row
     
-    return enrich_request_response(db, request)
+    etag = request_etag(request, seeker)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return enrich_request_response(db, request, seeker)
 
 
 @router.patch("/{request_id}", response_model=RequestResponse)
+@db_route
 def update_request(
     request_id: str,
     request_update: RequestUpdate,
-    current_user: User = Depends(require_seeker),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
-    """Update a request (pause/resume/mark-fulfilled)"""
+    """Update a request (pause/resume/mark-fulfilled).
+
+    With ``If-Match``, the update only applies if the request (and its
+    seeker) still carry that ETag; otherwise it fails with 412.
+    """
     request = db.query(MealRequest).filter(MealRequest.id == request_id).first()
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -146,20 +318,36 @@ def update_request(
     if request.seeker_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this request")
     
+    seeker = db.query(User).filter(User.id == request.seeker_id).first()
+    require_match(if_match, request_etag(request, seeker))
+    
     update_data = request_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(request, field, value)
     
-    db.commit()
+    def apply_update(session: Session) -> None:
+        row = session.get(MealRequest, request_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Request not found")
+        if if_match is not None:
+            # Checked again with the row locked, in the transaction that writes it
+            session.refresh(row, with_for_update=True)
+            require_match(if_match, request_etag(row, session.get(User, row.seeker_id)))
+        for field, value in update_data.items():
+            setattr(row, field, value)
+    
+    write(db, apply_update)
     db.refresh(request)
+    publish_request("updated", request)
+    invalidate_request(request.id)
     
-    return enrich_request_response(db, request)
+    response.headers["ETag"] = request_etag(request, seeker)
+    return enrich_request_response(db, request, seeker)
 
 
 @router.delete("/{request_id}", status_code=status.HTTP_204_NO_CONTENT)
+@db_route
 def delete_request(
     request_id: str,
-    current_user: User = Depends(require_seeker),
+    current_user: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
     """Delete a request"""
@@ -170,7 +358,14 @@ def delete_request(
     if request.seeker_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this request")
     
-    db.delete(request)
-    db.commit()
+    def remove_request(session: Session) -> None:
+        row = session.get(MealRequest, request_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Request not found")
+        session.delete(row)
+    
+    write(db, remove_request)
+    publish_request("deleted", request)
+    invalidate_request(request.id)
     return None
 
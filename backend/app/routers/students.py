@@ -1,29 +1,43 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.asyncdb import db_route
 from app.models import User
 from app.schemas import UserResponse, UserUpdate
-from app.auth import require_seeker
+from app.auth import Principal, require_seeker, get_user_by_id
 
 router = APIRouter(prefix="/students", tags=["students"])
 
 
+def load_student(db: Session, principal: Principal) -> User:
+    user = get_user_by_id(db, principal.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
 @router.get("/me", response_model=UserResponse)
+@db_route
 def get_student_profile(
-    current_user: User = Depends(require_seeker),
+    principal: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
     """Get current student's profile"""
-    return current_user
+    return load_student(db, principal)
 
 
 @router.patch("/me", response_model=UserResponse)
+@db_route
 def update_student_profile(
     user_update: UserUpdate,
-    current_user: User = Depends(require_seeker),
+    principal: Principal = Depends(require_seeker),
     db: Session = Depends(get_db)
 ):
-    """Update current student's profile"""
+    """Update current student's profile.
+
+    Committing the change drops the cached principal (see ``app.auth``).
+    """
+    current_user = load_student(db, principal)
     update_data = user_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(current_user, field, value)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from app.models import (
     UserRole, VerificationStatus, DietaryPreference, MedicalPreference,
@@ -135,6 +135,7 @@ class RequestResponse(BaseModel):
     state: str
     zip: str
     country: str
+    location_id: Optional[str] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     dietary_needs: List[DietaryPreference]
@@ -147,11 +148,18 @@ class RequestResponse(BaseModel):
     status: RequestStatus
     completion_pin: Optional[str] = None
     posted_at: datetime
+    distance_km: Optional[float] = None  # Only set for near= searches
 
     class Config:
         from_attributes = True
 
 
+class RequestPage(BaseModel):
+    items: List[RequestResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+
 class RequestUpdate(BaseModel):
     status: Optional[RequestStatus] = None
     description: Optional[str] = None
@@ -188,6 +196,7 @@ class OfferResponse(BaseModel):
     state: str
     zip: str
     country: str
+    location_id: Optional[str] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     description: str
@@ -202,11 +211,18 @@ class OfferResponse(BaseModel):
     status: OfferStatus
     completion_pin: Optional[str] = None
     created_at: datetime
+    distance_km: Optional[float] = None  # Only set for near= searches
 
     class Config:
         from_attributes = True
 
 
+class OfferPage(BaseModel):
+    items: List[OfferResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+
 class OfferUpdate(BaseModel):
     status: Optional[OfferStatus] = None
     description: Optional[str] = None
@@ -240,11 +256,36 @@ class ChatThreadResponse(BaseModel):
     status: str
     created_at: datetime
     messages: List[MessageResponse] = []
+    # Set when the history was requested in pages (limit/before/after)
+    has_more: bool = False
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class ChatParticipantSummary(BaseModel):
+    id: str
+    display_name: str
+    avatar_id: int
+
+
+class ChatInboxEntry(BaseModel):
+    id: str
+    item_type: str
+    item_id: str
+    student_id: str
+    donor_id: str
+    status: str
+    created_at: datetime
+    last_message: Optional[MessageResponse] = None
+    last_message_at: Optional[datetime] = None
+    message_count: int
+    unread_count: int
+    other_participant: ChatParticipantSummary
+
+
 # ============ Match/PIN Schemas ============
 class MatchAcceptResponse(BaseModel):
     thread_id: str
@@ -289,6 +330,12 @@ class RatingResponse(BaseModel):
         from_attributes = True
 
 
+class RatingPage(BaseModel):
+    items: List[RatingResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+
 # ============ Flag Schemas ============
 class FlagCreate(BaseModel):
     item_id: str
@@ -311,6 +358,12 @@ class FlagResponse(BaseModel):
         from_attributes = True
 
 
+class FlagPage(BaseModel):
+    items: List[FlagResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+
 # ============ Donor Partner Schemas ============
 class DonorPartnerCreate(BaseModel):
     name: str
@@ -345,3 +398,72 @@ class DonorPartnerResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+# ============ Location Schemas ============
+class LocationResponse(BaseModel):
+    id: str
+    city: str
+    state: str
+    zip: str
+    country: str
+
+    class Config:
+        from_attributes = True
+
+
+# ============ System Schemas ============
+class PasswordPoolStats(BaseModel):
+    workers: int
+    max_pending: int
+    pending: int
+    queued: int
+    completed: int
+    rejected: int
+
+
+class LoopLagStats(BaseModel):
+    enabled: bool
+    interval_ms: float
+    threshold_ms: float
+    samples: int
+    mean_ms: float
+    max_ms: float
+    stalls: int
+    histogram: Dict[str, int]
+
+
+class GroupCommitStats(BaseModel):
+    enabled: bool
+    batches: int
+    writes: int
+    failed: int
+    largest_batch: int
+    queued: int
+
+
+class ResponseCacheStats(BaseModel):
+    enabled: bool
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    invalidations: int
+
+
+class MarketplaceCheck(BaseModel):
+    name: str
+    enabled: bool
+    size: int
+    missing: List[str]
+    extra: List[str]
+    stale: List[str]
+
+
+class SystemMetrics(BaseModel):
+    password_hashing: PasswordPoolStats
+    loop_lag: LoopLagStats
+    group_commit: GroupCommitStats
+    response_cache: ResponseCacheStats
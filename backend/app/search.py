@@ -0,0 +1,166 @@
+"""
+Full-text search over request and offer descriptions.
+
+On SQLite each table gets an FTS5 index (``meal_requests_fts``,
+``meal_offers_fts``) stored as an external-content table keyed by the base
+table's rowid and kept in sync by triggers, so every insert, description
+update and delete — from the routers, the seed script or raw SQL — is
+reflected. Matches are ranked by BM25; a relevance page only scores the
+newest ``SEARCH_RANK_WINDOW`` rows that match and pass the other filters,
+which bounds the rows scored and sorted however common the word is. On
+Postgres a generated
+``search_vector`` tsvector column with a GIN index plays the same role,
+ranked with ``ts_rank_cd``.
+
+The index DDL runs when the tables are created (``create_all``) and from
+the Alembic migration, so both paths produce the same schema.
+"""
+import os
+import re
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    Column, DDL, Float, Integer, MetaData, Table, Text, event, false, func, literal_column, select
+)
+from sqlalchemy.orm import Query, Session
+
+from app.models import MealRequest, MealOffer
+
+SEARCH_COLUMN = "description"
+POSTGRES_SEARCH_CONFIG = "english"
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "1000"))
+_TERM = re.compile(r"\w+")
+
+# The FTS5 tables are not part of Base.metadata (create_all can't build
+# virtual tables); these definitions only let queries reference them.
+_fts_metadata = MetaData()
+_fts_tables = {
+    model.__tablename__: Table(
+        f"{model.__tablename__}_fts",
+        _fts_metadata,
+        Column("rowid", Integer),
+        Column(SEARCH_COLUMN, Text),
+        Column("rank", Float),
+    )
+    for model in (MealRequest, MealOffer)
+}
+
+
+def sqlite_ddl(table_name: str) -> List[str]:
+    """Statements creating the FTS5 index and sync triggers for a table"""
+    fts = f"{table_name}_fts"
+    col = SEARCH_COLUMN
+    insert = f"INSERT INTO {fts}(rowid, {col}) VALUES (new.rowid, new.{col});"
+    delete = f"INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.rowid, old.{col});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{col}, content='{table_name}', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col} ON {table_name} BEGIN {delete} {insert} END",
+    ]
+
+
+def sqlite_drop_ddl(table_name: str) -> List[str]:
+    # Triggers go with their table; only the virtual table needs dropping
+    return [f"DROP TABLE IF EXISTS {table_name}_fts"]
+
+
+def sqlite_rebuild(table_name: str) -> str:
+    """Statement re-reading the whole base table into its FTS5 index.
+
+    Needed after a full ``VACUUM``, which may renumber the rowids the index
+    points at, and to backfill an index created over existing rows.
+    """
+    fts = f"{table_name}_fts"
+    return f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+
+
+def postgres_ddl(table_name: str) -> List[str]:
+    return [
+        f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce({SEARCH_COLUMN}, ''))) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search_vector ON {table_name} USING gin (search_vector)",
+    ]
+
+
+for _model in (MealRequest, MealOffer):
+    _table_name = _model.__tablename__
+    for _statement in sqlite_ddl(_table_name):
+        event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+    for _statement in postgres_ddl(_table_name):
+        event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+    for _statement in sqlite_drop_ddl(_table_name):
+        event.listen(_model.__table__, "before_drop", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def match_expression(q: str) -> Optional[str]:
+    """FTS5 query requiring every word of ``q``, or None if it has no words.
+
+    Each word is quoted so user input can't inject FTS5 operators.
+    """
+    terms = _TERM.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def apply_search(db: Session, query: Query, model, q: str, windowed: bool = False) -> Tuple[Query, Optional[object]]:
+    """Restrict ``query`` (with its other filters applied) to rows matching ``q``.
+
+    Returns the filtered query and a rank expression where lower sorts as
+    more relevant, or None for the rank when ``q`` has no searchable words
+    (the query then matches nothing). With ``windowed`` on SQLite, only the
+    newest ``SEARCH_RANK_WINDOW`` rows of ``query`` that match are kept and
+    scored; leave it off unless the caller takes one page by relevance.
+    """
+    table_name = model.__tablename__
+    if db.get_bind().dialect.name == "postgresql":
+        vector = literal_column(f"{table_name}.search_vector")
+        tsquery = func.websearch_to_tsquery(POSTGRES_SEARCH_CONFIG, q)
+        return query.filter(vector.op("@@")(tsquery)), -func.ts_rank_cd(vector, tsquery)
+
+    expression = match_expression(q)
+    if expression is None:
+        return query.filter(false()), None
+    fts = _fts_tables[table_name]
+    matching = literal_column(fts.name).op("MATCH")(expression)
+    rowid = literal_column(f"{table_name}.rowid")
+    matches = select(fts.c.rowid, fts.c.rank).where(matching)
+    if windowed:
+        # The window is taken after the other filters, so it never holds
+        # rows they drop; rowids grow with each insert
+        window = (
+            query.join(fts, fts.c.rowid == rowid).filter(matching)
+            .with_entities(rowid.label("rowid")).order_by(rowid.desc()).limit(SEARCH_RANK_WINDOW)
+            .subquery(f"{fts.name}_window")
+        )
+        matches = matches.where(fts.c.rowid.in_(select(window.c.rowid)))
+    matches = matches.subquery(f"{fts.name}_matches")
+    query = query.join(matches, matches.c.rowid == rowid)
+    return query, matches.c.rank
+
+
+def page_by_relevance(
+    query: Query,
+    rank,
+    timestamp_column,
+    id_column,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> List[object]:
+    """Best matches first, newest first among equal ranks.
+
+    Relevance scores shift as rows are added, so there is no cursor: ``limit``
+    caps the result. Use ``sort=recent`` to page through every match.
+    """
+    if cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="cursor can't be combined with relevance ordering; use sort=recent"
+        )
+    query = query.order_by(rank, timestamp_column.desc(), id_column.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
@@ -4,7 +4,7 @@ Run with: python -m app.seed
 """
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine, Base
-from app.models import User, MealRequest, MealOffer, DonorPartner, UserRole, VerificationStatus, DietaryPreference, MedicalPreference, FulfillmentOption, Frequency, RequestStatus, OfferStatus, DonorCategory, DonorTier
+from app.models import User, MealRequest, MealOffer, DonorDailyOffers, DonorPartner, UserRole, VerificationStatus, DietaryPreference, MedicalPreference, FulfillmentOption, Frequency, RequestStatus, OfferStatus, DonorCategory, DonorTier
 import bcrypt
 
 def get_password_hash(password: str) -> str:
@@ -88,7 +88,7 @@ def seed_database():
             verification_steps={"emailCheck": True, "phoneCheck": True, "identityCheck": True},
             languages=["English"],
             weekly_meal_limit=5,
-            current_weekly_meals=0,
+            current_weekly_meals=1,
             donor_category=DonorCategory.INDIVIDUAL
         )
         db.add(donor)
@@ -137,6 +137,8 @@ def seed_database():
             created_at=datetime.utcnow()
         )
         db.add(offer1)
+        # Counts towards the donor's weekly limit (see app.capacity)
+        db.add(DonorDailyOffers(donor_id="d-1", day=offer1.created_at.date(), offers=1))
 
         # Create some donor partners
         partner1 = DonorPartner(
@@ -0,0 +1,121 @@
+"""
+Response bodies built once and served from memory until their data changes.
+
+A ``Snapshot`` keeps the serialized JSON of a public, rarely changing list
+as bytes, with a strong ETag. Requests are answered from it without touching
+the database or serializing anything; a matching ``If-None-Match`` gets a
+``304``. Handlers that change the underlying rows call ``invalidate()`` after
+committing, and the next request rebuilds the body (from the primary, so a
+lagging replica can't be frozen into it).
+
+Invalidations travel through a fan-out backend like the marketplace feed,
+so with ``REALTIME_BACKEND_URL`` set every worker drops its copy.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app.etags import etag_matches, not_modified, strong_etag
+from app.realtime import FanoutBackend, LocalBackend, RedisBackend, REALTIME_BACKEND_URL
+
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+Build = Callable[[Session], bytes]
+
+
+class Snapshot:
+    """One cached body; rebuilt by ``build`` on the first request after a change"""
+
+    def __init__(self, name: str, build: Build, registry: "SnapshotRegistry"):
+        self.name = name
+        self.build = build
+        self._registry = registry
+        self._current: Optional[Tuple[bytes, str]] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Tuple[bytes, str]:
+        """(body, etag), building it if needed.
+
+        Concurrent misses each build; there is no build lock because on the
+        async path handlers run on the event loop thread, where waiting on one
+        would stall the loop.
+        """
+        with self._lock:
+            current, generation = self._current, self._generation
+        if current is not None:
+            return current
+        body = self.build(db)
+        current = (body, strong_etag(body))
+        with self._lock:
+            # Dropped while building: serve this body once, don't keep it
+            if self._generation == generation:
+                self._current = current
+        return current
+
+    def drop(self) -> None:
+        """Forget the body in this process"""
+        with self._lock:
+            self._generation += 1
+            self._current = None
+
+    def invalidate(self) -> None:
+        """Drop the body here and in every other worker"""
+        self.drop()
+        self._registry.publish(self.name)
+
+
+class SnapshotRegistry:
+    """The process's snapshots, and the channel their invalidations use"""
+
+    def __init__(self, backend: Optional[FanoutBackend] = None):
+        self.backend = backend or LocalBackend()
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._started = False
+
+    def register(self, name: str, build: Build) -> Snapshot:
+        snapshot = self._snapshots[name] = Snapshot(name, build, self)
+        return snapshot
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver, asyncio.get_running_loop())
+        self._started = True
+
+    async def stop(self) -> None:
+        self._started = False
+        await self.backend.stop()
+
+    def publish(self, name: str) -> None:
+        if self._started:
+            self.backend.publish({"snapshot": name})
+
+    def _deliver(self, envelope: Dict[str, Any]) -> None:
+        snapshot = self._snapshots.get(envelope.get("snapshot"))
+        if snapshot is not None:
+            snapshot.drop()
+
+    def clear(self) -> None:
+        for snapshot in self._snapshots.values():
+            snapshot.drop()
+
+
+def _create_backend() -> FanoutBackend:
+    if REALTIME_BACKEND_URL.startswith(("redis://", "rediss://")):
+        return RedisBackend(REALTIME_BACKEND_URL, channel="studentsupport:snapshots")
+    return LocalBackend()
+
+
+snapshots = SnapshotRegistry(_create_backend())
+
+
+def snapshot_response(request: Request, snapshot: Snapshot, db: Session) -> Response:
+    body, etag = snapshot.get(db)
+    cache_control = f"public, max-age={SNAPSHOT_MAX_AGE_SECONDS}"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    return Response(content=body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": cache_control})
@@ -0,0 +1,215 @@
+"""
+Group commit: one transaction for the writes of many concurrent requests.
+
+On SQLite each commit takes the single write lock (and, without WAL, an
+fsync), so commits from concurrent requests queue behind each other. With
+``GROUP_COMMIT=1``, handlers that write through ``write()`` hand their
+mutation to a single writer thread per engine instead. The writer takes
+whatever has queued up (at most ``GROUP_COMMIT_MAX_BATCH``; while batches
+are being shared it also waits up to ``GROUP_COMMIT_WINDOW_MS`` for more,
+a lone writer doesn't wait), opens one ``BEGIN IMMEDIATE``
+transaction and runs each mutation in its own SAVEPOINT:
+
+- a mutation that raises is rolled back to its savepoint and its caller
+  gets the exception; the rest of the batch is unaffected;
+- mutations run one after another, so each sees the ones before it, as if
+  they had committed serially;
+- after the one COMMIT every caller gets its own result, or the commit's
+  error if it failed.
+
+Mutations get the writer's session, so they must not touch objects loaded
+in the caller's session; they add new objects and update or delete rows by
+id. The objects they add are attached to the caller's session afterwards,
+and the rows they delete are expunged from it.
+
+Handlers on the async path (``ASYNC_DB_ROUTERS``) always commit directly:
+waiting for the writer would block the event loop.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.database import busy_delays, is_busy_error, mark_committed
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "").lower() in ("1", "true", "yes")
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "128"))
+
+T = TypeVar("T")
+Mutation = Callable[[Session], Any]
+
+
+class _Unit:
+    __slots__ = ("mutation", "future")
+
+    def __init__(self, mutation: Mutation):
+        self.mutation = mutation
+        self.future: Future = Future()
+
+
+class GroupCommitWriter:
+    """Single writer thread batching mutations into shared transactions"""
+
+    def __init__(self, bind: Engine, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.bind = bind
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self._queue: "queue.Queue[Optional[_Unit]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, mutation: Mutation) -> Future:
+        """Queue ``mutation``; the future resolves to (result, added objects, deleted identities)"""
+        unit = _Unit(mutation)
+        self._queue.put(unit)
+        return unit.future
+
+    def stop(self) -> None:
+        """Finish what's queued, then end the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        last_batch = 1
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + (self.window if last_batch > 1 else 0.0)
+            while len(batch) < self.max_batch:
+                try:
+                    unit = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if unit is None:
+                    stopping = True
+                    break
+                batch.append(unit)
+            self._commit(batch)
+            last_batch = len(batch)
+
+    def _commit(self, batch: List[_Unit]) -> None:
+        try:
+            outcomes = self._run_with_retries(batch)
+        except Exception as exc:
+            self.failed += len(batch)
+            for unit in batch:
+                unit.future.set_exception(exc)
+            return
+        for unit, (outcome, error) in zip(batch, outcomes):
+            if error is None:
+                self.writes += 1
+                unit.future.set_result(outcome)
+            else:
+                self.failed += 1
+                unit.future.set_exception(error)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+    def _run_with_retries(self, batch: List[_Unit]) -> List[Tuple[Any, Optional[BaseException]]]:
+        for delay in busy_delays():
+            try:
+                return self._run_batch(batch)
+            except OperationalError as exc:
+                if not is_busy_error(exc):
+                    raise
+                time.sleep(delay)
+        return self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Unit]) -> List[Tuple[Any, Optional[BaseException]]]:
+        outcomes = []
+        with Session(bind=self.bind, autoflush=False, expire_on_commit=False) as db:
+            if self.bind.dialect.name == "sqlite":
+                # Take the write lock up front so no savepoint hits SQLITE_BUSY
+                db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for unit in batch:
+                try:
+                    with db.begin_nested():
+                        result = unit.mutation(db)
+                        added = list(db.new)
+                        deleted = [inspect(obj).identity_key for obj in db.deleted]
+                    outcomes.append(((result, added, deleted), None))
+                except OperationalError as exc:
+                    if is_busy_error(exc):
+                        raise
+                    outcomes.append((None, exc))
+                except Exception as exc:
+                    outcomes.append((None, exc))
+            db.commit()
+        return outcomes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
+
+
+_writers: Dict[Engine, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def writer_for(bind: Engine) -> GroupCommitWriter:
+    with _writers_lock:
+        writer = _writers.get(bind)
+        if writer is None:
+            writer = _writers[bind] = GroupCommitWriter(bind)
+        return writer
+
+
+def stop_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+def writer_stats() -> Dict[str, int]:
+    totals = {"batches": 0, "writes": 0, "failed": 0, "largest_batch": 0, "queued": 0}
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        for key, value in writer.stats().items():
+            totals[key] = max(totals[key], value) if key == "largest_batch" else totals[key] + value
+    return {"enabled": GROUP_COMMIT, **totals}
+
+
+def write(db: Session, mutation: Callable[[Session], T]) -> T:
+    """Apply ``mutation`` and commit it, through the group-commit writer if enabled.
+
+    With group commit off (or on the async path) this is ``mutation(db)``
+    followed by ``db.commit()``.
+    """
+    bind = db.get_bind()
+    if not GROUP_COMMIT or bind.dialect.is_async:
+        result = mutation(db)
+        db.commit()
+        return result
+    result, added, deleted = writer_for(bind).submit(mutation).result()
+    mark_committed(db)
+    for obj in added:
+        db.add(obj)
+    for key in deleted:
+        obj = db.identity_map.get(key)
+        if obj is not None:
+            db.expunge(obj)
+    return result
@@ -0,0 +1,163 @@
+"""
+Benchmark sync vs async database handlers under concurrent load.
+
+Fills a temporary SQLite database with requests and a busy chat thread, then
+starts the API twice with uvicorn (one worker each): once with the default
+sync handlers and once with ``ASYNC_DB_ROUTERS=*``. For each, N clients
+repeatedly fetch a browse page (``GET /requests?limit=20``) and a chat page
+(``GET /chats/{id}?limit=20``) for a fixed time; throughput, latency
+percentiles and errors are reported per concurrency level. Every run gets a
+fresh server; errors count non-200 responses and client timeouts.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_async_db --clients 50 200 1000 --seconds 10
+
+Raise ``ulimit -n`` above the largest client count first.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import httpx  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+from app.models import ChatThread, MealOffer, MealRequest, Message, User  # noqa: E402
+
+PORT = 8766
+BATCH = 1000
+
+
+def populate(requests: int, messages: int) -> tuple:
+    """Insert rows; returns (student token, thread id)"""
+    Base.metadata.create_all(bind=engine)
+    student_id, donor_id, offer_id, thread_id = (str(uuid.uuid4()) for _ in range(4))
+    now = datetime.utcnow()
+    address = {"city": "San Jose", "state": "CA", "zip": "95112", "country": "United States"}
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": student_id, "email": "student@bench.local", "password_hash": "x", "role": "SEEKER",
+             "display_name": "Student", "languages": [], **address},
+            {"id": donor_id, "email": "donor@bench.local", "password_hash": "x", "role": "DONOR",
+             "display_name": "Donor", "languages": [], **address},
+        ])
+        for start in range(0, requests, BATCH):
+            connection.execute(MealRequest.__table__.insert(), [
+                {"id": str(uuid.uuid4()), "seeker_id": student_id, "dietary_needs": [], "medical_needs": [],
+                 "logistics": [], "description": f"Request {index}", "availability": "Evenings",
+                 "frequency": "ONCE", "urgency": "NORMAL", "status": "OPEN",
+                 "posted_at": now - timedelta(seconds=index), **address}
+                for index in range(start, min(start + BATCH, requests))
+            ])
+        connection.execute(MealOffer.__table__.insert(), [{
+            "id": offer_id, "donor_id": donor_id, "description": "Offer", "dietary_tags": [], "medical_tags": [],
+            "available_until": now + timedelta(days=1), "logistics": [], "availability": "Now",
+            "frequency": "ONCE", "is_anonymous": False, "status": "IN_PROGRESS", **address,
+        }])
+        connection.execute(ChatThread.__table__.insert(), [{
+            "id": thread_id, "offer_id": offer_id, "item_type": "OFFER", "item_id": offer_id,
+            "student_id": student_id, "donor_id": donor_id, "status": "IN_PROGRESS", "message_count": messages,
+        }])
+        connection.execute(Message.__table__.insert(), [
+            {"id": str(uuid.uuid4()), "thread_id": thread_id, "sender_id": student_id,
+             "text": f"Message {index}", "timestamp": now - timedelta(seconds=index)}
+            for index in range(messages)
+        ])
+    return create_access_token({"sub": student_id}), thread_id
+
+
+def start_server(async_routers: str) -> subprocess.Popen:
+    try:
+        httpx.get(f"http://127.0.0.1:{PORT}/health")
+        raise RuntimeError(f"port {PORT} is already serving")
+    except httpx.TransportError:
+        pass
+    env = dict(os.environ, ASYNC_DB_ROUTERS=async_routers)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "critical",
+         "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def load(url: str, headers: dict, clients: int, seconds: float) -> tuple:
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", headers=headers,
+                                 limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, latencies, errors
+
+
+def percentile(values: list, fraction: float) -> float:
+    return sorted(values)[max(0, int(len(values) * fraction) - 1)] if values else float("nan")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    token, thread_id = populate(args.requests, args.messages)
+    endpoints = {
+        "browse": ("/requests?limit=20", {}),
+        "chat": (f"/chats/{thread_id}?limit=20", {"Authorization": f"Bearer {token}"}),
+    }
+    print(f"{'mode':<6}{'endpoint':<9}{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, (url, headers) in endpoints.items():
+        for clients in args.clients:
+            for mode, routers in (("sync", ""), ("async", "*")):
+                # A fresh server per run, so a stalled run can't slow down the next
+                server = start_server(routers)
+                try:
+                    asyncio.run(load(url, headers, 10, 1))  # warm caches and connections
+                    rate, latencies, errors = asyncio.run(load(url, headers, clients, args.seconds))
+                finally:
+                    server.kill()
+                    server.wait()
+                print(f"{mode:<6}{name:<9}{clients:>8}{rate:>9.0f}"
+                      f"{statistics.median(latencies) if latencies else float('nan'):>9.1f}"
+                      f"{percentile(latencies, 0.99):>9.1f}{errors:>8}")
+
+if __name__ == "__main__":
+    main()
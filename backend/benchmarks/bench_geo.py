@@ -0,0 +1,97 @@
+"""
+Benchmark nearby searches: row-by-row haversine against the NumPy index.
+
+Scatters N points around a few dozen US metro areas (most listings sit in
+cities), then times, from random origins near those metros:
+
+- ``python``: ``app.geo.within_radius`` over every point, the way the
+  ``near=`` browse filters its candidate rows;
+- ``numpy scan``: one vectorized haversine over all N points;
+- ``index``: ``PointIndex.search`` (grid cells, then vectorized haversine),
+  for every match within the radius and for the 20 nearest.
+
+The Python scan gets few repeats at large N; it takes seconds per query.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_geo --points 10000 100000 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.geo import within_radius
+from app.geoindex import PointIndex, haversine_km_many
+
+METROS = 40
+SPREAD_DEGREES = 0.4
+
+
+def scatter(count: int, rng: random.Random) -> list:
+    metros = [(rng.uniform(26.0, 48.0), rng.uniform(-123.0, -71.0)) for _ in range(METROS)]
+    points = []
+    for index in range(count):
+        latitude, longitude = rng.choice(metros)
+        points.append((str(index), rng.gauss(latitude, SPREAD_DEGREES), rng.gauss(longitude, SPREAD_DEGREES)))
+    return points, metros
+
+
+def timed(search, origins: list) -> tuple:
+    """(median ms, mean matches) over the origins"""
+    timings, matches = [], []
+    for origin in origins:
+        started = time.perf_counter()
+        found = search(origin)
+        timings.append((time.perf_counter() - started) * 1000)
+        matches.append(found)
+    return statistics.median(timings), statistics.mean(matches)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    radius = args.radius_km
+
+    print(f"{'points':>10}  {'search':<16}{'median ms':>12}{'matches':>10}")
+    for count in args.points:
+        rng = random.Random(7)
+        points, metros = scatter(count, rng)
+        origins = [
+            (rng.gauss(latitude, SPREAD_DEGREES / 2), rng.gauss(longitude, SPREAD_DEGREES / 2))
+            for latitude, longitude in (rng.choice(metros) for _ in range(args.repeats))
+        ]
+
+        started = time.perf_counter()
+        index = PointIndex()
+        index.load(points)
+        print(f"{count:>10}  {'build index':<16}{(time.perf_counter() - started) * 1000:>12.1f}")
+
+        rows = [SimpleNamespace(id=item_id, latitude=lat, longitude=lng) for item_id, lat, lng in points]
+        python_repeats = max(3, min(args.repeats, 200_000 // count))
+        median, matches = timed(lambda origin: len(within_radius(rows, origin, radius)), origins[:python_repeats])
+        print(f"{count:>10}  {'python':<16}{median:>12.2f}{matches:>10.0f}")
+
+        lats = np.radians(np.array([point[1] for point in points]))
+        lngs = np.radians(np.array([point[2] for point in points]))
+        cos_lats = np.cos(lats)
+        median, matches = timed(
+            lambda origin: int((haversine_km_many(origin[0], origin[1], lats, lngs, cos_lats) <= radius).sum()),
+            origins
+        )
+        print(f"{count:>10}  {'numpy scan':<16}{median:>12.2f}{matches:>10.0f}")
+
+        median, matches = timed(lambda origin: len(index.search(origin[0], origin[1], radius)), origins)
+        print(f"{count:>10}  {'index radius':<16}{median:>12.2f}{matches:>10.0f}")
+        median, matches = timed(lambda origin: len(index.search(origin[0], origin[1], radius, 20)), origins)
+        print(f"{count:>10}  {'index 20 nearest':<16}{median:>12.2f}{matches:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
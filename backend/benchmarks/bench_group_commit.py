@@ -0,0 +1,138 @@
+"""
+Benchmark group commit against committing each write directly.
+
+Writer threads repeatedly send a chat message the way ``send_message`` does
+(insert the message, bump the thread's counters in SQL) through
+``app.writer.write``, first with every call committing its own transaction
+and then with ``GROUP_COMMIT`` on. Runs on a temporary SQLite database with
+the production profile; ``--synchronous FULL`` fsyncs every commit, as
+SQLite does outside WAL mode. Reported: committed writes/s, latency
+percentiles, errors and the mean batch size.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_group_commit --writers 1 16 64 --seconds 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import writer
+from app.database import Base, make_engine
+from app.models import ChatThread, Message, User
+from app.writer import stop_writers, write, writer_stats
+
+
+def populate(engine) -> tuple:
+    """Insert two users and a thread; returns (student id, thread id)"""
+    Base.metadata.create_all(bind=engine)
+    student_id, donor_id, thread_id = (str(uuid.uuid4()) for _ in range(3))
+    address = {"city": "San Jose", "state": "CA", "zip": "95112", "country": "United States"}
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": student_id, "email": "student@bench.local", "password_hash": "x", "role": "SEEKER",
+             "display_name": "Student", "languages": [], **address},
+            {"id": donor_id, "email": "donor@bench.local", "password_hash": "x", "role": "DONOR",
+             "display_name": "Donor", "languages": [], **address},
+        ])
+        connection.execute(ChatThread.__table__.insert(), [{
+            "id": thread_id, "item_type": "REQUEST", "item_id": str(uuid.uuid4()), "student_id": student_id,
+            "donor_id": donor_id, "status": "IN_PROGRESS", "message_count": 0,
+        }])
+    return student_id, thread_id
+
+
+def send_message(db: Session, student_id: str, thread_id: str) -> None:
+    sent_at = datetime.utcnow()
+    message = Message(id=str(uuid.uuid4()), thread_id=thread_id, sender_id=student_id, text="Hello",
+                      timestamp=sent_at)
+
+    def insert_message(session: Session) -> None:
+        session.add(message)
+        session.execute(update(ChatThread).where(ChatThread.id == thread_id).values(
+            updated_at=sent_at, last_message_id=message.id, last_message_at=sent_at,
+            message_count=ChatThread.message_count + 1,
+            donor_unread_count=ChatThread.donor_unread_count + 1,
+        ))
+
+    write(db, insert_message)
+
+
+def run(group_commit: bool, writers: int, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(f"sqlite:///{path}", "production")
+    if args.synchronous != "NORMAL":
+        @event.listens_for(engine, "connect")
+        def set_synchronous(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"PRAGMA synchronous={args.synchronous}")
+    student_id, thread_id = populate(engine)
+    writer.GROUP_COMMIT = group_commit
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with Session(engine) as db:
+                    send_message(db, student_id, thread_id)
+                ok = True
+            except OperationalError:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = writer_stats()
+    stop_writers()
+    with engine.connect() as connection:
+        stored = connection.exec_driver_sql("SELECT message_count FROM chat_threads").scalar()
+    engine.dispose()
+    assert stored == len(latencies), "lost update"
+    latencies.sort()
+    return {
+        "writes/s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else float("nan"),
+        "errors": errors,
+        "batch": stats["writes"] / stats["batches"] if stats["batches"] else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="NORMAL")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'writers':>8}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'batch':>7}")
+    for writers in args.writers:
+        for mode, group_commit in (("direct", False), ("group", True)):
+            result = run(group_commit, writers, args)
+            print(f"{mode:<8}{writers:>8}{result['writes/s']:>10.0f}{result['p50']:>9.1f}{result['p99']:>9.1f}"
+                  f"{result['errors']:>8}{result['batch']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark description search (``q=``) on a large SQLite database.
+
+Fills a temporary database with N meal requests whose descriptions are
+drawn from a skewed vocabulary (a few very common words, a long tail of
+rare ones), then times the query ``GET /requests?q=...&limit=20`` runs:
+FTS5 match, status filter, BM25 ordering and the first page of rows.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import MealRequest, RequestStatus  # noqa: E402
+from app.search import apply_search, page_by_relevance  # noqa: E402
+
+COMMON = ["meal", "dinner", "lunch", "food", "week", "please", "student", "need"]
+DISHES = ["rice", "dal", "curry", "pasta", "soup", "salad", "tacos", "noodles", "bread", "beans"]
+OCCASIONS = ["birthday", "exam", "graduation", "holiday", "festival"]
+# Rare words: one in a few thousand descriptions
+TAIL = [f"word{index}" for index in range(5000)]
+QUERIES = ["rice", "no dairy", "birthday cake", "word42", "dinner"]
+
+BATCH = 10000
+
+
+def description(rng: random.Random) -> str:
+    words = rng.sample(COMMON, 3) + rng.sample(DISHES, 2) + [rng.choice(TAIL)]
+    if rng.random() < 0.05:
+        words += ["birthday", "cake"]
+    if rng.random() < 0.1:
+        words += [rng.choice(OCCASIONS)]
+    if rng.random() < 0.03:
+        words += ["no", "dairy"]
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def populate(rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    table = MealRequest.__table__
+    seeker_id = str(uuid.uuid4())
+    with engine.begin() as connection:
+        for start in range(0, rows, BATCH):
+            connection.execute(table.insert(), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "seeker_id": seeker_id,
+                    "city": "San Jose",
+                    "state": "CA",
+                    "zip": "95112",
+                    "country": "United States",
+                    "dietary_needs": [],
+                    "medical_needs": [],
+                    "logistics": [],
+                    "description": description(rng),
+                    "availability": "Evenings",
+                    "frequency": "ONCE",
+                    "urgency": "NORMAL",
+                    "status": rng.choice(["OPEN", "OPEN", "OPEN", "FULFILLED"]),
+                }
+                for _ in range(min(BATCH, rows - start))
+            ])
+
+
+def time_query(q: str, repeats: int) -> list:
+    timings = []
+    db = SessionLocal()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            query = db.query(MealRequest).filter(MealRequest.status == RequestStatus.OPEN)
+            query, rank = apply_search(db, query, MealRequest, q, windowed=True)
+            page_by_relevance(query, rank, MealRequest.posted_at, MealRequest.id, None, 20)
+            timings.append((time.perf_counter() - started) * 1000)
+            db.expunge_all()
+    finally:
+        db.close()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    populate(args.rows)
+    print(f"inserted and indexed {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'query':<16}{'matches':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for q in QUERIES:
+        db = SessionLocal()
+        matches = apply_search(db, db.query(MealRequest), MealRequest, q)[0].count()
+        db.close()
+        timings = sorted(time_query(q, args.repeats))
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        print(f"{q:<16}{matches:>10}{statistics.median(timings):>10.2f}{p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark concurrent SQLite writes with the default and production profiles.
+
+For each profile a fresh temporary database gets a chat thread and some
+requests; then writer threads repeatedly run the chat "send message"
+transaction (read the thread, insert a message, bump its counter, commit)
+while reader threads page through requests. The default profile runs
+transactions once; the production profile runs them through
+``retry_on_busy``. Reported: committed writes/s, failed writes (error rate)
+and reads/s.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_sqlite_writes --writers 8 --readers 4 --seconds 10
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.database import Base, make_engine, retry_on_busy
+from app.models import ChatThread, MealRequest, Message, User
+
+
+def populate(engine, requests: int) -> str:
+    """Insert users, requests and one thread; returns the thread id"""
+    Base.metadata.create_all(bind=engine)
+    student_id, donor_id, thread_id = (str(uuid.uuid4()) for _ in range(3))
+    address = {"city": "San Jose", "state": "CA", "zip": "95112", "country": "United States"}
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": student_id, "email": "student@bench.local", "password_hash": "x", "role": "SEEKER",
+             "display_name": "Student", "languages": [], **address},
+            {"id": donor_id, "email": "donor@bench.local", "password_hash": "x", "role": "DONOR",
+             "display_name": "Donor", "languages": [], **address},
+        ])
+        connection.execute(MealRequest.__table__.insert(), [
+            {"id": str(uuid.uuid4()), "seeker_id": student_id, "dietary_needs": [], "medical_needs": [],
+             "logistics": [], "description": f"Request {index}", "availability": "Evenings",
+             "frequency": "ONCE", "urgency": "NORMAL", "status": "OPEN", **address}
+            for index in range(requests)
+        ])
+        connection.execute(ChatThread.__table__.insert(), [{
+            "id": thread_id, "item_type": "REQUEST", "item_id": str(uuid.uuid4()), "student_id": student_id,
+            "donor_id": donor_id, "status": "IN_PROGRESS", "message_count": 0,
+        }])
+    return thread_id
+
+
+def send_message(db: Session, thread_id: str) -> None:
+    thread = db.query(ChatThread).filter(ChatThread.id == thread_id).first()
+    db.add(Message(id=str(uuid.uuid4()), thread_id=thread_id, sender_id=thread.student_id,
+                   text="Hello", timestamp=datetime.utcnow()))
+    thread.message_count = ChatThread.message_count + 1
+    db.commit()
+
+
+def browse(db: Session) -> None:
+    db.query(MealRequest).order_by(MealRequest.posted_at.desc()).limit(20).all()
+    db.rollback()
+
+
+def run(profile: str, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(f"sqlite:///{path}", profile)
+    thread_id = populate(engine, args.requests)
+    write = retry_on_busy(send_message) if profile == "production" else send_message
+    counts = {"writes": 0, "errors": 0, "reads": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def writer():
+        while time.perf_counter() < deadline:
+            with Session(engine) as db:
+                try:
+                    write(db=db, thread_id=thread_id)
+                    key = "writes"
+                except OperationalError:
+                    key = "errors"
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            with Session(engine) as db:
+                browse(db)
+            with lock:
+                counts["reads"] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    with engine.connect() as connection:
+        stored = connection.exec_driver_sql("SELECT message_count FROM chat_threads").scalar()
+    engine.dispose()
+    assert stored == counts["writes"], "lost update"
+    attempts = counts["writes"] + counts["errors"]
+    return {
+        "writes/s": counts["writes"] / elapsed,
+        "errors": counts["errors"],
+        "error %": 100 * counts["errors"] / attempts if attempts else 0.0,
+        "reads/s": counts["reads"] / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12}{'writes/s':>10}{'errors':>8}{'error %':>9}{'reads/s':>10}")
+    for profile in ("default", "production"):
+        result = run(profile, args)
+        print(f"{profile:<12}{result['writes/s']:>10.0f}{result['errors']:>8}"
+              f"{result['error %']:>9.1f}{result['reads/s']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark concurrent chat WebSocket connections on a single worker.
+
+Starts the API with uvicorn in this process (one worker, temporary SQLite
+database), opens N authenticated connections to /chats/ws and reports:
+
+- connection setup rate
+- fan-out latency for one event delivered to every connection
+- resident memory per connection
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_ws_connections --connections 100 500 1000
+
+Raise ``ulimit -n`` above the largest connection count first.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import uvicorn  # noqa: E402
+import websockets  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User, UserRole  # noqa: E402
+from app.realtime import hub  # noqa: E402
+
+PORT = 8765
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def create_user() -> str:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user_id = str(uuid.uuid4())
+    user = User(
+        id=user_id,
+        email=f"{uuid.uuid4().hex}@bench.local",
+        password_hash="x",
+        role=UserRole.SEEKER,
+        display_name="Bench",
+    )
+    db.add(user)
+    db.commit()
+    db.close()
+    return user_id
+
+
+def start_server() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning", ws_max_queue=1024))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_round(user_id: str, token: str, count: int, rounds: int) -> None:
+    url = f"ws://127.0.0.1:{PORT}/chats/ws?token={token}"
+    rss_before = rss_mb()
+
+    started = time.perf_counter()
+    sockets = await asyncio.gather(*(websockets.connect(url, max_queue=None) for _ in range(count)))
+    await asyncio.gather(*(ws.recv() for ws in sockets))  # "ready"
+    connect_seconds = time.perf_counter() - started
+
+    latencies = []
+    for i in range(rounds):
+        sent = time.perf_counter()
+        hub.publish([user_id], {"type": "bench", "seq": i})
+        await asyncio.gather(*(ws.recv() for ws in sockets))
+        latencies.append((time.perf_counter() - sent) * 1000)
+
+    rss_after = rss_mb()
+    await asyncio.gather(*(ws.close() for ws in sockets))
+
+    print(
+        f"{count:>6} conns | connect {count / connect_seconds:8.0f}/s | "
+        f"fan-out p50 {statistics.median(latencies):7.1f} ms "
+        f"max {max(latencies):7.1f} ms | "
+        f"~{max(rss_after - rss_before, 0) * 1024 / count:6.1f} KiB/conn"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    user_id = create_user()
+    token = create_access_token({"sub": user_id})
+    server = start_server()
+    try:
+        for count in args.connections:
+            asyncio.run(run_round(user_id, token, count, args.rounds))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
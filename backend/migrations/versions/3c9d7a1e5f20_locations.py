@@ -0,0 +1,103 @@
+"""Normalized locations table and location_id on users, requests and offers
+
+Revision ID: 3c9d7a1e5f20
+Revises: e61a0d5f3b72
+Create Date: 2026-10-17 14:21:46.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.locations import build_location
+from app.models import PrefixString
+from app.search import sqlite_ddl, sqlite_rebuild
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d7a1e5f20'
+down_revision: Union[str, Sequence[str], None] = 'e61a0d5f3b72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('users', 'meal_requests', 'meal_offers')
+INDEXES = [
+    ('users', 'ix_users_location_id', ['location_id']),
+    ('meal_requests', 'ix_meal_requests_location_id_posted_at_id', ['location_id', 'posted_at', 'id']),
+    ('meal_offers', 'ix_meal_offers_location_id_created_at_id', ['location_id', 'created_at', 'id']),
+]
+SEARCH_TABLES = ('meal_requests', 'meal_offers')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('locations',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('city_key', PrefixString, nullable=False),
+    sa.Column('country', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('city', sa.String(), nullable=False),
+    sa.Column('zip', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_index(op.f('ix_locations_city_key'), 'locations', ['city_key'], unique=False)
+    dialect = op.get_bind().dialect.name
+    for table_name in TABLES:
+        if dialect == 'sqlite':
+            # SQLite adds a referencing column in place; batch mode would
+            # rebuild the table and drop its search triggers
+            op.execute(f'ALTER TABLE {table_name} ADD COLUMN location_id VARCHAR REFERENCES locations (id)')
+        else:
+            op.add_column(table_name, sa.Column('location_id', sa.String(), nullable=True))
+            op.create_foreign_key(f'fk_{table_name}_location_id', table_name, 'locations', ['location_id'], ['id'])
+    for table_name, index_name, columns in INDEXES:
+        op.create_index(index_name, table_name, columns, unique=False)
+
+    # Backfill one location per distinct address
+    connection = op.get_bind()
+    locations = sa.table(
+        'locations',
+        *(sa.column(name, sa.String()) for name in ('id', 'key', 'city_key', 'country', 'state', 'city', 'zip')),
+    )
+    seen = set()
+    for table_name in TABLES:
+        table = sa.table(
+            table_name,
+            *(sa.column(name, sa.String()) for name in ('id', 'country', 'state', 'city', 'zip', 'location_id')),
+        )
+        rows = connection.execute(
+            sa.select(table.c.id, table.c.country, table.c.state, table.c.city, table.c.zip)
+        ).fetchall()
+        for row_id, country, state, city, zip in rows:
+            location = build_location(country, state, city, zip)
+            if location is None:
+                continue
+            if location.id not in seen:
+                seen.add(location.id)
+                connection.execute(locations.insert().values(
+                    id=location.id, key=location.key, city_key=location.city_key, country=location.country,
+                    state=location.state, city=location.city, zip=location.zip,
+                ))
+            connection.execute(table.update().where(table.c.id == row_id).values(location_id=location.id))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name, index_name, columns in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table_name)
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column('location_id')
+    if op.get_bind().dialect.name == 'sqlite':
+        # Rebuilding the tables dropped their search triggers and may have
+        # renumbered the rowids the search index points at
+        for table_name in SEARCH_TABLES:
+            for statement in sqlite_ddl(table_name):
+                op.execute(statement)
+            op.execute(sqlite_rebuild(table_name))
+    op.drop_index(op.f('ix_locations_city_key'), table_name='locations')
+    op.drop_table('locations')
@@ -0,0 +1,55 @@
+"""Chat inbox summary columns
+
+Revision ID: 4a93f2b61199
+Revises: feb3d3d593e7
+Create Date: 2026-10-17 09:12:40.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a93f2b61199'
+down_revision: Union[str, Sequence[str], None] = 'feb3d3d593e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_threads', sa.Column('last_message_id', sa.String(), nullable=True))
+    op.add_column('chat_threads', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('chat_threads', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_threads', sa.Column('student_unread_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_threads', sa.Column('donor_unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the summary from existing messages. Unread counts start at
+    # zero since read state was never tracked before this revision.
+    op.execute("""
+        UPDATE chat_threads SET
+            message_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.thread_id = chat_threads.id
+            ),
+            last_message_at = (
+                SELECT MAX(messages.timestamp) FROM messages WHERE messages.thread_id = chat_threads.id
+            ),
+            last_message_id = (
+                SELECT messages.id FROM messages
+                WHERE messages.thread_id = chat_threads.id
+                ORDER BY messages.timestamp DESC, messages.id DESC
+                LIMIT 1
+            )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chat_threads') as batch_op:
+        batch_op.drop_column('donor_unread_count')
+        batch_op.drop_column('student_unread_count')
+        batch_op.drop_column('message_count')
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_id')
@@ -0,0 +1,77 @@
+"""Compatibility bitmask columns on requests and offers
+
+Revision ID: 7e3b90c4d1f8
+Revises: d52f8a0c7e13
+Create Date: 2026-10-17 12:04:51.327716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.compatibility import dietary_mask, medical_mask, logistics_mask, provided_masks
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e3b90c4d1f8'
+down_revision: Union[str, Sequence[str], None] = 'd52f8a0c7e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('meal_requests', 'meal_offers')
+MASK_COLUMNS = ('dietary_mask', 'medical_mask', 'logistics_mask')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table_name in TABLES:
+        for column_name in MASK_COLUMNS:
+            op.add_column(table_name, sa.Column(column_name, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill masks from the existing JSON tag arrays
+    connection = op.get_bind()
+    requests = sa.table(
+        'meal_requests',
+        sa.column('id', sa.String()),
+        sa.column('dietary_needs', sa.JSON()),
+        sa.column('medical_needs', sa.JSON()),
+        sa.column('logistics', sa.JSON()),
+        *(sa.column(name, sa.Integer()) for name in MASK_COLUMNS),
+    )
+    rows = connection.execute(
+        sa.select(requests.c.id, requests.c.dietary_needs, requests.c.medical_needs, requests.c.logistics)
+    ).fetchall()
+    for row_id, dietary_needs, medical_needs, logistics in rows:
+        connection.execute(requests.update().where(requests.c.id == row_id).values(
+            dietary_mask=dietary_mask(dietary_needs),
+            medical_mask=medical_mask(medical_needs),
+            logistics_mask=logistics_mask(logistics),
+        ))
+
+    offers = sa.table(
+        'meal_offers',
+        sa.column('id', sa.String()),
+        sa.column('dietary_tags', sa.JSON()),
+        sa.column('medical_tags', sa.JSON()),
+        sa.column('logistics', sa.JSON()),
+        *(sa.column(name, sa.Integer()) for name in MASK_COLUMNS),
+    )
+    rows = connection.execute(
+        sa.select(offers.c.id, offers.c.dietary_tags, offers.c.medical_tags, offers.c.logistics)
+    ).fetchall()
+    for row_id, dietary_tags, medical_tags, logistics in rows:
+        dietary, medical = provided_masks(dietary_tags, medical_tags)
+        connection.execute(offers.update().where(offers.c.id == row_id).values(
+            dietary_mask=dietary,
+            medical_mask=medical,
+            logistics_mask=logistics_mask(logistics),
+        ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            for column_name in reversed(MASK_COLUMNS):
+                batch_op.drop_column(column_name)
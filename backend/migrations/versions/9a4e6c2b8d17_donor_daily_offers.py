@@ -0,0 +1,61 @@
+"""Daily offer buckets behind the rolling weekly limit
+
+Revision ID: 9a4e6c2b8d17
+Revises: 3c9d7a1e5f20
+Create Date: 2026-10-17 15:02:18.774310
+
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.capacity import WEEK_DAYS, utc_day
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e6c2b8d17'
+down_revision: Union[str, Sequence[str], None] = '3c9d7a1e5f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('donor_daily_offers',
+    sa.Column('donor_id', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('offers', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['donor_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('donor_id', 'day')
+    )
+
+    # Backfill buckets and totals from the offers posted in the window
+    connection = op.get_bind()
+    offers = sa.table('meal_offers', sa.column('donor_id', sa.String()), sa.column('created_at', sa.DateTime()))
+    buckets = sa.table(
+        'donor_daily_offers',
+        sa.column('donor_id', sa.String()), sa.column('day', sa.Date()), sa.column('offers', sa.Integer()),
+    )
+    users = sa.table('users', sa.column('id', sa.String()), sa.column('current_weekly_meals', sa.Integer()))
+
+    today = datetime.now(timezone.utc).date()
+    window_start = datetime.combine(today - timedelta(days=WEEK_DAYS - 1), datetime.min.time())
+    rows = connection.execute(
+        sa.select(offers.c.donor_id, offers.c.created_at).where(offers.c.created_at >= window_start)
+    ).fetchall()
+    counts = Counter((donor_id, utc_day(created_at)) for donor_id, created_at in rows)
+    totals = Counter()
+    for (donor_id, day), count in counts.items():
+        connection.execute(buckets.insert().values(donor_id=donor_id, day=day, offers=count))
+        totals[donor_id] += count
+    connection.execute(users.update().values(current_weekly_meals=0))
+    for donor_id, total in totals.items():
+        connection.execute(users.update().where(users.c.id == donor_id).values(current_weekly_meals=total))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('donor_daily_offers')
@@ -0,0 +1,28 @@
+"""Message history index
+
+Revision ID: 9c1e7d4b2a60
+Revises: 4a93f2b61199
+Create Date: 2026-10-17 10:03:11.502716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e7d4b2a60'
+down_revision: Union[str, Sequence[str], None] = '4a93f2b61199'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_thread_id_timestamp_id', 'messages', ['thread_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_thread_id_timestamp_id', table_name='messages')
@@ -0,0 +1,49 @@
+"""Full-text search indexes on request and offer descriptions
+
+Revision ID: b8f4e21a9c35
+Revises: 7e3b90c4d1f8
+Create Date: 2026-10-17 12:48:19.503861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.search import postgres_ddl, sqlite_ddl, sqlite_drop_ddl, sqlite_rebuild
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8f4e21a9c35'
+down_revision: Union[str, Sequence[str], None] = '7e3b90c4d1f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('meal_requests', 'meal_offers')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for table_name in TABLES:
+        if dialect == 'sqlite':
+            for statement in sqlite_ddl(table_name):
+                op.execute(statement)
+            # Index the rows that already exist
+            op.execute(sqlite_rebuild(table_name))
+        elif dialect == 'postgresql':
+            for statement in postgres_ddl(table_name):
+                op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for table_name in TABLES:
+        if dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table_name}_fts_{suffix}')
+            for statement in sqlite_drop_ddl(table_name):
+                op.execute(statement)
+        elif dialect == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{table_name}_search_vector')
+            op.execute(f'ALTER TABLE {table_name} DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,57 @@
+"""Geohash columns on requests and offers
+
+Revision ID: d52f8a0c7e13
+Revises: 9c1e7d4b2a60
+Create Date: 2026-10-17 11:26:05.640194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.geo import encode_geohash
+from app.models import PrefixString
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52f8a0c7e13'
+down_revision: Union[str, Sequence[str], None] = '9c1e7d4b2a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('meal_requests', 'meal_offers')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    for table_name in TABLES:
+        op.add_column(table_name, sa.Column('geohash', PrefixString, nullable=True))
+        op.create_index(op.f(f'ix_{table_name}_geohash'), table_name, ['geohash'], unique=False)
+
+        # Backfill rows that already have coordinates
+        table = sa.table(
+            table_name,
+            sa.column('id', sa.String()),
+            sa.column('latitude', sa.Float()),
+            sa.column('longitude', sa.Float()),
+            sa.column('geohash', sa.String()),
+        )
+        rows = connection.execute(
+            sa.select(table.c.id, table.c.latitude, table.c.longitude).where(
+                table.c.latitude.isnot(None), table.c.longitude.isnot(None)
+            )
+        ).fetchall()
+        for row_id, latitude, longitude in rows:
+            connection.execute(
+                table.update().where(table.c.id == row_id).values(geohash=encode_geohash(latitude, longitude))
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name in TABLES:
+        op.drop_index(op.f(f'ix_{table_name}_geohash'), table_name=table_name)
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column('geohash')
@@ -0,0 +1,60 @@
+"""Composite indexes for list queries; drop redundant id indexes
+
+Revision ID: e61a0d5f3b72
+Revises: b8f4e21a9c35
+Create Date: 2026-10-17 13:37:02.915448
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61a0d5f3b72'
+down_revision: Union[str, Sequence[str], None] = 'b8f4e21a9c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, index name, columns), matched to the queries in app/routers
+INDEXES = [
+    ('meal_requests', 'ix_meal_requests_posted_at_id', ['posted_at', 'id']),
+    ('meal_requests', 'ix_meal_requests_status_posted_at_id', ['status', 'posted_at', 'id']),
+    ('meal_requests', 'ix_meal_requests_seeker_id_posted_at_id', ['seeker_id', 'posted_at', 'id']),
+    ('meal_offers', 'ix_meal_offers_created_at_id', ['created_at', 'id']),
+    ('meal_offers', 'ix_meal_offers_status_created_at_id', ['status', 'created_at', 'id']),
+    ('meal_offers', 'ix_meal_offers_donor_id_created_at_id', ['donor_id', 'created_at', 'id']),
+    ('chat_threads', 'ix_chat_threads_student_id_updated_at', ['student_id', 'updated_at']),
+    ('chat_threads', 'ix_chat_threads_donor_id_updated_at', ['donor_id', 'updated_at']),
+    ('chat_threads', 'ix_chat_threads_request_id', ['request_id']),
+    ('chat_threads', 'ix_chat_threads_offer_id', ['offer_id']),
+    ('messages', 'ix_messages_request_id', ['request_id']),
+    ('messages', 'ix_messages_offer_id', ['offer_id']),
+    ('ratings', 'ix_ratings_is_public_timestamp_id', ['is_public', 'timestamp', 'id']),
+    ('ratings', 'ix_ratings_to_user_id_is_public_timestamp_id', ['to_user_id', 'is_public', 'timestamp', 'id']),
+    ('flagged_content', 'ix_flagged_content_dismissed_timestamp_id', ['dismissed', 'timestamp', 'id']),
+    ('flagged_content', 'ix_flagged_content_item_id_flagged_by', ['item_id', 'flagged_by']),
+    ('donor_partners', 'ix_donor_partners_created_at', ['created_at']),
+]
+
+# Each duplicates its table's primary key index
+REDUNDANT_ID_INDEXES = [
+    'users', 'meal_requests', 'meal_offers', 'chat_threads', 'messages',
+    'ratings', 'flagged_content', 'donor_partners',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table_name, index_name, columns in INDEXES:
+        op.create_index(index_name, table_name, columns, unique=False)
+    for table_name in REDUNDANT_ID_INDEXES:
+        op.drop_index(op.f(f'ix_{table_name}_id'), table_name=table_name)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name in REDUNDANT_ID_INDEXES:
+        op.create_index(op.f(f'ix_{table_name}_id'), table_name, ['id'], unique=False)
+    for table_name, index_name, columns in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table_name)
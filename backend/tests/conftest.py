@@ -3,13 +3,19 @@ Pytest configuration and fixtures for API tests
 """
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 import os
 
 from app.database import Base, get_db
 from app.main import app
+from app.auth import principal_cache, token_cache
+from app.locations import location_index
+from app.httpcache import response_cache
+from app.marketplace import clear_all as clear_marketplace
+from app.pagination import count_cache
+from app.snapshots import snapshots
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -44,11 +50,33 @@ def client(db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    count_cache.clear()
+    location_index.clear()
+    principal_cache.clear()
+    token_cache.clear()
+    snapshots.clear()
+    response_cache.clear()
+    clear_marketplace()
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def query_log():
+    """Record every SQL statement executed against the test engine"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def test_student_user(client, db):
     """Create a test student user and return auth token"""
@@ -0,0 +1,97 @@
+"""
+Row factories shared by tests that need many users, requests or offers
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.models import (
+    User, UserRole, MealRequest, MealOffer, Rating, FlaggedContent,
+    RequestStatus, OfferStatus, Frequency
+)
+
+
+def make_user(db, role=UserRole.SEEKER):
+    user = User(
+        id=str(uuid.uuid4()),
+        email=f"{uuid.uuid4().hex}@example.org",
+        password_hash="x",
+        role=role,
+        display_name="Someone",
+        city="San Jose",
+        state="CA",
+        zip="95112",
+        languages=["English"],
+    )
+    db.add(user)
+    return user
+
+
+def add_requests(db, count):
+    for _ in range(count):
+        seeker = make_user(db)
+        db.add(MealRequest(
+            id=str(uuid.uuid4()),
+            seeker_id=seeker.id,
+            city="San Jose",
+            state="CA",
+            zip="95112",
+            dietary_needs=["Vegan"],
+            medical_needs=["None"],
+            logistics=["Pickup (Student travels)"],
+            description="Need dinner",
+            availability="Evenings",
+            frequency=Frequency.ONCE,
+            status=RequestStatus.OPEN,
+        ))
+    db.commit()
+
+
+def add_offers(db, count, donor=None):
+    for _ in range(count):
+        offer_donor = donor or make_user(db, UserRole.DONOR)
+        db.add(MealOffer(
+            id=str(uuid.uuid4()),
+            donor_id=offer_donor.id,
+            city="San Jose",
+            state="CA",
+            zip="95112",
+            description="Lasagna",
+            dietary_tags=["Vegetarian"],
+            medical_tags=["None"],
+            available_until=datetime.now(timezone.utc) + timedelta(days=1),
+            logistics=["Pickup (Student travels)"],
+            availability="Tonight",
+            frequency=Frequency.ONCE,
+            status=OfferStatus.AVAILABLE,
+        ))
+    db.commit()
+
+
+def add_ratings(db, count):
+    for _ in range(count):
+        reviewer = make_user(db)
+        recipient = make_user(db, UserRole.DONOR)
+        db.add(Rating(
+            id=str(uuid.uuid4()),
+            from_user_id=reviewer.id,
+            to_user_id=recipient.id,
+            transaction_id=str(uuid.uuid4()),
+            stars=5,
+            comment="Great",
+            is_public=True,
+        ))
+    db.commit()
+
+
+def add_flags(db, count):
+    for _ in range(count):
+        reporter = make_user(db)
+        db.add(FlaggedContent(
+            id=str(uuid.uuid4()),
+            item_id=str(uuid.uuid4()),
+            item_type="REQUEST",
+            reason="Spam",
+            flagged_by=reporter.id,
+            dismissed=False,
+        ))
+    db.commit()
@@ -0,0 +1,150 @@
+"""
+Tests for the async database path (``ASYNC_DB_ROUTERS``)
+"""
+import inspect
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import marketplace
+from app.asyncdb import async_database_url, async_twin, get_async_db
+from app.auth import principal_cache, token_cache
+from app.database import Base, get_db
+from app.main import app
+from app.replicas import get_read_db
+from app.snapshots import snapshots
+from tests.test_chats import auth, open_thread, send
+from tests.test_geo import post_request, SAN_JOSE
+
+
+def async_app() -> FastAPI:
+    """The app with every sync database handler replaced by its async twin"""
+    twin = FastAPI()
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        endpoint = route.endpoint
+        if not inspect.iscoroutinefunction(endpoint) and "db" in inspect.signature(endpoint).parameters:
+            endpoint = async_twin(endpoint)
+        twin.add_api_route(
+            route.path, endpoint, methods=list(route.methods),
+            response_model=route.response_model, status_code=route.status_code,
+        )
+    return twin
+
+
+@pytest.fixture
+def async_client(tmp_path):
+    """Client for ``async_app`` over a file database shared by both engines"""
+    path = tmp_path / "async.db"
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=sync_engine)
+    SyncSession = sessionmaker(bind=sync_engine, autoflush=False)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False)
+
+    def override_get_db():
+        with SyncSession() as db:
+            yield db
+
+    async def override_get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    twin = async_app()
+    twin.dependency_overrides[get_db] = override_get_db
+    twin.dependency_overrides[get_async_db] = override_get_async_db
+    principal_cache.clear()
+    token_cache.clear()
+    snapshots.clear()
+    with TestClient(twin) as client:
+        yield client
+    sync_engine.dispose()
+
+
+def register(client, email, role):
+    response = client.post("/auth/register", json={
+        "email": email,
+        "password": "securepass123",
+        "role": role,
+        "display_name": email.split("@")[0],
+        "city": "San Jose",
+        "state": "CA",
+        "zip": "95112",
+        "country": "United States",
+        "weekly_meal_limit": 3,
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    return {"token": response.json()["access_token"]}
+
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///./studentsupport.db") == "sqlite+aiosqlite:///./studentsupport.db"
+    assert async_database_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+
+
+def test_twins_keep_the_handler_signature():
+    """FastAPI sees the same parameters, with the session from get_async_db"""
+    from app.routers.requests import browse_requests
+
+    twin = async_twin(browse_requests)
+    assert inspect.iscoroutinefunction(twin)
+    parameters = inspect.signature(twin).parameters
+    assert list(parameters) == list(inspect.signature(browse_requests).parameters)
+    assert parameters["db"].default.dependency is get_async_db
+    # The primary session next to the replica one doesn't stay sync either
+    assert parameters["primary"].default.dependency is get_async_db
+
+
+def test_twin_with_a_primary_session_never_opens_a_sync_one(async_client, monkeypatch):
+    """Marketplace browses, which take a primary session too, run on the one AsyncSession"""
+    client = async_client
+    monkeypatch.setattr(marketplace, "MARKETPLACE_VIEW", True)
+    marketplace.clear_all()
+
+    def no_sync_session():
+        raise AssertionError("a twin opened a sync session")
+        yield
+
+    student = register(client, "student@university.edu", "SEEKER")
+    request_id = post_request(client, student["token"], "Rice please", SAN_JOSE)
+    client.app.dependency_overrides[get_db] = no_sync_session
+    client.app.dependency_overrides[get_read_db] = no_sync_session
+    assert [item["id"] for item in client.get("/requests", params={"status": "OPEN"}).json()] == [request_id]
+    page = client.get("/offers", params={"status": "AVAILABLE", "limit": 5}).json()
+    assert page["items"] == []
+    marketplace.clear_all()
+
+
+def test_async_routes_end_to_end(async_client):
+    """Browse, post, chat and complete a match with every router on the async path"""
+    client = async_client
+    student = register(client, "student@university.edu", "SEEKER")
+    donor = register(client, "donor@example.org", "DONOR")
+
+    request_id = post_request(client, student["token"], "Rice and dal for the week")
+    page = client.get("/requests", params={"limit": 10, "q": "rice", "sort": "recent"}).json()
+    assert [item["id"] for item in page["items"]] == [request_id]
+    assert client.get("/locations/autocomplete", params={"q": "bay"}).json()[0]["city"] == "Bay Area"
+
+    thread_id = open_thread(client, student, donor)
+    send(client, student, thread_id, "Hello")
+    thread = client.get(f"/chats/{thread_id}", headers=auth(donor)).json()
+    assert [message["text"] for message in thread["messages"]] == ["Hello"]
+    assert client.get("/chats/inbox", headers=auth(donor)).json()[0]["unread_count"] == 1
+
+    offer_id = thread["item_id"]
+    pin = client.get(f"/offers/{offer_id}", headers=auth(donor)).json()["completion_pin"]
+    response = client.post(f"/chats/matches/{offer_id}/verify-pin", json={"pin": pin}, headers=auth(donor))
+    assert response.json()["status"] == "CLAIMED"
+
+    response = client.patch("/students/me", json={"display_name": "Renamed"}, headers=auth(student))
+    assert response.json()["display_name"] == "Renamed"
+    response = client.delete(f"/requests/{request_id}", headers=auth(student))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
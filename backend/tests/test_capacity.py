@@ -0,0 +1,110 @@
+"""
+Tests for the rolling weekly offer limit
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.capacity import reserve_offer_slot
+from app.database import Base
+from app.models import DonorDailyOffers, MealOffer, OfferStatus, User
+from tests.test_chats import auth
+
+
+def post_offer(client, donor):
+    available_until = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    return client.post("/offers", json={
+        "city": "San Jose",
+        "state": "CA",
+        "zip": "95112",
+        "country": "United States",
+        "description": "Dal and rice",
+        "dietary_tags": ["Vegetarian"],
+        "medical_tags": ["None"],
+        "available_until": available_until,
+        "logistics": ["Pickup (Student travels)"],
+        "availability": "Evenings",
+        "frequency": "One-time",
+        "is_anonymous": False
+    }, headers=auth(donor))
+
+
+def weekly_meals(db, user_id):
+    db.expire_all()
+    return db.get(User, user_id).current_weekly_meals
+
+
+def test_limit_and_release(client, db, test_donor_user):
+    """Posts stop at the limit; deleting an offer frees its slot, a claimed one doesn't"""
+    donor = test_donor_user
+    offer_ids = [post_offer(client, donor).json()["id"] for _ in range(5)]
+    assert weekly_meals(db, donor["user"].id) == 5
+
+    response = post_offer(client, donor)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Weekly limit reached"
+    assert db.query(MealOffer).count() == 5
+
+    assert client.delete(f"/offers/{offer_ids[0]}", headers=auth(donor)).status_code == status.HTTP_204_NO_CONTENT
+    assert weekly_meals(db, donor["user"].id) == 4
+    assert post_offer(client, donor).status_code == status.HTTP_201_CREATED
+
+    db.query(MealOffer).filter(MealOffer.id == offer_ids[1]).update({"status": OfferStatus.CLAIMED})
+    db.commit()
+    assert client.delete(f"/offers/{offer_ids[1]}", headers=auth(donor)).status_code == status.HTTP_204_NO_CONTENT
+    assert weekly_meals(db, donor["user"].id) == 5
+    assert post_offer(client, donor).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_old_days_expire(db, test_donor_user):
+    """Buckets leaving the 7-day window are subtracted without touching offers"""
+    donor_id = test_donor_user["user"].id
+    now = datetime.now(timezone.utc)
+    for days_ago in (8, 8, 7, 2, 2):
+        assert reserve_offer_slot(db, donor_id, now - timedelta(days=days_ago))
+    db.commit()
+    assert not reserve_offer_slot(db, donor_id, now - timedelta(days=2))
+
+    # Days -8 and -7 have left the window by now
+    assert reserve_offer_slot(db, donor_id, now)
+    db.commit()
+    assert weekly_meals(db, donor_id) == 3
+    assert db.query(DonorDailyOffers).filter(DonorDailyOffers.donor_id == donor_id).count() == 2
+
+
+def test_parallel_posts_cannot_pass_limit(tmp_path):
+    """Concurrent reservations for one donor stop exactly at the limit"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'capacity.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(User(
+            id="donor", email="d@example.org", password_hash="x", role="DONOR", display_name="D",
+            city="San Jose", state="CA", zip="95112", weekly_meal_limit=5, current_weekly_meals=0,
+        ))
+        session.commit()
+
+    results = []
+    barrier = threading.Barrier(12)
+
+    def post():
+        with Session() as session:
+            barrier.wait()
+            reserved = reserve_offer_slot(session, "donor")
+            session.commit()
+            results.append(reserved)
+
+    threads = [threading.Thread(target=post) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    with Session() as session:
+        assert session.get(User, "donor").current_weekly_meals == 5
+        assert session.query(DonorDailyOffers).one().offers == 5
+    engine.dispose()
@@ -0,0 +1,144 @@
+"""
+Tests for the chat inbox and message history
+"""
+from fastapi import status
+from datetime import datetime, timedelta, timezone
+
+
+def auth(user):
+    return {"Authorization": f"Bearer {user['token']}"}
+
+
+def open_thread(client, student, donor):
+    """Donor posts an offer, student accepts it; returns the thread id"""
+    available_until = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    offer = client.post(
+        "/offers",
+        json={
+            "city": "San Jose",
+            "state": "CA",
+            "zip": "95112",
+            "country": "United States",
+            "description": "Offer for chat",
+            "dietary_tags": ["Vegetarian"],
+            "medical_tags": ["None"],
+            "available_until": available_until,
+            "logistics": ["Pickup (Student travels)"],
+            "availability": "Available",
+            "frequency": "One-time",
+            "is_anonymous": False
+        },
+        headers=auth(donor)
+    ).json()
+    accept = client.post(f"/chats/matches/{offer['id']}/accept", headers=auth(student))
+    return accept.json()["thread_id"]
+
+
+def send(client, user, thread_id, text):
+    response = client.post(f"/chats/{thread_id}/messages", json={"text": text}, headers=auth(user))
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def test_inbox_summarizes_threads(client, test_student_user, test_donor_user):
+    """The inbox shows last message, counts and the other participant"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    send(client, test_student_user, thread_id, "Hi!")
+    send(client, test_student_user, thread_id, "Is 6pm ok?")
+    send(client, test_donor_user, thread_id, "Sure")
+
+    response = client.get("/chats/inbox", headers=auth(test_student_user))
+    assert response.status_code == status.HTTP_200_OK
+    entries = response.json()
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["id"] == thread_id
+    assert entry["message_count"] == 3
+    assert entry["unread_count"] == 1
+    assert entry["last_message"]["text"] == "Sure"
+    assert entry["other_participant"]["display_name"] == "Test Donor"
+
+    donor_entry = client.get("/chats/inbox", headers=auth(test_donor_user)).json()[0]
+    assert donor_entry["unread_count"] == 2
+    assert donor_entry["other_participant"]["display_name"] == "Test Student"
+
+
+def test_mark_thread_read(client, test_student_user, test_donor_user):
+    """Marking a thread read resets only the caller's unread count"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    send(client, test_student_user, thread_id, "Hello")
+
+    response = client.post(f"/chats/{thread_id}/read", headers=auth(test_donor_user))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    donor_entry = client.get("/chats/inbox", headers=auth(test_donor_user)).json()[0]
+    assert donor_entry["unread_count"] == 0
+
+
+def test_inbox_query_count_is_constant(client, test_student_user, test_donor_user, query_log):
+    """The inbox costs the same number of queries for one thread or many"""
+    first = open_thread(client, test_student_user, test_donor_user)
+    send(client, test_donor_user, first, "One")
+    query_log.clear()
+    client.get("/chats/inbox", headers=auth(test_student_user))
+    single_thread_queries = len(query_log)
+
+    for _ in range(3):
+        thread_id = open_thread(client, test_student_user, test_donor_user)
+        send(client, test_donor_user, thread_id, "More")
+    query_log.clear()
+    entries = client.get("/chats/inbox", headers=auth(test_student_user)).json()
+
+    assert len(entries) == 4
+    assert len(query_log) == single_thread_queries
+
+
+def test_message_history_pages(client, test_student_user, test_donor_user):
+    """History can be read newest page first, then older pages via before="""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    for i in range(5):
+        send(client, test_student_user, thread_id, f"msg {i}")
+
+    newest = client.get(f"/chats/{thread_id}", params={"limit": 2}, headers=auth(test_donor_user)).json()
+    assert [m["text"] for m in newest["messages"]] == ["msg 3", "msg 4"]
+    assert newest["has_more"] is True
+
+    older = client.get(
+        f"/chats/{thread_id}",
+        params={"limit": 2, "before": newest["before_cursor"]},
+        headers=auth(test_donor_user)
+    ).json()
+    assert [m["text"] for m in older["messages"]] == ["msg 1", "msg 2"]
+
+    oldest = client.get(
+        f"/chats/{thread_id}",
+        params={"limit": 2, "before": older["before_cursor"]},
+        headers=auth(test_donor_user)
+    ).json()
+    assert [m["text"] for m in oldest["messages"]] == ["msg 0"]
+    assert oldest["has_more"] is False
+
+
+def test_message_polling_with_after(client, test_student_user, test_donor_user):
+    """Polling with after= only returns messages sent since the cursor"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    send(client, test_student_user, thread_id, "first")
+    page = client.get(f"/chats/{thread_id}", params={"limit": 10}, headers=auth(test_donor_user)).json()
+
+    idle = client.get(f"/chats/{thread_id}", params={"after": page["after_cursor"]}, headers=auth(test_donor_user)).json()
+    assert idle["messages"] == []
+    assert idle["after_cursor"] == page["after_cursor"]
+
+    send(client, test_student_user, thread_id, "second")
+    fresh = client.get(f"/chats/{thread_id}", params={"after": idle["after_cursor"]}, headers=auth(test_donor_user)).json()
+    assert [m["text"] for m in fresh["messages"]] == ["second"]
+
+
+def test_full_history_without_paging(client, test_student_user, test_donor_user):
+    """Clients that don't page still receive the full history"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    for i in range(3):
+        send(client, test_donor_user, thread_id, f"m{i}")
+    data = client.get(f"/chats/{thread_id}", headers=auth(test_student_user)).json()
+    assert [m["text"] for m in data["messages"]] == ["m0", "m1", "m2"]
+    assert data["has_more"] is False
@@ -0,0 +1,143 @@
+"""
+Tests for compiled dietary/medical/logistics compatibility masks
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import status
+
+from app.compatibility import (
+    DIETARY_BITS, dietary_mask, provided_masks, offer_satisfies
+)
+from app.models import (
+    DietaryPreference, MealRequest, MealOffer, UserRole, Frequency, RequestStatus, OfferStatus
+)
+from tests.factories import make_user
+
+PICKUP = "Pickup (Student travels)"
+DELIVERY = "Delivery (Donor drops off)"
+
+
+def add_request(db, dietary, medical=("None",), logistics=(PICKUP,)):
+    seeker = make_user(db)
+    request = MealRequest(
+        id=str(uuid.uuid4()),
+        seeker_id=seeker.id,
+        city="San Jose",
+        state="CA",
+        zip="95112",
+        dietary_needs=list(dietary),
+        medical_needs=list(medical),
+        logistics=list(logistics),
+        description="Need dinner",
+        availability="Evenings",
+        frequency=Frequency.ONCE,
+        status=RequestStatus.OPEN,
+    )
+    db.add(request)
+    db.commit()
+    return request
+
+
+def add_offer(db, dietary, medical=("None",), logistics=(PICKUP,)):
+    donor = make_user(db, UserRole.DONOR)
+    offer = MealOffer(
+        id=str(uuid.uuid4()),
+        donor_id=donor.id,
+        city="San Jose",
+        state="CA",
+        zip="95112",
+        description="Dinner",
+        dietary_tags=list(dietary),
+        medical_tags=list(medical),
+        available_until=datetime.now(timezone.utc) + timedelta(days=1),
+        logistics=list(logistics),
+        availability="Tonight",
+        frequency=Frequency.ONCE,
+        status=OfferStatus.AVAILABLE,
+    )
+    db.add(offer)
+    db.commit()
+    return offer
+
+
+def test_lattice_closure():
+    """Vegan and Jain imply Vegetarian; Kosher does not imply Halal"""
+    vegetarian = DIETARY_BITS[DietaryPreference.VEGETARIAN]
+    assert provided_masks(["Vegan"], [])[0] & vegetarian
+    assert provided_masks(["Jain Veg (No Root Veg)"], [])[0] & vegetarian
+    assert not provided_masks(["Kosher"], [])[0] & DIETARY_BITS[DietaryPreference.HALAL]
+    # Vegan food is dairy free; the shared "No Oil" value maps across both enums
+    assert provided_masks(["Vegan"], [])[1] != 0
+    assert provided_masks(["No Oil"], None)[1] != 0
+    assert dietary_mask(["No Restrictions", "not a tag"]) == 0
+
+
+def test_masks_written_on_insert_and_update(db):
+    """Mapper events keep the masks in step with the tag arrays"""
+    request = add_request(db, ["Vegetarian"], logistics=[PICKUP, DELIVERY])
+    assert request.dietary_mask == DIETARY_BITS[DietaryPreference.VEGETARIAN]
+    assert request.logistics_mask == 0b11
+
+    request.dietary_needs = ["Halal"]
+    db.commit()
+    assert request.dietary_mask == DIETARY_BITS[DietaryPreference.HALAL]
+
+
+def test_offer_satisfies_in_memory(db):
+    """Python matching agrees with the lattice"""
+    vegetarian_request = add_request(db, ["Vegetarian"])
+    halal_request = add_request(db, ["Halal"])
+    dairy_free_request = add_request(db, ["No Restrictions"], medical=["Dairy Free"], logistics=[DELIVERY])
+
+    vegan_offer = add_offer(db, ["Vegan"], logistics=[PICKUP, DELIVERY])
+    kosher_offer = add_offer(db, ["Kosher"])
+
+    assert offer_satisfies(vegan_offer, vegetarian_request)
+    assert offer_satisfies(vegan_offer, dairy_free_request)
+    assert not offer_satisfies(vegan_offer, halal_request)
+    assert not offer_satisfies(kosher_offer, halal_request)
+    assert not offer_satisfies(kosher_offer, dairy_free_request)
+
+
+def test_diet_filter_uses_compatibility(client, db):
+    """Browsing offers by Vegetarian also lists Vegan and Jain offers"""
+    vegan = add_offer(db, ["Vegan"])
+    jain = add_offer(db, ["Jain Veg (No Root Veg)"])
+    add_offer(db, ["Kosher"])
+    plain = add_offer(db, ["No Restrictions"])
+
+    response = client.get("/offers", params={"diet": "Vegetarian"})
+    assert response.status_code == status.HTTP_200_OK
+    assert {item["id"] for item in response.json()} == {vegan.id, jain.id}
+
+    response = client.get("/offers", params={"diet": "Halal"})
+    assert response.json() == []
+
+    response = client.get("/offers", params={"diet": "No Restrictions"})
+    assert [item["id"] for item in response.json()] == [plain.id]
+
+    response = client.get("/offers", params={"diet": "Carnivore"})
+    assert response.json() == []
+
+
+def test_match_params(client, db):
+    """for_request and for_offer match in SQL using the same lattice"""
+    vegetarian_request = add_request(db, ["Vegetarian"])
+    add_request(db, ["Halal"])
+    delivery_request = add_request(db, ["Vegetarian"], logistics=[DELIVERY])
+
+    vegan_offer = add_offer(db, ["Vegan"])
+    add_offer(db, ["Kosher"])
+
+    response = client.get("/offers", params={"for_request": vegetarian_request.id})
+    assert [item["id"] for item in response.json()] == [vegan_offer.id]
+
+    response = client.get("/offers", params={"for_request": delivery_request.id})
+    assert response.json() == []
+
+    response = client.get("/requests", params={"for_offer": vegan_offer.id})
+    assert [item["id"] for item in response.json()] == [vegetarian_request.id]
+
+    response = client.get("/requests", params={"for_offer": "missing"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
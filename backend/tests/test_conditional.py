@@ -0,0 +1,82 @@
+"""
+Tests for ETags on item detail and If-Match on updates
+"""
+from fastapi import status
+
+from app.models import MealOffer
+from tests.factories import add_offers
+from tests.test_chats import auth, open_thread, send
+from tests.test_geo import post_request
+
+
+def test_request_detail_not_modified(client, query_log, test_student_user):
+    """An unchanged request gets a 304 from one query; edits change the ETag"""
+    student = test_student_user
+    request_id = post_request(client, student["token"], "Rice please")
+    first = client.get(f"/requests/{request_id}")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    query_log.clear()
+    cached = client.get(f"/requests/{request_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.headers["etag"] == etag and len(query_log) == 1
+
+    client.patch(f"/requests/{request_id}", json={"description": "Soup"}, headers=auth(student))
+    edited = client.get(f"/requests/{request_id}", headers={"If-None-Match": etag})
+    assert edited.status_code == status.HTTP_200_OK and edited.json()["description"] == "Soup"
+
+    client.patch("/students/me", json={"display_name": "Renamed"}, headers=auth(student))
+    renamed = client.get(f"/requests/{request_id}", headers={"If-None-Match": edited.headers["etag"]})
+    assert renamed.status_code == status.HTTP_200_OK and renamed.json()["seeker_name"] == "Renamed"
+
+
+def test_update_request_if_match(client, test_student_user):
+    """A PATCH carrying a stale ETag fails with 412 and changes nothing"""
+    student = test_student_user
+    request_id = post_request(client, student["token"], "Rice please")
+    etag = client.get(f"/requests/{request_id}").headers["etag"]
+
+    first = client.patch(f"/requests/{request_id}", json={"description": "Soup"},
+                         headers={**auth(student), "If-Match": etag})
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["etag"] == client.get(f"/requests/{request_id}").headers["etag"] != etag
+
+    stale = client.patch(f"/requests/{request_id}", json={"description": "Bread"},
+                         headers={**auth(student), "If-Match": etag})
+    assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert client.get(f"/requests/{request_id}").json()["description"] == "Soup"
+
+    unconditional = client.patch(f"/requests/{request_id}", json={"description": "Bread"}, headers=auth(student))
+    assert unconditional.status_code == status.HTTP_200_OK
+
+
+def test_offer_etags(client, db, test_donor_user):
+    """Offers get the same conditional GET and If-Match handling"""
+    donor = test_donor_user
+    add_offers(db, 1, donor=donor["user"])
+    offer_id = db.query(MealOffer.id).scalar()
+    etag = client.get(f"/offers/{offer_id}").headers["etag"]
+    assert client.get(f"/offers/{offer_id}", headers={"If-None-Match": etag}).status_code == \
+        status.HTTP_304_NOT_MODIFIED
+
+    updated = client.patch(f"/offers/{offer_id}", json={"description": "Curry"},
+                           headers={**auth(donor), "If-Match": etag})
+    assert updated.status_code == status.HTTP_200_OK
+    stale = client.patch(f"/offers/{offer_id}", json={"description": "Pasta"},
+                         headers={**auth(donor), "If-Match": etag})
+    assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+def test_thread_not_modified(client, test_student_user, test_donor_user):
+    """A thread is a 304 until someone sends a message"""
+    student, donor = test_student_user, test_donor_user
+    thread_id = open_thread(client, student, donor)
+    etag = client.get(f"/chats/{thread_id}", headers=auth(student)).headers["etag"]
+    conditional = {**auth(student), "If-None-Match": etag}
+    assert client.get(f"/chats/{thread_id}", headers=conditional).status_code == status.HTTP_304_NOT_MODIFIED
+
+    send(client, donor, thread_id, "Hello")
+    response = client.get(f"/chats/{thread_id}", headers=conditional)
+    assert response.status_code == status.HTTP_200_OK
+    assert [message["text"] for message in response.json()["messages"]][-1] == "Hello"
@@ -0,0 +1,111 @@
+"""
+Tests for the marketplace SSE feed
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import status
+
+from app.feed import FEED_BUFFER_SIZE, feed, FeedFilter
+
+REQUEST_BODY = {
+    "city": "San Jose",
+    "state": "CA",
+    "zip": "95112",
+    "country": "United States",
+    "dietary_needs": ["Vegan"],
+    "medical_needs": ["None"],
+    "logistics": ["Pickup (Student travels)"],
+    "description": "Feed test",
+    "availability": "Evenings",
+    "frequency": "One-time",
+    "urgency": "NORMAL"
+}
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+async def read_frames(last_event_id, count, feed_filter=None):
+    stream = feed.stream(DisconnectedRequest(), feed_filter or FeedFilter(), last_event_id)
+    frames = [await stream.__anext__() for _ in range(count)]
+    await stream.aclose()
+    return frames
+
+
+def create_request(client, user):
+    response = client.post("/requests", json=REQUEST_BODY, headers={"Authorization": f"Bearer {user['token']}"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["id"]
+
+
+def test_request_changes_are_published(client, test_student_user):
+    """Create, update and delete each publish a compact event"""
+    headers = {"Authorization": f"Bearer {test_student_user['token']}"}
+    request_id = create_request(client, test_student_user)
+    baseline = feed.latest_id()
+
+    client.patch(f"/requests/{request_id}", json={"status": "PAUSED"}, headers=headers)
+    client.delete(f"/requests/{request_id}", headers=headers)
+
+    events = feed.events_since(baseline)
+    assert [(e["action"], e["kind"], e["item_id"]) for e in events] == [
+        ("updated", "request", request_id),
+        ("deleted", "request", request_id),
+    ]
+    assert events[0]["status"] == "PAUSED"
+    assert events[0]["diet"] == ["Vegan"]
+
+
+async def test_resume_replays_missed_events(client, test_student_user):
+    """Resuming from Last-Event-ID replays only later events"""
+    create_request(client, test_student_user)
+    baseline = feed.latest_id()
+    second = create_request(client, test_student_user)
+
+    frames = await read_frames(baseline, count=1)
+    assert f'"item_id":"{second}"' in frames[0]
+    assert frames[0].startswith(f"id: {feed.latest_id()}\nevent: request\n")
+
+
+async def test_expired_resume_sends_reset(client):
+    """A Last-Event-ID older than the log triggers a reset event"""
+    frames = await read_frames(1, count=1)
+    assert frames[0].startswith("event: reset")
+
+
+async def test_falling_behind_sends_reset(client):
+    """A live subscriber that misses more events than the log holds gets a reset, then new events"""
+    stream = feed.stream(DisconnectedRequest(), FeedFilter(), feed.latest_id())
+    feed.publish("created", "request", "first")
+    assert '"item_id":"first"' in await stream.__anext__()
+
+    for n in range(FEED_BUFFER_SIZE + 1):
+        feed.publish("created", "request", str(n))
+    assert (await stream.__anext__()).startswith("event: reset")
+    feed.publish("created", "request", "after")
+    assert '"item_id":"after"' in await stream.__anext__()
+    await stream.aclose()
+
+
+def test_feed_filter():
+    """Filters match on city substring, status and diet; updates and deletes always pass"""
+    event = {"action": "created", "kind": "request", "item_id": "x",
+             "status": "OPEN", "city": "San Jose", "diet": ["Vegan"]}
+    assert FeedFilter(city="san jose", status="OPEN", diet="Vegan").matches(event)
+    assert not FeedFilter(city="Oakland").matches(event)
+    assert not FeedFilter(status="PAUSED").matches(event)
+    assert not FeedFilter(diet="Halal").matches(event)
+    assert FeedFilter(city="Oakland").matches({"action": "deleted", "kind": "request", "item_id": "x"})
+    # A request leaving OPEN still reaches status=OPEN subscribers, who drop it
+    assert FeedFilter(status="OPEN").matches({**event, "action": "updated", "status": "MATCHED"})
+
+
+def test_concurrent_publishes_arrive_in_id_order(client):
+    """Events published from many threads are logged in strictly increasing id order"""
+    baseline = feed.latest_id()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda n: feed.publish("created", "request", str(n)), range(400)))
+    ids = [event["id"] for event in feed.events_since(baseline)]
+    assert len(ids) == 400 and ids == sorted(ids) and feed.latest_id() == ids[-1]
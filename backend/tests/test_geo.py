@@ -0,0 +1,107 @@
+"""
+Tests for geohash radius search on requests and offers
+"""
+from fastapi import status
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from app import geo
+from app.models import MealOffer, MealRequest
+from app.geo import encode_geohash, covering_cells, haversine_km
+
+SAN_JOSE = (37.3382, -121.8863)
+SANTA_CLARA = (37.3541, -121.9552)
+SAN_FRANCISCO = (37.7749, -122.4194)
+
+
+def post_request(client, token, description, coords=None, zip="95112"):
+    body = {
+        "city": "Bay Area",
+        "state": "CA",
+        "zip": zip,
+        "country": "United States",
+        "dietary_needs": ["Vegan"],
+        "medical_needs": ["None"],
+        "logistics": ["Pickup (Student travels)"],
+        "description": description,
+        "availability": "Evenings",
+        "frequency": "One-time",
+        "urgency": "NORMAL"
+    }
+    if coords:
+        body["latitude"], body["longitude"] = coords
+    response = client.post("/requests", json=body, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["id"]
+
+
+def test_encode_geohash():
+    """Encoding matches the reference geohash for a known point"""
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_geohash_columns_use_code_point_collation():
+    """Prefix range scans need "C" ordering on Postgres; SQLite already compares bytes"""
+    for model in (MealRequest, MealOffer):
+        table = model.__table__
+        assert 'geohash VARCHAR COLLATE "C"' in str(CreateTable(table).compile(dialect=postgresql.dialect()))
+        assert "COLLATE" not in str(CreateTable(table).compile(dialect=sqlite.dialect()))
+
+
+def test_covering_cells_contain_points_within_radius():
+    """Every point inside the radius falls in one of the covering cells"""
+    cells = covering_cells(*SAN_JOSE, radius_km=10)
+    for point in (SAN_JOSE, SANTA_CLARA):
+        assert haversine_km(*SAN_JOSE, *point) <= 10
+        assert any(encode_geohash(*point).startswith(cell) for cell in cells)
+
+
+def test_browse_near_filters_by_radius(client, test_student_user):
+    """near= returns only requests inside the radius, with distances"""
+    token = test_student_user["token"]
+    post_request(client, token, "downtown", SAN_JOSE)
+    post_request(client, token, "santa clara", SANTA_CLARA)
+    post_request(client, token, "the city", SAN_FRANCISCO)
+    # A ZIP code the geocoder doesn't know, so it stays unplaced
+    post_request(client, token, "no coordinates", zip="00000")
+
+    response = client.get("/requests", params={"near": "37.3382,-121.8863", "radius_km": 10})
+    assert response.status_code == status.HTTP_200_OK
+    assert {item["description"] for item in response.json()} == {"downtown", "santa clara"}
+
+    response = client.get("/requests", params={
+        "near": "37.3382,-121.8863", "radius_km": 100, "sort": "distance", "limit": 2
+    })
+    page = response.json()
+    assert [item["description"] for item in page["items"]] == ["downtown", "santa clara"]
+    assert page["items"][0]["distance_km"] == 0
+    assert page["next_cursor"] is None
+
+
+def test_browse_near_fetches_candidates_in_batches(client, test_student_user, query_log, monkeypatch):
+    """Pages come from small keyset batches, fetched only until the page is full"""
+    monkeypatch.setattr(geo, "NEARBY_BATCH_SIZE", 2)
+    token = test_student_user["token"]
+    nearby = {post_request(client, token, f"near {i}", SAN_JOSE) for i in range(4)}
+    post_request(client, token, "the city", SAN_FRANCISCO)
+
+    query_log.clear()
+    params = {"near": "37.3382,-121.8863", "radius_km": 10, "limit": 1}
+    page = client.get("/requests", params=params).json()
+    # The first batch already holds the row past the page; the other two are never fetched
+    assert sum("FROM meal_requests" in statement for statement in query_log) == 1
+
+    seen = [item["id"] for item in page["items"]]
+    while page["next_cursor"]:
+        page = client.get("/requests", params={**params, "cursor": page["next_cursor"]}).json()
+        seen += [item["id"] for item in page["items"]]
+    assert sorted(seen) == sorted(nearby)
+
+    nearest = client.get("/requests", params={**params, "sort": "distance", "limit": 3}).json()
+    assert len(nearest["items"]) == 3 and nearest["next_cursor"] is None
+
+
+def test_browse_near_rejects_bad_origin(client):
+    """A malformed near parameter is a client error"""
+    response = client.get("/offers", params={"near": "somewhere"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,83 @@
+"""
+Tests for the offline postal-code geocoder
+"""
+import numpy as np
+from fastapi import status
+
+from app.geo import geohash_or_none
+from app.geocoder import (
+    DATA_DIR, SEED_CSV, TABLES, Geocoder, backfill, compile_centroids, geocoder, read_centroids, read_gazetteer
+)
+from app.models import MealRequest, User
+from tests.conftest import engine
+from tests.factories import add_requests
+from tests.test_geo import post_request
+
+SAN_JOSE_95112 = (37.3443, -121.8833)
+
+
+def test_locate_by_zip_then_city():
+    """ZIP+4 codes use the ZIP centroid, unknown ZIPs the city's; other countries aren't placed"""
+    assert geocoder.locate("95112-1234", "Anywhere", "CA") == SAN_JOSE_95112
+    san_jose = geocoder.locate("00000", " san  JOSE,", "ca", "USA")
+    assert san_jose is not None and abs(san_jose[0] - 37.34) < 0.05
+    assert geocoder.locate("95112", "San Jose", "CA", "Canada") is None
+    assert geocoder.locate("00000", "Nowhere", "CA") is None
+    assert all(isinstance(keys, np.memmap) for keys, _ in geocoder._open().values())
+
+
+def test_compile_gazetteer(tmp_path):
+    """A Census gazetteer file compiles into a table of ZIP centroids"""
+    source = tmp_path / "gazetteer.txt"
+    source.write_text(
+        "GEOID\tALAND\tAWATER\tALAND_SQMI\tAWATER_SQMI\tINTPTLAT\tINTPTLONG                                 \n"
+        "02138\t1\t0\t0\t0\t42.377000\t-71.116700\n"
+        "95112\t1\t0\t0\t0\t37.344300\t-121.883300\n"
+    )
+    assert compile_centroids(read_gazetteer(source), tmp_path / "table") == (2, 0)
+    compiled = Geocoder(tmp_path / "table")
+    assert compiled.locate("02138", "", "") == (42.377, -71.1167)
+    assert compiled.locate("10027", "New York", "NY") is None
+
+
+def test_bundled_tables_match_csv(tmp_path):
+    """The committed arrays are compiled from the current CSV"""
+    compile_centroids(read_centroids(SEED_CSV), tmp_path)
+    for table in TABLES:
+        for part in ("keys", "points"):
+            name = f"{table}_{part}.npy"
+            assert np.array_equal(np.load(tmp_path / name), np.load(DATA_DIR / name)), f"rebuild {name}"
+
+
+def test_missing_tables_leave_rows_unplaced(tmp_path):
+    """Without compiled tables lookups find nothing, and nothing is written"""
+    missing = Geocoder(tmp_path / "none")
+    assert missing.locate("95112", "San Jose", "CA") is None
+    assert not (tmp_path / "none").exists()
+
+
+def test_writes_fill_coordinates(client, db, test_student_user):
+    """Requests and registrations without coordinates get their ZIP centroid"""
+    request_id = post_request(client, test_student_user["token"], "Rice please")
+    request = db.get(MealRequest, request_id)
+    assert (request.latitude, request.longitude) == SAN_JOSE_95112
+    assert request.geohash == geohash_or_none(*SAN_JOSE_95112)
+
+    response = client.post("/auth/register", json={
+        "email": "placed@example.org", "password": "testpass123", "role": "SEEKER",
+        "display_name": "Placed", "city": "Stanford", "state": "CA", "zip": "94305"
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    user = db.query(User).filter(User.email == "placed@example.org").one()
+    assert (user.latitude, user.longitude) == (37.4241, -122.1661)
+
+
+def test_backfill(db):
+    """Existing rows are placed in batches, geohashes included"""
+    add_requests(db, 3)
+    assert backfill(engine, batch_size=2) == {"users": 3, "meal_requests": 3, "meal_offers": 0}
+    db.expire_all()
+    for request in db.query(MealRequest):
+        assert (request.latitude, request.longitude) == SAN_JOSE_95112
+        assert request.geohash == geohash_or_none(*SAN_JOSE_95112)
+    assert backfill(engine) == {"users": 0, "meal_requests": 0, "meal_offers": 0}
@@ -0,0 +1,78 @@
+"""
+Tests for the NumPy point index and the /nearby endpoints
+"""
+import random
+
+from fastapi import status
+
+from app.geo import haversine_km
+from app.geoindex import PointIndex
+from app.models import MealOffer
+from tests.test_capacity import post_offer
+from tests.test_chats import auth
+from tests.test_geo import post_request, SAN_JOSE, SANTA_CLARA, SAN_FRANCISCO
+
+
+def test_search_matches_brute_force():
+    """Radius and k-nearest results equal a row-by-row haversine scan, across poles and the antimeridian"""
+    rng = random.Random(7)
+    points = [(str(i), rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(6000)]
+    index = PointIndex()
+    index.load(points[:4000])
+    for point in points[4000:]:
+        index.upsert(*point)
+    for item_id, _, _ in points[:1500]:
+        index.remove(item_id)
+    live = points[1500:]
+    assert len(index) == len(live)
+
+    origins = [(89.9, 10.0), (-89.5, -170.0), (0.0, 179.9), (0.0, -179.9)]
+    origins += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(100)]
+    for latitude, longitude in origins:
+        radius = rng.choice([50, 500, 3000])
+        expected = sorted(
+            (distance, item_id) for item_id, distance in (
+                (item_id, haversine_km(latitude, longitude, lat, lng)) for item_id, lat, lng in live
+            ) if distance <= radius
+        )
+        found = index.search(latitude, longitude, radius)
+        assert sorted(item_id for item_id, _ in found) == sorted(item_id for _, item_id in expected)
+        nearest = index.search(latitude, longitude, radius, k=3)
+        assert [round(d, 6) for _, d in nearest] == [round(d, 6) for d, _ in expected[:3]]
+
+
+def test_nearby_requests(client, test_student_user):
+    """Open requests inside the radius come back nearest first; closed and deleted ones drop out"""
+    token = test_student_user["token"]
+    post_request(client, token, "santa clara", SANTA_CLARA)
+    downtown = post_request(client, token, "downtown", SAN_JOSE)
+    post_request(client, token, "the city", SAN_FRANCISCO)
+    post_request(client, token, "no coordinates", zip="00000")
+
+    response = client.get("/requests/nearby", params={"near": "37.3382,-121.8863", "radius_km": 20})
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()
+    assert [item["description"] for item in items] == ["downtown", "santa clara"]
+    assert items[0]["distance_km"] == 0 and 6 < items[1]["distance_km"] < 7
+
+    client.delete(f"/requests/{downtown}", headers=auth(test_student_user))
+    response = client.get("/requests/nearby", params={"near": "37.3382,-121.8863", "radius_km": 100, "limit": 1})
+    assert [item["description"] for item in response.json()] == ["santa clara"]
+
+
+def test_nearby_offers_use_saved_location(client, db, test_donor_user):
+    """Without near, the search uses the caller's coordinates and service radius"""
+    response = client.get("/offers/nearby", headers=auth(test_donor_user))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    offer = post_offer(client, test_donor_user).json()
+    row = db.get(MealOffer, offer["id"])
+    row.latitude, row.longitude = SAN_JOSE
+    donor = test_donor_user["user"]
+    donor.latitude, donor.longitude = SAN_FRANCISCO
+    donor.radius = 80
+    db.commit()
+    response = client.get("/offers/nearby", headers=auth(test_donor_user))
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.json()] == [offer["id"]]
+    assert client.get("/offers/nearby", params={"radius_km": 10}, headers=auth(test_donor_user)).json() == []
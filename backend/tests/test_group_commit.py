@@ -0,0 +1,143 @@
+"""
+Tests for the group-commit writer
+"""
+import threading
+
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from app import writer
+from app.database import make_engine
+from app.models import ChatThread, FlaggedContent, MealOffer, MealRequest, OfferStatus, RequestStatus, User
+from app.writer import GroupCommitWriter, stop_writers
+from tests.test_capacity import post_offer
+from tests.test_chats import auth, open_thread, send
+from tests.test_geo import post_request, SAN_JOSE
+
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    monkeypatch.setattr(writer, "GROUP_COMMIT", True)
+    yield
+    stop_writers()
+
+
+def test_batch_isolates_failures(tmp_path):
+    """One transaction per batch; a failing mutation only loses its own writes"""
+    engine = make_engine(f"sqlite:///{tmp_path / 'writer.db'}", "production")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE notes (body TEXT UNIQUE)")
+    group = GroupCommitWriter(engine)
+    # Hold the writer busy so the next four mutations queue up together
+    running, release = threading.Event(), threading.Event()
+    group.submit(lambda session: running.set() or release.wait())
+    running.wait()
+
+    def insert(body, fail=False):
+        def mutation(session):
+            session.execute(text("INSERT INTO notes VALUES (:body)"), {"body": body})
+            if fail:
+                raise ValueError(body)
+            return session.execute(text("SELECT count(*) FROM notes")).scalar()
+        return group.submit(mutation)
+
+    first, failing, duplicate, last = insert("a"), insert("b", fail=True), insert("a"), insert("c")
+    release.set()
+    assert first.result()[0] == 1
+    with pytest.raises(ValueError):
+        failing.result()
+    with pytest.raises(Exception, match="UNIQUE"):
+        duplicate.result()
+    assert last.result()[0] == 2
+    group.stop()
+
+    stats = group.stats()
+    assert stats["batches"] == 2 and stats["largest_batch"] == 4
+    assert stats["writes"] == 3 and stats["failed"] == 2
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT body FROM notes ORDER BY body").scalars().all() == ["a", "c"]
+    engine.dispose()
+
+
+def test_endpoints_write_through_the_writer(client, db, group_commit, test_student_user, test_donor_user,
+                                            test_admin_user):
+    """Requests, flags and messages commit through the writer with the same results"""
+    student, donor = test_student_user, test_donor_user
+    request_id = post_request(client, student["token"], "Rice please", SAN_JOSE)
+    response = client.post("/flags", json={"item_id": request_id, "item_type": "REQUEST", "reason": "Spam"},
+                           headers=auth(donor))
+    assert response.status_code == status.HTTP_201_CREATED
+    response = client.post("/flags", json={"item_id": request_id, "item_type": "REQUEST", "reason": "Spam"},
+                           headers=auth(donor))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    thread_id = open_thread(client, student, donor)
+    for body in ("Hello", "Still there?", "Thanks"):
+        assert send(client, student, thread_id, body)["text"] == body
+
+    db.expire_all()
+    assert db.get(MealRequest, request_id).status == RequestStatus.FLAGGED
+    assert db.query(FlaggedContent).count() == 1
+    thread = db.get(ChatThread, thread_id)
+    assert thread.message_count == 3 and thread.donor_unread_count == 3
+
+    metrics = client.get("/admin/metrics", headers=auth(test_admin_user)).json()["group_commit"]
+    assert metrics["enabled"] and metrics["writes"] >= 5
+
+
+def test_updates_and_matches_write_through_the_writer(client, db, group_commit, test_student_user,
+                                                      test_donor_user):
+    """Offers, accepted matches and conditional updates commit through the writer"""
+    student, donor = test_student_user, test_donor_user
+    thread_id = open_thread(client, student, donor)
+    offer_id = db.get(ChatThread, thread_id).offer_id
+    assert db.get(MealOffer, offer_id).status == OfferStatus.IN_PROGRESS
+
+    request_id = post_request(client, student["token"], "Rice please", SAN_JOSE)
+    etag = client.get(f"/requests/{request_id}").headers["etag"]
+    updated = client.patch(f"/requests/{request_id}", json={"description": "Soup"},
+                           headers={**auth(student), "If-Match": etag})
+    assert updated.status_code == status.HTTP_200_OK and updated.json()["description"] == "Soup"
+    stale = client.patch(f"/requests/{request_id}", json={"description": "Bread"},
+                         headers={**auth(student), "If-Match": etag})
+    assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = client.patch(f"/offers/{offer_id}", json={"description": "Curry"}, headers=auth(donor))
+    assert response.json()["description"] == "Curry"
+    assert writer.writer_stats()["writes"] >= 5
+
+
+def test_reads_pins_and_deletes_write_through_the_writer(client, db, group_commit, test_student_user,
+                                                         test_donor_user):
+    """Marking read, verifying a PIN and deleting commit through the writer"""
+    student, donor = test_student_user, test_donor_user
+    thread_id = open_thread(client, student, donor)
+    send(client, student, thread_id, "Hello")
+    response = client.post(f"/chats/{thread_id}/read", headers=auth(donor))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    inbox = client.get("/chats/inbox", headers=auth(donor)).json()
+    assert inbox[0]["unread_count"] == 0
+
+    offer_id = db.get(ChatThread, thread_id).offer_id
+    pin = client.get(f"/offers/{offer_id}", headers=auth(donor)).json()["completion_pin"]
+    wrong = client.post(f"/chats/matches/{offer_id}/verify-pin", json={"pin": "0000" if pin != "0000" else "1111"},
+                        headers=auth(donor))
+    assert wrong.json()["success"] is False
+    verified = client.post(f"/chats/matches/{offer_id}/verify-pin", json={"pin": pin}, headers=auth(donor))
+    assert verified.json() == {"success": True, "status": "CLAIMED", "message": "Transaction completed successfully"}
+    assert client.get(f"/chats/{thread_id}", headers=auth(student)).json()["status"] == "COMPLETED"
+
+    request_id = post_request(client, student["token"], "Rice please", SAN_JOSE)
+    response = client.delete(f"/requests/{request_id}", headers=auth(student))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(f"/requests/{request_id}").status_code == status.HTTP_404_NOT_FOUND
+
+    new_offer_id = post_offer(client, donor).json()["id"]
+    response = client.delete(f"/offers/{new_offer_id}", headers=auth(donor))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(f"/offers/{new_offer_id}").status_code == status.HTTP_404_NOT_FOUND
+    db.expire_all()
+    # The claimed offer keeps its slot; the deleted one gave its slot back
+    assert db.get(User, donor["user"].id).current_weekly_meals == 1
+    assert writer.writer_stats()["writes"] >= 7
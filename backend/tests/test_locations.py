@@ -0,0 +1,105 @@
+"""
+Tests for normalized locations and autocomplete
+"""
+from fastapi import status
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.locations import build_location, insert_location, normalize, location_key
+from app.models import Location
+from tests.conftest import TestingSessionLocal
+
+
+def create_request(client, token, description, city, zip="95112"):
+    response = client.post("/requests", json={
+        "city": city,
+        "state": "CA",
+        "zip": zip,
+        "country": "United States",
+        "dietary_needs": ["Vegan"],
+        "medical_needs": ["None"],
+        "logistics": ["Pickup (Student travels)"],
+        "description": description,
+        "availability": "Evenings",
+        "frequency": "One-time",
+        "urgency": "NORMAL"
+    }, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def test_normalize():
+    """Case, spacing and punctuation don't change the key"""
+    assert normalize(" San  Jose, ") == "san jose"
+    assert location_key(None, "CA", "San Jose", "95112") == location_key("united states", "ca", "san jose ", "95112")
+
+
+def test_city_key_uses_code_point_collation():
+    """The city prefix range scan needs "C" ordering on Postgres"""
+    ddl = str(CreateTable(Location.__table__).compile(dialect=postgresql.dialect()))
+    assert 'city_key VARCHAR COLLATE "C"' in ddl
+
+
+def test_variants_share_a_location(client, db, test_student_user):
+    """Differently typed addresses resolve to one location row"""
+    token = test_student_user["token"]
+    first = create_request(client, token, "one", "San Jose")
+    second = create_request(client, token, "two", "  san JOSE ")
+    assert first["location_id"] is not None
+    assert first["location_id"] == second["location_id"]
+    assert db.query(Location).filter(Location.id == first["location_id"]).count() == 1
+
+
+def test_concurrent_first_use_inserts_once(db):
+    """A location inserted by another transaction in the meantime is skipped, not a conflict"""
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        location = build_location("United States", "CA", "Fresno", "93701")
+        assert second.get(Location, location.id) is None
+        assert insert_location(first, build_location("United States", "CA", "Fresno", "93701"))
+        first.commit()
+        assert not insert_location(second, location)
+        second.commit()
+        assert second.query(Location).filter(Location.id == location.id).count() == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_autocomplete(client, test_student_user):
+    """Prefixes of city, zip and initials find the location"""
+    token = test_student_user["token"]
+    location_id = create_request(client, token, "one", "San Jose", "95112")["location_id"]
+    create_request(client, token, "two", "Santa Clara", "95050")
+
+    def suggest(q):
+        response = client.get("/locations/autocomplete", params={"q": q})
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    assert [loc["city"] for loc in suggest("san")][:2] == ["San Jose", "Santa Clara"]
+    assert location_id in {loc["id"] for loc in suggest("SAN J")}
+    assert location_id in {loc["id"] for loc in suggest("sj")}
+    assert [loc["city"] for loc in suggest("9505")] == ["Santa Clara"]
+    assert suggest("Oakland") == []
+
+    # Locations created after the index loaded are added on commit
+    create_request(client, token, "three", "Oakland", "94612")
+    assert [loc["city"] for loc in suggest("oak")] == ["Oakland"]
+
+
+def test_browse_by_location(client, test_student_user):
+    """city= is a normalized prefix match; location_id= is exact"""
+    token = test_student_user["token"]
+    san_jose = create_request(client, token, "one", "San Jose")
+    santa_clara = create_request(client, token, "two", "Santa Clara", "95050")
+
+    def browse(**params):
+        response = client.get("/requests", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        return {item["id"] for item in response.json()}
+
+    assert browse(city=" san JOSE") == {san_jose["id"]}
+    assert browse(city="san") == {san_jose["id"], santa_clara["id"]}
+    assert browse(location_id=santa_clara["location_id"]) == {santa_clara["id"]}
+    assert browse(city="Oakland") == set()
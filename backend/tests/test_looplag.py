@@ -0,0 +1,60 @@
+"""
+Tests for the event-loop lag monitor and non-blocking auth dependencies
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import status
+
+from app import auth
+from app.looplag import LoopLagMonitor
+
+
+def test_auth_queries_leave_the_loop(client, test_student_user, test_admin_user, monkeypatch):
+    """Principal and user lookups run in the threadpool, not on the event loop"""
+    on_loop = []
+
+    def off_loop(fn):
+        def wrapper(*args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(fn.__name__)
+            except RuntimeError:
+                pass
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(auth, "load_principal", off_loop(auth.load_principal))
+    monkeypatch.setattr(auth, "get_user_by_id", off_loop(auth.get_user_by_id))
+    auth.principal_cache.clear()
+
+    headers = {"Authorization": f"Bearer {test_student_user['token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == status.HTTP_200_OK
+    headers = {"Authorization": f"Bearer {test_admin_user['token']}"}
+    response = client.get("/admin/metrics", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["loop_lag"]["enabled"] is False
+    assert on_loop == []
+
+
+async def test_monitor_logs_blocking_stack(caplog):
+    """A sync sleep inside a coroutine is logged once, with its stack"""
+    monitor = LoopLagMonitor(interval_ms=10, threshold_ms=50)
+
+    def block_the_loop():
+        time.sleep(0.3)
+
+    with caplog.at_level(logging.WARNING, logger="app.looplag"):
+        await monitor.start()
+        await asyncio.sleep(0.1)
+        block_the_loop()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["stalls"] == 1
+    assert stats["max_ms"] >= 250
+    assert stats["histogram"]["inf"] == 0 and stats["histogram"]["le_500ms"] >= 1
+    assert "block_the_loop" in monitor.last_stack
+    assert "Event loop blocked" in caplog.text
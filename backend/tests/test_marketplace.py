@@ -0,0 +1,148 @@
+"""
+Tests for the in-memory marketplace view of open requests and offers
+"""
+import threading
+
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from app import marketplace
+from app.routers.requests import open_requests
+from tests.conftest import TestingSessionLocal
+from tests.test_chats import auth
+from tests.test_geo import post_request
+
+
+@pytest.fixture
+def view(monkeypatch):
+    monkeypatch.setattr(marketplace, "MARKETPLACE_VIEW", True)
+    monkeypatch.setattr(open_requests, "poll_seconds", 60)
+    return open_requests
+
+
+def browse(client, **params):
+    response = client.get("/requests", params={"status": "OPEN", **params})
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_browse_served_from_memory(client, query_log, view, monkeypatch, test_student_user):
+    """Repeat browses run no queries and match the database path"""
+    for description in ("Rice please", "Soup please", "Bread please"):
+        post_request(client, test_student_user["token"], description)
+    browse(client)
+
+    query_log.clear()
+    listed = browse(client)
+    assert query_log == []
+    assert len(listed) == 3
+
+    first = browse(client, limit=2, include_total="true")
+    second = browse(client, limit=2, cursor=first["next_cursor"])
+    assert first["total_estimate"] == 3 and second["next_cursor"] is None
+    assert [item["id"] for item in first["items"] + second["items"]] == [item["id"] for item in listed]
+
+    filters = [{}, {"city": "bay"}, {"diet": "Vegan"}, {"diet": "Halal"}, {"limit": 2}]
+    from_view = [browse(client, **params) for params in filters]
+    monkeypatch.setattr(marketplace, "MARKETPLACE_VIEW", False)
+    assert from_view == [browse(client, **params) for params in filters]
+
+
+def test_writes_reach_the_view(client, view, test_student_user):
+    """Updates, deletes and author renames committed here show up on the next browse"""
+    student = test_student_user
+    request_id = post_request(client, student["token"], "Rice please")
+    assert [item["description"] for item in browse(client)] == ["Rice please"]
+
+    client.patch(f"/requests/{request_id}", json={"description": "Rice and beans"}, headers=auth(student))
+    client.patch("/students/me", json={"display_name": "Renamed"}, headers=auth(student))
+    [item] = browse(client)
+    assert item["description"] == "Rice and beans" and item["seeker_name"] == "Renamed"
+
+    client.delete(f"/requests/{request_id}", headers=auth(student))
+    assert browse(client) == []
+
+
+def test_check_and_poll_repair_drift(client, db, view, monkeypatch, test_student_user, test_admin_user):
+    """Rows changed behind the API are reported by check() and picked up by the poll"""
+    kept = post_request(client, test_student_user["token"], "Rice please")
+    dropped = post_request(client, test_student_user["token"], "Soup please")
+    browse(client)
+
+    def checks():
+        response = client.get("/admin/marketplace", headers=auth(test_admin_user))
+        assert response.status_code == status.HTTP_200_OK
+        return {check["name"]: check for check in response.json()}
+
+    assert checks()["requests"] == {
+        "name": "requests", "enabled": True, "size": 2, "missing": [], "extra": [], "stale": []
+    }
+
+    db.execute(text("DELETE FROM meal_requests WHERE id = :id"), {"id": dropped})
+    db.commit()
+    assert checks()["requests"]["extra"] == [dropped]
+
+    monkeypatch.setattr(open_requests, "poll_seconds", 0)
+    assert [item["id"] for item in browse(client)] == [kept]
+    assert checks()["requests"]["extra"] == []
+
+
+def test_overlapping_syncs_keep_the_newest_state(client, db, view, monkeypatch, test_student_user):
+    """A removal committed while a sync is fetching isn't undone by that sync's older rows"""
+    student = test_student_user
+    request_id = post_request(client, student["token"], "Rice please")
+    browse(client)
+    client.patch(f"/requests/{request_id}", json={"description": "Rice and beans"}, headers=auth(student))
+
+    fetch = view._fetch
+    calls = []
+    waiter = threading.Thread(target=lambda: view.sync(TestingSessionLocal()))
+
+    def fetch_then_race(session, ids):
+        found = fetch(session, ids)
+        if not calls:
+            calls.append(ids)
+            client.delete(f"/requests/{request_id}", headers=auth(student))
+            # A browse meanwhile has a change queued, so it waits for this sync
+            waiter.start()
+            waiter.join(0.2)
+            assert waiter.is_alive()
+        return found
+
+    monkeypatch.setattr(view, "_fetch", fetch_then_race)
+    view.sync(db)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert len(view) == 0
+    assert browse(client) == []
+
+
+def test_browse_waits_for_a_running_sync_with_queued_writes(client, db, view, monkeypatch, test_student_user):
+    """Read-your-writes: a browse never skips a sync that holds changes committed before it"""
+    student = test_student_user
+    browse(client)
+    fetch = view._fetch
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fetch(session, ids):
+        started.set()
+        release.wait(5)
+        return fetch(session, ids)
+
+    post_request(client, student["token"], "Rice please")
+    monkeypatch.setattr(view, "_fetch", slow_fetch)
+    syncing = threading.Thread(target=lambda: view.sync(db))
+    syncing.start()
+    started.wait(5)
+    created = post_request(client, student["token"], "Soup please")
+
+    seen = []
+    browsing = threading.Thread(target=lambda: seen.extend(item["id"] for item in browse(client)))
+    browsing.start()
+    browsing.join(0.2)
+    assert browsing.is_alive()
+    release.set()
+    syncing.join(5)
+    browsing.join(5)
+    assert created in seen and len(seen) == 2
@@ -0,0 +1,84 @@
+"""
+Tests for keyset (cursor) pagination on list endpoints
+"""
+from fastapi import status
+
+from app import pagination
+from app.cache import LRUCache
+from tests.factories import add_requests, add_offers, add_ratings, add_flags
+
+
+def walk_pages(client, url, limit, headers=None):
+    """Follow next_cursor until the last page and return every item id"""
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params, headers=headers or {})
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page["items"]) <= limit
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_requests_pages_cover_every_row_once(client, db):
+    """Paging through requests returns each row exactly once, in list order"""
+    add_requests(db, 7)
+    full = [item["id"] for item in client.get("/requests").json()]
+
+    paged = walk_pages(client, "/requests", limit=3)
+    assert paged == full
+    assert len(set(paged)) == 7
+
+
+def test_offers_pages_cover_every_row_once(client, db):
+    """Paging through offers returns each row exactly once"""
+    add_offers(db, 5)
+    paged = walk_pages(client, "/offers", limit=2)
+    assert len(paged) == len(set(paged)) == 5
+
+
+def test_ratings_and_flags_are_paginated(client, db, test_admin_user):
+    """Ratings and the moderation queue accept cursor pagination"""
+    add_ratings(db, 4)
+    add_flags(db, 4)
+    headers = {"Authorization": f"Bearer {test_admin_user['token']}"}
+
+    assert len(set(walk_pages(client, "/ratings", limit=3))) == 4
+    assert len(set(walk_pages(client, "/admin/flags", limit=3, headers=headers))) == 4
+
+
+def test_include_total_returns_estimate(client, db):
+    """include_total adds an approximate total count to the page"""
+    add_requests(db, 3)
+    response = client.get("/requests", params={"limit": 1, "include_total": True, "status": "OPEN"})
+    page = response.json()
+    assert len(page["items"]) == 1
+    assert page["total_estimate"] == 3
+
+
+def test_count_cache_is_bounded(client, db, monkeypatch):
+    """Every distinct filter gets an entry, but only the most recent COUNT_CACHE_SIZE are kept"""
+    cache = LRUCache(10, 30.0)
+    monkeypatch.setattr(pagination, "count_cache", cache)
+    for city in range(15):
+        client.get("/requests", params={"limit": 1, "include_total": True, "city": f"city {city}"})
+    assert len(cache) == 10
+
+
+def test_legacy_list_without_limit(client, db):
+    """Clients that don't pass limit/cursor still get a plain list"""
+    add_requests(db, 2)
+    response = client.get("/requests")
+    assert isinstance(response.json(), list)
+
+
+def test_invalid_cursor_rejected(client, db):
+    """A malformed cursor is a client error"""
+    response = client.get("/requests", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
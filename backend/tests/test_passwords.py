@@ -0,0 +1,55 @@
+"""
+Tests for the password hashing pool
+"""
+from fastapi import status
+
+from app import passwords
+from app.models import User
+from app.passwords import check_and_rehash, hash_password, hash_rounds, password_pool
+
+
+def login(client, email, password="testpass123"):
+    return client.post("/auth/login", json={"email": email, "password": password})
+
+
+def test_check_and_rehash():
+    """A matching hash at another cost comes back rehashed"""
+    hashed = hash_password("secret", rounds=4)
+    assert hash_rounds(hashed) == 4
+    assert hash_rounds("not-a-hash") is None
+    assert check_and_rehash("wrong", hashed, 4) == (False, None)
+    assert check_and_rehash("secret", hashed, 4) == (True, None)
+
+    valid, new_hash = check_and_rehash("secret", hashed, 5)
+    assert valid and hash_rounds(new_hash) == 5
+    assert check_and_rehash("secret", new_hash, 5) == (True, None)
+
+
+def test_login_upgrades_cost(client, db, test_student_user, monkeypatch):
+    """Changing BCRYPT_ROUNDS rehashes stored passwords on the next login"""
+    user_id = test_student_user["user"].id
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    assert login(client, "teststudent@university.edu").status_code == status.HTTP_200_OK
+
+    db.expire_all()
+    stored = db.get(User, user_id).password_hash
+    assert hash_rounds(stored) == 4
+    assert login(client, "teststudent@university.edu").status_code == status.HTTP_200_OK
+    db.expire_all()
+    assert db.get(User, user_id).password_hash == stored
+    assert login(client, "teststudent@university.edu", "wrong").status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_full_pool_sheds_load(client, test_admin_user, monkeypatch):
+    """Past max_pending, logins get a 503 and the rejection is counted"""
+    headers = {"Authorization": f"Bearer {test_admin_user['token']}"}
+    before = client.get("/admin/metrics", headers=headers).json()["password_hashing"]
+
+    monkeypatch.setattr(password_pool, "max_pending", 0)
+    response = login(client, "admin@test.org", "adminpass123")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "1"
+
+    after = client.get("/admin/metrics", headers=headers).json()["password_hashing"]
+    assert after["rejected"] == before["rejected"] + 1
+    assert after["pending"] == 0
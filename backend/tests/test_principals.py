@@ -0,0 +1,47 @@
+"""
+Tests for the cached token and principal lookups behind authentication
+"""
+from fastapi import status
+
+from app import auth
+from app.auth import decode_access_token, principal_cache
+
+
+def test_token_is_decoded_once(test_student_user, monkeypatch):
+    """Repeat requests with one token skip JWT verification"""
+    calls = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+
+    user_id = test_student_user["user"].id
+    assert decode_access_token(test_student_user["token"]) == user_id
+    assert decode_access_token(test_student_user["token"]) == user_id
+    assert decode_access_token("not-a-token") is None
+    assert len(calls) == 2
+
+
+def test_role_checks_skip_the_database(client, query_log, test_admin_user):
+    """Once cached, a role-only dependency issues no user query"""
+    headers = {"Authorization": f"Bearer {test_admin_user['token']}"}
+    assert client.get("/admin/flags", headers=headers).status_code == status.HTTP_200_OK
+
+    query_log.clear()
+    assert client.get("/admin/flags", headers=headers).status_code == status.HTTP_200_OK
+    assert query_log
+    assert not [statement for statement in query_log if "FROM users" in statement]
+    assert client.get("/offers/mine", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_profile_update_invalidates_principal(client, db, test_student_user):
+    """Committing a change to a user drops their cached principal"""
+    user_id = test_student_user["user"].id
+    headers = {"Authorization": f"Bearer {test_student_user['token']}"}
+    assert client.get("/students/me", headers=headers).status_code == status.HTTP_200_OK
+    assert principal_cache.get(user_id).display_name == "Test Student"
+
+    response = client.patch("/students/me", json={"display_name": "Renamed"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert principal_cache.get(user_id) is None
+
+    assert client.get("/students/me", headers=headers).json()["display_name"] == "Renamed"
+    assert principal_cache.get(user_id).display_name == "Renamed"
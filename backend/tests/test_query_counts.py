@@ -0,0 +1,62 @@
+"""
+Tests that list endpoints issue a constant number of queries
+"""
+from fastapi import status
+
+from app.models import User
+from tests.factories import add_requests, add_offers, add_ratings
+
+
+def count_queries(client, query_log, url, headers=None):
+    query_log.clear()
+    response = client.get(url, headers=headers or {})
+    assert response.status_code == status.HTTP_200_OK
+    return len(query_log), len(response.json())
+
+
+def test_browse_requests_query_count_is_constant(client, db, query_log):
+    """Browsing requests does not issue a query per row"""
+    add_requests(db, 2)
+    small_count, small_rows = count_queries(client, query_log, "/requests")
+    add_requests(db, 20)
+    large_count, large_rows = count_queries(client, query_log, "/requests")
+
+    assert (small_rows, large_rows) == (2, 22)
+    assert large_count == small_count
+
+
+def test_browse_offers_query_count_is_constant(client, db, query_log):
+    """Browsing offers does not issue a query per row"""
+    add_offers(db, 2)
+    small_count, _ = count_queries(client, query_log, "/offers")
+    add_offers(db, 20)
+    large_count, large_rows = count_queries(client, query_log, "/offers")
+
+    assert large_rows == 22
+    assert large_count == small_count
+
+
+def test_my_offers_query_count_is_constant(client, db, query_log, test_donor_user):
+    """A donor's own offers are enriched without per-row lookups"""
+    headers = {"Authorization": f"Bearer {test_donor_user['token']}"}
+    donor = db.query(User).filter(User.id == test_donor_user["user"].id).first()
+    add_offers(db, 2, donor=donor)
+    # Warm the principal cache so neither count includes the auth lookup
+    count_queries(client, query_log, "/offers/mine", headers)
+    small_count, _ = count_queries(client, query_log, "/offers/mine", headers)
+    add_offers(db, 20, donor=donor)
+    large_count, large_rows = count_queries(client, query_log, "/offers/mine", headers)
+
+    assert large_rows == 22
+    assert large_count == small_count
+
+
+def test_ratings_query_count_is_constant(client, db, query_log):
+    """Ratings load reviewers and recipients in a single batch"""
+    add_ratings(db, 2)
+    small_count, _ = count_queries(client, query_log, "/ratings")
+    add_ratings(db, 20)
+    large_count, large_rows = count_queries(client, query_log, "/ratings")
+
+    assert large_rows == 22
+    assert large_count == small_count
@@ -0,0 +1,115 @@
+"""
+Checks that router queries are served by indexes.
+
+Drives every endpoint through its common filter combinations, captures the
+SQL they issue and runs ``EXPLAIN QUERY PLAN`` on each statement. A plan
+step of the form ``SCAN <table>`` with no index is a full table scan and
+fails the test. Ordered index walks (``SCAN <table> USING INDEX ...``) are
+allowed: they stop at the page limit.
+"""
+import re
+
+import pytest
+from fastapi import status
+from sqlalchemy import event, select
+
+from app.database import Base
+from app.models import Location, User
+from tests.conftest import engine
+from tests.test_chats import auth, open_thread, send
+from tests.test_geo import post_request, SAN_JOSE
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# The autocomplete index reads the whole (small) locations table by design
+WHOLE_TABLE_LOADS = {str(select(Location).compile(engine))}
+
+
+@pytest.fixture
+def statement_log():
+    """Record (statement, parameters) for every read/update/delete"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def full_scans(statements):
+    tables = set(Base.metadata.tables)
+    found = {}
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if statement in WHOLE_TABLE_LOADS:
+                continue
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            for row in plan:
+                match = FULL_SCAN.match(row[-1])
+                if match and match.group(1) in tables:
+                    found[statement] = match.group(1)
+    return found
+
+
+def get_ok(client, url, headers=None, **params):
+    response = client.get(url, params=params, headers=headers or {})
+    assert response.status_code == status.HTTP_200_OK, url
+    return response.json()
+
+
+def test_router_queries_use_indexes(client, db, statement_log, test_student_user, test_donor_user, test_admin_user):
+    """No router query falls back to a full table scan"""
+    student, donor, admin = test_student_user, test_donor_user, test_admin_user
+    request_id = post_request(client, student["token"], "Rice please", SAN_JOSE)
+    thread_id = open_thread(client, student, donor)
+    offer_id = get_ok(client, "/offers")[0]["id"]
+    pin = get_ok(client, f"/offers/{offer_id}", auth(donor))["completion_pin"]
+    send(client, student, thread_id, "Hello")
+    client.post(f"/chats/{thread_id}/read", headers=auth(donor))
+    client.post("/flags", json={"item_id": request_id, "item_type": "REQUEST", "reason": "Spam"}, headers=auth(donor))
+    client.post("/ratings", json={
+        "to_user_id": donor["user"].id, "transaction_id": offer_id, "stars": 5, "comment": "Thanks"
+    }, headers=auth(student))
+
+    for url in ("/requests", "/offers"):
+        get_ok(client, url)
+        get_ok(client, url, limit=10)
+        get_ok(client, url, limit=10, include_total=True)
+        get_ok(client, url, status="OPEN" if url == "/requests" else "AVAILABLE", limit=10)
+        get_ok(client, url, city="san", diet="Vegetarian")
+        get_ok(client, url, q="rice")
+        get_ok(client, url, near="37.3382,-121.8863", radius_km=5)
+    location_id = get_ok(client, "/locations/autocomplete", q="san")[0]["id"]
+    get_ok(client, "/requests", location_id=location_id, limit=10)
+    get_ok(client, "/offers", location_id=location_id, limit=10)
+    get_ok(client, "/requests", for_offer=offer_id)
+    get_ok(client, "/offers", for_request=request_id)
+    get_ok(client, f"/requests/{request_id}")
+    get_ok(client, f"/offers/{offer_id}")
+    get_ok(client, "/requests/mine", auth(student), limit=10)
+    get_ok(client, "/offers/mine", auth(donor), limit=10)
+    get_ok(client, "/ratings")
+    get_ok(client, "/ratings", to_user_id=donor["user"].id, limit=10)
+    get_ok(client, "/admin/flags", auth(admin), limit=10)
+    get_ok(client, "/donor-partners")
+    get_ok(client, "/chats", auth(student))
+    get_ok(client, "/chats/inbox", auth(donor))
+    get_ok(client, f"/chats/{thread_id}", auth(student), limit=10)
+    get_ok(client, "/auth/me", auth(student))
+    client.post(f"/chats/matches/{offer_id}/verify-pin", json={"pin": pin}, headers=auth(donor))
+    client.patch(f"/requests/{request_id}", json={"status": "PAUSED"}, headers=auth(student))
+    client.delete(f"/requests/{request_id}", headers=auth(student))
+    client.delete(f"/offers/{offer_id}", headers=auth(donor))
+
+    assert len(statement_log) > 50
+    assert full_scans(statement_log) == {}
+
+
+def test_full_scan_is_detected(db):
+    """The checker flags a query no index can serve"""
+    statement = f"SELECT * FROM {User.__tablename__} WHERE display_name = ?"
+    assert full_scans([(statement, ("Someone",))]) == {statement: "users"}
@@ -0,0 +1,109 @@
+"""
+Tests for the chat WebSocket push channel
+"""
+import pytest
+from fastapi import status
+from starlette.websockets import WebSocketDisconnect
+
+from app.realtime import FanoutBackend
+from tests.test_chats import auth, open_thread, send
+
+
+def test_socket_rejects_invalid_token(client):
+    """Connections without a valid JWT are closed with a policy violation"""
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/chats/ws?token=not-a-token"):
+            pass
+    assert exc_info.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+def test_socket_receives_new_messages(client, test_student_user, test_donor_user):
+    """A message sent over REST is pushed to the other participant's socket"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+
+    with client.websocket_connect(f"/chats/ws?token={test_donor_user['token']}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        send(client, test_student_user, thread_id, "On my way")
+
+        event = ws.receive_json()
+        assert event["type"] == "message"
+        assert event["thread_id"] == thread_id
+        assert event["message"]["text"] == "On my way"
+
+
+def test_socket_receives_thread_completion(client, test_student_user, test_donor_user):
+    """Verifying the PIN pushes a COMPLETED status to both participants"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+    thread = client.get(f"/chats/{thread_id}", headers=auth(test_student_user)).json()
+    offer = client.get(f"/offers/{thread['item_id']}", headers=auth(test_donor_user)).json()
+
+    with client.websocket_connect(
+        "/chats/ws", headers={"Authorization": f"Bearer {test_student_user['token']}"}
+    ) as ws:
+        assert ws.receive_json()["type"] == "ready"
+        client.post(
+            f"/chats/matches/{offer['id']}/verify-pin",
+            json={"pin": offer["completion_pin"]},
+            headers=auth(test_donor_user)
+        )
+        event = ws.receive_json()
+        assert event == {"type": "thread_status", "thread_id": thread_id, "status": "COMPLETED"}
+
+
+def test_typing_and_presence(client, test_student_user, test_donor_user):
+    """Typing is forwarded to the other participant, who also sees presence"""
+    thread_id = open_thread(client, test_student_user, test_donor_user)
+
+    with client.websocket_connect(f"/chats/ws?token={test_donor_user['token']}") as donor_ws:
+        assert donor_ws.receive_json()["type"] == "ready"
+        with client.websocket_connect(f"/chats/ws?token={test_student_user['token']}") as student_ws:
+            assert student_ws.receive_json()["type"] == "ready"
+            presence = donor_ws.receive_json()
+            assert presence["type"] == "presence"
+            assert presence["online"] is True
+
+            student_ws.send_json({"type": "typing", "thread_id": thread_id})
+            typing = donor_ws.receive_json()
+            assert typing == {
+                "type": "typing",
+                "thread_id": thread_id,
+                "user_id": test_student_user["user"].id
+            }
+        offline = donor_ws.receive_json()
+        assert offline["type"] == "presence"
+        assert offline["online"] is False
+
+
+def test_typing_ignores_bad_and_unknown_threads(client, monkeypatch, test_student_user):
+    """Non-string ids are dropped and unknown ids reload contacts at most once per interval"""
+    from app.routers import chats
+
+    loads = []
+    load_socket_contacts = chats.load_socket_contacts
+
+    def counting_load(db, user_id):
+        loads.append(user_id)
+        return load_socket_contacts(db, user_id)
+
+    monkeypatch.setattr(chats, "load_socket_contacts", counting_load)
+
+    with client.websocket_connect(f"/chats/ws?token={test_student_user['token']}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"type": "typing", "thread_id": ["not", "a", "string"]})
+        ws.send_json({"type": "typing", "thread_id": {"id": 1}})
+        for _ in range(20):
+            ws.send_json({"type": "typing", "thread_id": "no-such-thread"})
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    # One load on connect and a single reload for all the unknown ids
+    assert len(loads) == 2
+
+
+def test_incomplete_backend_fails_on_construction():
+    """A fan-out backend missing a method can't be instantiated"""
+    class StartOnly(FanoutBackend):
+        async def start(self, deliver, loop):
+            pass
+
+    with pytest.raises(TypeError):
+        StartOnly()
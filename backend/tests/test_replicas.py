@@ -0,0 +1,57 @@
+"""
+Tests for read replica routing with a second SQLite file as the replica
+"""
+import time
+
+import pytest
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from app import replicas as replicas_module
+from app.cache import LRUCache
+from app.database import Base
+from app.replicas import ReplicaSet
+from tests.factories import add_requests
+from tests.test_chats import auth
+from tests.test_geo import post_request, SAN_JOSE
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """A replica holding one request the primary doesn't have"""
+    replica_set = ReplicaSet([f"sqlite:///{tmp_path / 'replica.db'}"])
+    engine = replica_set.engines[0]
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        add_requests(db, 1)
+    monkeypatch.setattr(replicas_module, "replicas", replica_set)
+    monkeypatch.setattr(replicas_module, "recent_writers", LRUCache(100, 0.5))
+    yield
+    engine.dispose()
+
+
+def descriptions(client, user=None):
+    response = client.get("/requests", headers=auth(user) if user else {})
+    assert response.status_code == status.HTTP_200_OK
+    return {item["description"] for item in response.json()}
+
+
+def test_reads_follow_the_caller_writes(client, replica, test_student_user, test_donor_user):
+    """Browse reads the replica, except for a caller who just wrote"""
+    replica_only = descriptions(client)
+    assert len(replica_only) == 1
+
+    post_request(client, test_student_user["token"], "Rice please", SAN_JOSE)
+    assert descriptions(client, test_student_user) == {"Rice please"}
+    assert descriptions(client, test_donor_user) == replica_only
+    assert descriptions(client) == replica_only
+
+    time.sleep(0.6)
+    assert descriptions(client, test_student_user) == replica_only
+
+
+def test_failed_writes_are_not_sticky(client, replica, test_donor_user):
+    """A rejected write doesn't pin the caller to the primary"""
+    response = client.post("/requests", json={}, headers=auth(test_donor_user))
+    assert response.status_code >= status.HTTP_400_BAD_REQUEST
+    assert len(descriptions(client, test_donor_user)) == 1
@@ -0,0 +1,98 @@
+"""
+Tests for the shared GET response cache
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, status
+
+from app import httpcache
+from app.httpcache import CachedResponse, ResponseCache, ResponseCacheMiddleware
+from tests.test_chats import auth
+from tests.test_geo import post_request
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    monkeypatch.setattr(httpcache, "RESPONSE_CACHE", True)
+    return httpcache.response_cache
+
+
+def entry(size, tags=frozenset()):
+    return CachedResponse(200, [], b"x" * size, frozenset(tags))
+
+
+def test_browse_served_from_cache(client, query_log, response_cache, test_student_user):
+    """Repeats, in any parameter order, skip the handler until a write fires the tag"""
+    student = test_student_user
+    post_request(client, student["token"], "Rice please")
+    first = client.get("/requests?status=OPEN&limit=10")
+    assert len(first.json()["items"]) == 1
+
+    query_log.clear()
+    again = client.get("/requests?limit=10&status=OPEN")
+    assert query_log == [] and again.content == first.content
+    assert response_cache.stats()["hits"] == 1
+
+    post_request(client, student["token"], "Soup please")
+    assert len(client.get("/requests?status=OPEN&limit=10").json()["items"]) == 2
+
+
+def test_detail_follows_author_profile(client, query_log, response_cache, test_student_user):
+    """A detail entry is dropped when its author's profile changes"""
+    student = test_student_user
+    request_id = post_request(client, student["token"], "Rice please")
+    etag = client.get(f"/requests/{request_id}").headers["etag"]
+    query_log.clear()
+    cached = client.get(f"/requests/{request_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED and query_log == []
+
+    client.patch("/students/me", json={"display_name": "Renamed"}, headers=auth(student))
+    assert client.get(f"/requests/{request_id}").json()["seeker_name"] == "Renamed"
+
+
+async def test_concurrent_misses_run_once(monkeypatch):
+    """Simultaneous misses for one key share a single handler call"""
+    monkeypatch.setattr(httpcache, "RESPONSE_CACHE", True)
+    calls = 0
+    app = FastAPI()
+
+    @app.get("/ratings")
+    async def ratings():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return [calls]
+
+    cache = ResponseCache()
+    transport = httpx.ASGITransport(app=ResponseCacheMiddleware(app, cache))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        responses = await asyncio.gather(*(http.get("/ratings") for _ in range(10)))
+        assert {response.text for response in responses} == {"[1]"}
+        assert (await http.get("/ratings")).text == "[1]"
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 9 and cache.stats()["hits"] == 1
+
+
+def test_byte_budget_and_tags():
+    """Least recently used entries go first; invalidating a tag drops its entries"""
+    cache = ResponseCache(max_bytes=800)
+    for name in ("a", "b", "c", "d"):
+        assert cache.put((name, ()), entry(200, {name, "all"}), cache.mark())
+    cache.get(("a", ()))
+    cache.put(("e", ()), entry(200), cache.mark())
+    assert cache.get(("b", ())) is None and cache.get(("a", ())) is not None
+    assert not cache.put(("big", ()), entry(201), cache.mark())
+
+    cache.invalidate("all")
+    assert cache.stats()["entries"] == 1
+
+
+def test_fill_racing_an_invalidation_is_not_stored():
+    """A response built across an invalidation of one of its tags isn't kept"""
+    cache = ResponseCache()
+    since = cache.mark()
+    cache.invalidate("request:1")
+    assert not cache.put(("/requests/1", ()), entry(10, {"request:1"}), since)
+    assert cache.put(("/requests/2", ()), entry(10, {"request:2"}), since)
@@ -0,0 +1,100 @@
+"""
+Tests for full-text search over request and offer descriptions
+"""
+import uuid
+
+from fastapi import status
+
+from app.models import MealRequest
+from app.search import SEARCH_RANK_WINDOW, match_expression
+from tests.test_geo import post_request
+
+
+def search(client, **params):
+    response = client.get("/requests", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_match_expression_quotes_terms():
+    """User input can't inject FTS5 operators"""
+    assert match_expression('rice OR "dal" -x') == '"rice" "OR" "dal" "x"'
+    assert match_expression("!!!") is None
+
+
+def test_search_ranks_and_composes(client, test_student_user):
+    """q returns only matching rows, best match first, alongside filters"""
+    token = test_student_user["token"]
+    post_request(client, token, "Rice and beans for the week")
+    best = post_request(client, token, "Rice, rice bowls, anything with rice")
+    post_request(client, token, "Birthday cake for my roommate")
+
+    results = search(client, q="rice")
+    assert len(results) == 2
+    assert results[0]["id"] == best
+
+    # Porter stemming: "birthdays" finds "Birthday"
+    assert [item["description"] for item in search(client, q="birthdays")] == ["Birthday cake for my roommate"]
+    # Every word must match
+    assert search(client, q="rice cake") == []
+    assert search(client, q="rice", status="PAUSED") == []
+    assert search(client, q="!!!") == []
+
+
+def test_search_index_follows_updates_and_deletes(client, test_student_user):
+    """Triggers keep the index in sync with description changes"""
+    token = test_student_user["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    request_id = post_request(client, token, "Looking for noodles")
+
+    response = client.patch(f"/requests/{request_id}", json={"description": "Looking for dumplings"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert search(client, q="noodles") == []
+    assert [item["id"] for item in search(client, q="dumplings")] == [request_id]
+
+    response = client.delete(f"/requests/{request_id}", headers=headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert search(client, q="dumplings") == []
+
+
+def test_search_paging(client, test_student_user):
+    """Relevance results are capped by limit; sort=recent pages by cursor"""
+    token = test_student_user["token"]
+    for index in range(5):
+        post_request(client, token, f"Soup number {index}")
+
+    page = search(client, q="soup", limit=2)
+    assert len(page["items"]) == 2
+    assert page["next_cursor"] is None
+
+    seen = []
+    params = {"q": "soup", "sort": "recent", "limit": 2}
+    while True:
+        page = search(client, **params)
+        seen.extend(item["id"] for item in page["items"])
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert len(seen) == len(set(seen)) == 5
+
+    response = client.get("/requests", params={"q": "soup", "cursor": "abc"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_search_filters_apply_before_the_rank_window(client, db, test_student_user):
+    """Matches dropped by the other filters don't use up the rank window"""
+    token = test_student_user["token"]
+    wanted = post_request(client, token, "Rice for the week")
+    seeker_id = test_student_user["user"].id
+    closed = [{
+        "id": str(uuid.uuid4()), "seeker_id": seeker_id, "city": "San Jose", "state": "CA", "zip": "95112",
+        "dietary_needs": [], "medical_needs": [], "logistics": [], "description": f"Rice bowl {index}",
+        "availability": "Evenings", "frequency": "ONCE", "urgency": "NORMAL", "status": "FULFILLED",
+    } for index in range(SEARCH_RANK_WINDOW + 10)]
+    db.execute(MealRequest.__table__.insert(), closed)
+    db.commit()
+
+    page = search(client, q="rice", status="OPEN", limit=5)
+    assert [item["id"] for item in page["items"]] == [wanted]
+    # Unpaged browses aren't windowed at all
+    assert len(search(client, q="rice")) == SEARCH_RANK_WINDOW + 11
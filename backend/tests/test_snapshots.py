@@ -0,0 +1,72 @@
+"""
+Tests for the donor partner snapshot
+"""
+from fastapi import status
+
+from app.routers.donor_partners import partner_snapshot
+from tests.test_chats import auth
+
+PARTNER = {
+    "name": "Valley Grocers",
+    "category": "Businesses & Corporate CSR",
+    "tier": "Gold Partner",
+    "total_contribution_display": "$5,000",
+    "since": "2023",
+}
+
+
+def add_partner(client, admin, name):
+    response = client.post("/donor-partners", json={**PARTNER, "name": name}, headers=auth(admin))
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["id"]
+
+
+def test_partners_served_from_snapshot(client, query_log, test_admin_user):
+    """Repeat reads issue no queries and a matching ETag gets a 304"""
+    add_partner(client, test_admin_user, "Valley Grocers")
+    first = client.get("/donor-partners")
+    assert first.status_code == status.HTTP_200_OK
+    assert [partner["name"] for partner in first.json()] == ["Valley Grocers"]
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    query_log.clear()
+    second = client.get("/donor-partners")
+    assert query_log == []
+    assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+
+    cached = client.get("/donor-partners", headers={"If-None-Match": first.headers["etag"]})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.content == b"" and cached.headers["etag"] == first.headers["etag"]
+
+
+def test_writes_invalidate_snapshot(client, test_admin_user):
+    """Adding or deleting a partner changes the body and the ETag"""
+    empty = client.get("/donor-partners")
+    assert empty.json() == []
+
+    partner_id = add_partner(client, test_admin_user, "Valley Grocers")
+    added = client.get("/donor-partners", headers={"If-None-Match": empty.headers["etag"]})
+    assert added.status_code == status.HTTP_200_OK
+    assert [partner["id"] for partner in added.json()] == [partner_id]
+
+    response = client.delete(f"/donor-partners/{partner_id}", headers=auth(test_admin_user))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    deleted = client.get("/donor-partners")
+    assert deleted.json() == [] and deleted.headers["etag"] == empty.headers["etag"]
+
+
+def test_invalidation_during_build_is_not_cached(client, db, monkeypatch):
+    """A body built across an invalidation is served once, not kept"""
+    build = partner_snapshot.build
+
+    def racing_build(session):
+        body = build(session)
+        partner_snapshot.invalidate()
+        return body
+
+    monkeypatch.setattr(partner_snapshot, "build", racing_build)
+    partner_snapshot.get(db)
+    monkeypatch.setattr(partner_snapshot, "build", build)
+    assert partner_snapshot._current is None
+    partner_snapshot.get(db)
+    assert partner_snapshot._current is not None
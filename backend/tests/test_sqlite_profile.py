@@ -0,0 +1,124 @@
+"""
+Tests for the production SQLite profile, busy retries and maintenance
+"""
+import sqlite3
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import database
+from app.database import Base, make_engine, retry_on_busy
+from app.maintenance import full_vacuum, run_maintenance
+from app.models import Frequency, MealRequest
+from tests.factories import make_user
+
+
+@pytest.fixture
+def file_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_BUSY_TIMEOUT_MS", 10)
+    path = tmp_path / "profile.db"
+    engine = make_engine(f"sqlite:///{path}", "production")
+    yield engine, path
+    engine.dispose()
+
+
+def test_production_pragmas(file_engine):
+    """Every connection gets WAL, relaxed sync, a busy timeout and a big cache"""
+    engine, _ = file_engine
+    with engine.connect() as connection:
+        pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1
+        assert pragma("busy_timeout") == 10
+        assert pragma("temp_store") == 2
+        assert pragma("auto_vacuum") == 2
+        assert pragma("cache_size") == -database.SQLITE_CACHE_SIZE_KB
+
+
+def test_default_profile_keeps_pool_sizing(tmp_path):
+    """Without the production profile the pragmas are left alone, but the pool is still sized"""
+    engine = make_engine(f"sqlite:///{tmp_path / 'default.db'}", "default")
+    assert engine.pool.size() == database.DB_POOL_SIZE
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+    engine.dispose()
+
+
+def test_busy_transaction_is_retried(file_engine):
+    """A write blocked past the busy timeout is rolled back and run again"""
+    engine, path = file_engine
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE notes (body TEXT)")
+    attempts = []
+
+    def write(db: Session):
+        attempts.append(1)
+        db.execute(text("INSERT INTO notes VALUES ('hello')"))
+        db.commit()
+
+    blocker = sqlite3.connect(path, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    with Session(engine) as db, pytest.raises(OperationalError):
+        write(db=db)
+
+    threading.Timer(0.05, blocker.commit).start()
+    with Session(engine) as db:
+        retry_on_busy(write)(db=db)
+    blocker.close()
+    assert len(attempts) > 2
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT count(*) FROM notes").scalar() == 1
+
+
+def test_no_retry_after_commit(file_engine):
+    """A busy error once the handler has committed is raised, not re-run"""
+    engine, _ = file_engine
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE notes (body TEXT)")
+    attempts = []
+
+    def write(db: Session):
+        attempts.append(1)
+        db.execute(text("INSERT INTO notes VALUES ('hello')"))
+        db.commit()
+        raise OperationalError("SELECT 1", {}, sqlite3.OperationalError("database is locked"))
+
+    with Session(engine) as db, pytest.raises(OperationalError):
+        retry_on_busy(write)(db=db)
+    assert len(attempts) == 1
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT count(*) FROM notes").scalar() == 1
+
+
+def test_maintenance_and_full_vacuum(file_engine):
+    """Cycles analyze, optimize and free pages; a full vacuum keeps search intact"""
+    engine, _ = file_engine
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        seeker = make_user(db)
+        ids = [str(uuid.uuid4()) for _ in range(300)]
+        for index, request_id in enumerate(ids):
+            db.add(MealRequest(
+                id=request_id, seeker_id=seeker.id, description=f"{'rice' if index % 2 else 'soup'} {'x' * 2000}",
+                dietary_needs=[], medical_needs=[], logistics=[], availability="Evenings", frequency=Frequency.ONCE,
+                city="San Jose", state="CA", zip="95112",
+            ))
+        db.commit()
+        db.query(MealRequest).filter(MealRequest.id.in_(ids[:200])).delete(synchronize_session=False)
+        db.commit()
+
+    first = run_maintenance(engine)
+    assert first["analyzed"] == 1 and first["vacuumed_pages"] > 0
+    assert run_maintenance(engine)["optimized"] == 1
+
+    full_vacuum(engine)
+    with engine.connect() as connection:
+        matches = connection.exec_driver_sql(
+            "SELECT r.id FROM meal_requests_fts f JOIN meal_requests r ON r.rowid = f.rowid "
+            "WHERE meal_requests_fts MATCH 'rice'"
+        ).scalars().all()
+    assert sorted(matches) == sorted(ids[201::2])